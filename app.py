@@ -1,676 +1,745 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
-
-app = FastAPI(title="Calendar & Event Manager")
+from collections import Counter
+from contextlib import asynccontextmanager
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+import zlib
+
+from fastapi import FastAPI, HTTPException, Path, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from typing import List, Literal, Optional, Set, Tuple, Union
+from typing_extensions import Annotated
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate, parsedate_to_datetime
+
+from broadcast import ChangeHub
+from bulk import BulkFormatError, decompress, export_lines, gzip_stream, iter_records
+from encoding import dumps, encode_event, encode_events
+from freebusy import MAX_DURATION, MINUTES_PER_DAY, Overlaps, free_busy, parse_moment
+from ical import calendar_lines
+from metrics import CACHE_LOOKUPS, REGISTRY, MetricsMiddleware, rss_bytes
+from notify import ChangeNotifier
+from persistence import WriteAheadLog
+from profiler import SamplingProfiler
+from reminders import MAX_REMINDER, ReminderScheduler, log_sink, webhook_sink
+from sqlite_store import SQLiteEventStore
+from static_assets import REVALIDATE, StaticAssets, etag_matches
+from store import EventStore, MissingEvents, StaleRevision
+
+# Set CALENDAR_DB to use a SQLite file, or CALENDAR_DATA_DIR to keep the
+# in-memory store on disk through a write-ahead log. Only CALENDAR_DB can be
+# shared by several worker processes (uvicorn --workers N).
+DB_PATH = os.environ.get("CALENDAR_DB")
+DATA_DIR = os.environ.get("CALENDAR_DATA_DIR")
+# Set CALENDAR_PROFILING=1 to allow sampling profiles at /debug/profile
+PROFILING = os.environ.get("CALENDAR_PROFILING") == "1"
+# Set CALENDAR_ARCHIVE_DAYS along with CALENDAR_DATA_DIR to move events older
+# than that many days (by whole months) out of memory into compressed segments
+ARCHIVE_DAYS = int(os.environ.get("CALENDAR_ARCHIVE_DAYS") or 0)
+ARCHIVE_INTERVAL = 3600.0
+
+logger = logging.getLogger("calendar.app")
+# Set CALENDAR_REMINDER_WEBHOOK to POST due reminders there instead of logging them
+REMINDER_WEBHOOK = os.environ.get("CALENDAR_REMINDER_WEBHOOK")
+
+# CALENDAR_DB takes precedence over CALENDAR_DATA_DIR, and SQLite has no archive
+if ARCHIVE_DAYS and (DB_PATH or not DATA_DIR):
+    raise RuntimeError("CALENDAR_ARCHIVE_DAYS needs CALENDAR_DATA_DIR without CALENDAR_DB")
+
+if DB_PATH:
+    store = SQLiteEventStore(DB_PATH)
+else:
+    store = EventStore(WriteAheadLog(DATA_DIR) if DATA_DIR else None)
+
+STORE_LATENCY = REGISTRY.histogram(
+    "calendar_store_call_duration_seconds", "Time spent in store operations", ("operation",)
+)
+MUTATIONS = REGISTRY.counter("calendar_mutations_total", "Events created, updated and deleted", ("op",))
+SERIALIZATION = REGISTRY.histogram(
+    "calendar_serialization_duration_seconds", "Time spent encoding JSON responses"
+)
+STORE_ITEMS = REGISTRY.gauge(
+    "calendar_store_items", "Entries in the store and each of its indexes", ("structure",)
+)
+STORE_VERSION = REGISTRY.gauge("calendar_store_version", "The store's change counter")
+SUBSCRIBERS = REGISTRY.gauge("calendar_subscribers", "Connected WebSocket and SSE clients")
+RSS = REGISTRY.gauge("calendar_resident_memory_bytes", "Resident memory of this worker process")
+
+async def call_store(fn, *args, name: Optional[str] = None):
+    """Run a store operation, off the event loop if the store blocks, timed
+    under ``name`` (by default the method's name)"""
+    started = time.perf_counter()
+    try:
+        if store.blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+    finally:
+        STORE_LATENCY.observe(time.perf_counter() - started, name or fn.__name__)
+
+async def commit():
+    """Wait, off the event loop, until the changes so far are durable"""
+    started = time.perf_counter()
+    await run_in_threadpool(store.commit)
+    STORE_LATENCY.observe(time.perf_counter() - started, "commit")
+
+async def fetch_changes(since: int) -> dict:
+    return await call_store(store.changes_since, since)
+
+hub = ChangeHub(fetch_changes)
+
+# Other workers sharing the SQLite file wake this one after their writes;
+# a slow poll catches anything a lost wakeup would miss
+notifier = ChangeNotifier(DB_PATH + ".notify") if DB_PATH and ChangeNotifier.supported() else None
+SHARED_POLL_INTERVAL = 2.0
+
+def changed():
+    """Tell local subscribers and other workers that the store changed"""
+    hub.notify()
+    if notifier is not None:
+        notifier.publish()
+
+async def poll_shared_store():
+    while True:
+        await asyncio.sleep(SHARED_POLL_INTERVAL)
+        hub.notify()
+
+async def archive_periodically():
+    """Archive the months that have passed the horizon, then check hourly.
+    Segments are compressed and fsynced in a thread; only picking the
+    events and dropping them from memory happen on the event loop."""
+    while True:
+        names, moved = None, 0
+        try:
+            horizon = date.today() - timedelta(days=ARCHIVE_DAYS)
+            old = await call_store(store.prepare_archive, horizon.replace(day=1).isoformat())
+            if old:
+                names = await run_in_threadpool(store.write_archive, old)
+                moved = await call_store(store.finish_archive, old, names)
+                if moved:
+                    await commit()
+                await run_in_threadpool(store.settle_archive, names, bool(moved))
+        except Exception:
+            logger.exception("Archiving failed; trying again in %d seconds", ARCHIVE_INTERVAL)
+            if names and not moved:
+                # Segments the events never moved into would only be left over
+                try:
+                    await run_in_threadpool(store.settle_archive, names, False)
+                except Exception:
+                    logger.exception("Dropping unused archive segments failed")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+async def load_reminders() -> List[dict]:
+    return await call_store(store.reminders, date.today().isoformat())
+
+async def claim_reminder(event_id: int, day: str) -> bool:
+    return await call_store(store.claim_reminder, event_id, day)
+
+reminders = ReminderScheduler(
+    hub, load_reminders, claim_reminder, webhook_sink(REMINDER_WEBHOOK) if REMINDER_WEBHOOK else log_sink
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    hub.start(await call_store(store.version))
+    await reminders.start()
+    archiver = asyncio.create_task(archive_periodically()) if ARCHIVE_DAYS else None
+    poller = None
+    if DB_PATH:
+        if notifier is not None:
+            notifier.start(hub.notify)
+        poller = asyncio.create_task(poll_shared_store())
+    yield
+    if archiver is not None:
+        archiver.cancel()
+    if poller is not None:
+        poller.cancel()
+    if notifier is not None:
+        notifier.close()
+    await reminders.close()
+    await hub.close()
+    store.close()
+
+app = FastAPI(title="Calendar & Event Manager", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+profiler = SamplingProfiler()
+
+def parse_date(value: str) -> str:
+    """Normalise to YYYY-MM-DD so dates sort lexicographically"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise ValueError("date must be in YYYY-MM-DD format")
+
+class Recurrence(BaseModel):
+    frequency: Literal["daily", "weekly", "monthly"]
+    interval: int = Field(1, ge=1, le=1000)
+    until: Optional[str] = None
+    count: Optional[int] = Field(None, ge=1, le=10000)
+    exceptions: List[str] = []
+
+    @field_validator("until")
+    @classmethod
+    def validate_until(cls, value: Optional[str]) -> Optional[str]:
+        return parse_date(value) if value is not None else None
+
+    @field_validator("exceptions")
+    @classmethod
+    def validate_exceptions(cls, value: List[str]) -> List[str]:
+        return [parse_date(day) for day in value]
 
 class Event(BaseModel):
     id: Optional[int] = None
     title: str
     date: str
     time: Optional[str] = ""
+    # Minutes; an event with an HH:MM time and a duration is busy for that long
+    duration: Optional[int] = Field(None, ge=1, le=MAX_DURATION)
+    # Minutes before the event starts to send its reminder
+    reminder: Optional[int] = Field(None, ge=0, le=MAX_REMINDER)
     priority: str
     description: Optional[str] = ""
     created: Optional[str] = None
-
-events_db: List[dict] = []
-event_counter = 1
+    recurrence: Optional[Recurrence] = None
+    # Set by the store on every write; ignored in requests
+    revision: Optional[int] = None
+
+    @field_validator("date")
+    @classmethod
+    def validate_date(cls, value: str) -> str:
+        return parse_date(value)
+
+class EventChanges(BaseModel):
+    """Fields to change on an existing event; omitted fields are left alone"""
+    title: Optional[str] = None
+    date: Optional[str] = None
+    time: Optional[str] = None
+    duration: Optional[int] = Field(None, ge=1, le=MAX_DURATION)
+    reminder: Optional[int] = Field(None, ge=0, le=MAX_REMINDER)
+    priority: Optional[str] = None
+    description: Optional[str] = None
+    recurrence: Optional[Recurrence] = None
+
+    @field_validator("title", "date", "priority")
+    @classmethod
+    def validate_required(cls, value: Optional[str]) -> str:
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+    @field_validator("date")
+    @classmethod
+    def validate_date(cls, value: str) -> str:
+        return parse_date(value)
+
+class CreateOperation(BaseModel):
+    op: Literal["create"]
+    event: Event
+
+class UpdateOperation(BaseModel):
+    op: Literal["update"]
+    id: int
+    changes: EventChanges
+
+class DeleteOperation(BaseModel):
+    op: Literal["delete"]
+    id: int
+
+Operation = Annotated[
+    Union[CreateOperation, UpdateOperation, DeleteOperation], Field(discriminator="op")
+]
+
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+MOMENT_PATTERN = r"^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2})?$"
+
+BULK_CHUNK_SIZE = 1000
+MAX_BATCH_SIZE = 10_000
+MAX_PAGE_SIZE = 1000
+MAX_FREEBUSY_DAYS = 366
+SSE_KEEPALIVE = 15
+
+event_list = TypeAdapter(List[Event])
+
+assets = StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
+async def root(request: Request):
     """Serve the calendar HTML page"""
-    html_content = """<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Calendar & Event Manager</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            padding: 20px;
-        }
-
-        .container {
-            max-width: 1400px;
-            margin: 0 auto;
-            display: grid;
-            grid-template-columns: 1fr 400px;
-            gap: 20px;
-        }
-
-        .calendar-section, .events-section {
-            background: white;
-            border-radius: 20px;
-            padding: 30px;
-            box-shadow: 0 20px 60px rgba(0, 0, 0, 0.3);
-        }
-
-        .header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 30px;
-        }
-
-        .header h1 {
-            color: #667eea;
-            font-size: 28px;
-        }
-
-        .month-nav {
-            display: flex;
-            align-items: center;
-            gap: 20px;
-            margin-bottom: 20px;
-        }
-
-        .month-nav button {
-            background: #667eea;
-            color: white;
-            border: none;
-            padding: 10px 20px;
-            border-radius: 8px;
-            cursor: pointer;
-            font-size: 16px;
-            transition: all 0.3s;
-        }
-
-        .month-nav button:hover {
-            background: #764ba2;
-            transform: translateY(-2px);
-        }
-
-        .month-nav h2 {
-            color: #333;
-            min-width: 200px;
-            text-align: center;
-        }
-
-        .calendar {
-            display: grid;
-            grid-template-columns: repeat(7, 1fr);
-            gap: 10px;
-        }
-
-        .day-header {
-            text-align: center;
-            font-weight: bold;
-            color: #667eea;
-            padding: 10px;
-            font-size: 14px;
-        }
-
-        .day {
-            aspect-ratio: 1;
-            border: 2px solid #f0f0f0;
-            border-radius: 12px;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            justify-content: center;
-            cursor: pointer;
-            transition: all 0.3s;
-            position: relative;
-            padding: 8px;
-        }
-
-        .day:hover {
-            border-color: #667eea;
-            transform: scale(1.05);
-            box-shadow: 0 4px 12px rgba(102, 126, 234, 0.2);
-        }
-
-        .day.other-month {
-            color: #ccc;
-        }
-
-        .day.today {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            font-weight: bold;
-        }
-
-        .day.selected {
-            border-color: #764ba2;
-            background: #f8f8ff;
-        }
-
-        .day.has-events {
-            background: #fff3cd;
-        }
-
-        .day.has-events::after {
-            content: '';
-            position: absolute;
-            bottom: 5px;
-            width: 6px;
-            height: 6px;
-            background: #667eea;
-            border-radius: 50%;
-        }
-
-        .event-form {
-            background: #f8f9ff;
-            padding: 20px;
-            border-radius: 12px;
-            margin-bottom: 20px;
-        }
-
-        .form-group {
-            margin-bottom: 15px;
-        }
-
-        .form-group label {
-            display: block;
-            margin-bottom: 5px;
-            color: #333;
-            font-weight: 500;
-        }
-
-        .form-group input,
-        .form-group textarea,
-        .form-group select {
-            width: 100%;
-            padding: 10px;
-            border: 2px solid #e0e0e0;
-            border-radius: 8px;
-            font-size: 14px;
-            transition: border-color 0.3s;
-        }
-
-        .form-group input:focus,
-        .form-group textarea:focus,
-        .form-group select:focus {
-            outline: none;
-            border-color: #667eea;
-        }
-
-        .btn {
-            background: #667eea;
-            color: white;
-            border: none;
-            padding: 12px 24px;
-            border-radius: 8px;
-            cursor: pointer;
-            font-size: 16px;
-            width: 100%;
-            transition: all 0.3s;
-            font-weight: 500;
-        }
-
-        .btn:hover {
-            background: #764ba2;
-            transform: translateY(-2px);
-            box-shadow: 0 4px 12px rgba(102, 126, 234, 0.3);
-        }
-
-        .events-list {
-            max-height: 400px;
-            overflow-y: auto;
-        }
-
-        .event-item {
-            background: white;
-            border-left: 4px solid #667eea;
-            padding: 15px;
-            margin-bottom: 10px;
-            border-radius: 8px;
-            box-shadow: 0 2px 8px rgba(0, 0, 0, 0.1);
-            transition: all 0.3s;
-        }
-
-        .event-item:hover {
-            transform: translateX(5px);
-            box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
-        }
-
-        .event-item h3 {
-            color: #333;
-            margin-bottom: 5px;
-            font-size: 16px;
-        }
-
-        .event-item p {
-            color: #666;
-            font-size: 14px;
-            margin: 3px 0;
-        }
-
-        .event-item .event-date {
-            color: #667eea;
-            font-weight: 500;
-        }
-
-        .delete-btn {
-            background: #ff4757;
-            color: white;
-            border: none;
-            padding: 6px 12px;
-            border-radius: 6px;
-            cursor: pointer;
-            font-size: 12px;
-            margin-top: 8px;
-            transition: all 0.3s;
-        }
-
-        .delete-btn:hover {
-            background: #ee5a6f;
-        }
-
-        .priority-high {
-            border-left-color: #ff4757;
-        }
-
-        .priority-medium {
-            border-left-color: #ffa502;
-        }
-
-        .priority-low {
-            border-left-color: #26de81;
-        }
-
-        .stats {
-            display: grid;
-            grid-template-columns: repeat(3, 1fr);
-            gap: 10px;
-            margin-bottom: 20px;
-        }
-
-        .stat-card {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 15px;
-            border-radius: 12px;
-            text-align: center;
-        }
-
-        .stat-card h4 {
-            font-size: 24px;
-            margin-bottom: 5px;
-        }
-
-        .stat-card p {
-            font-size: 12px;
-            opacity: 0.9;
-        }
-
-        @media (max-width: 1200px) {
-            .container {
-                grid-template-columns: 1fr;
-            }
-        }
-
-        .export-btn {
-            background: #26de81;
-            margin-top: 10px;
-        }
-
-        .export-btn:hover {
-            background: #20bf6b;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="calendar-section">
-            <div class="header">
-                <h1>📅 Calendar</h1>
-            </div>
-
-            <div class="month-nav">
-                <button onclick="previousMonth()">← Previous</button>
-                <h2 id="currentMonth"></h2>
-                <button onclick="nextMonth()">Next →</button>
-            </div>
-
-            <div class="calendar" id="calendar"></div>
-        </div>
-
-        <div class="events-section">
-            <div class="header">
-                <h1>Events</h1>
-            </div>
-
-            <div class="stats">
-                <div class="stat-card">
-                    <h4 id="totalEvents">0</h4>
-                    <p>Total Events</p>
-                </div>
-                <div class="stat-card">
-                    <h4 id="todayEvents">0</h4>
-                    <p>Today</p>
-                </div>
-                <div class="stat-card">
-                    <h4 id="upcomingEvents">0</h4>
-                    <p>Upcoming</p>
-                </div>
-            </div>
-
-            <div class="event-form">
-                <h3 style="margin-bottom: 15px; color: #667eea;">Add New Event</h3>
-                <div class="form-group">
-                    <label>Event Title</label>
-                    <input type="text" id="eventTitle" placeholder="Enter event title">
-                </div>
-                <div class="form-group">
-                    <label>Date</label>
-                    <input type="date" id="eventDate">
-                </div>
-                <div class="form-group">
-                    <label>Time</label>
-                    <input type="time" id="eventTime">
-                </div>
-                <div class="form-group">
-                    <label>Priority</label>
-                    <select id="eventPriority">
-                        <option value="low">Low</option>
-                        <option value="medium" selected>Medium</option>
-                        <option value="high">High</option>
-                    </select>
-                </div>
-                <div class="form-group">
-                    <label>Description</label>
-                    <textarea id="eventDescription" rows="3" placeholder="Event details..."></textarea>
-                </div>
-                <button class="btn" onclick="addEvent()">Add Event</button>
-                <button class="btn export-btn" onclick="exportEvents()">Export Events (JSON)</button>
-            </div>
-
-            <h3 style="margin: 20px 0 10px; color: #667eea;">Upcoming Events</h3>
-            <div class="events-list" id="eventsList"></div>
-        </div>
-    </div>
-
-    <script>
-        // State management
-        let currentDate = new Date();
-        let selectedDate = new Date();
-        let events = [];
-
-        const dayHeaders = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'];
-
-        // Initialize
-        async function init() {
-            setDefaultDate();
-            await loadEvents();
-            renderCalendar();
-            renderEvents();
-            updateStats();
-        }
-
-        function setDefaultDate() {
-            const today = new Date();
-            const dateStr = today.toISOString().split('T')[0];
-            document.getElementById('eventDate').value = dateStr;
-        }
-
-        // API Functions
-        async function loadEvents() {
-            try {
-                const response = await fetch('/api/events');
-                events = await response.json();
-            } catch (error) {
-                console.error('Error loading events:', error);
-            }
-        }
-
-        async function addEvent() {
-            const title = document.getElementById('eventTitle').value;
-            const date = document.getElementById('eventDate').value;
-            const time = document.getElementById('eventTime').value;
-            const priority = document.getElementById('eventPriority').value;
-            const description = document.getElementById('eventDescription').value;
-
-            if (!title || !date) {
-                alert('Please enter a title and date');
-                return;
-            }
-
-            const event = {
-                title,
-                date,
-                time,
-                priority,
-                description,
-                created: new Date().toISOString()
-            };
-
-            try {
-                const response = await fetch('/api/events', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(event)
-                });
-
-                if (response.ok) {
-                    await loadEvents();
-                    renderCalendar();
-                    renderEvents();
-                    updateStats();
-
-                    // Clear form
-                    document.getElementById('eventTitle').value = '';
-                    document.getElementById('eventTime').value = '';
-                    document.getElementById('eventDescription').value = '';
-                    setDefaultDate();
-                }
-            } catch (error) {
-                console.error('Error adding event:', error);
-            }
-        }
-
-        async function deleteEvent(id) {
-            if (confirm('Are you sure you want to delete this event?')) {
-                try {
-                    const response = await fetch(`/api/events/${id}`, {
-                        method: 'DELETE'
-                    });
-
-                    if (response.ok) {
-                        await loadEvents();
-                        renderCalendar();
-                        renderEvents();
-                        updateStats();
-                    }
-                } catch (error) {
-                    console.error('Error deleting event:', error);
-                }
-            }
-        }
-
-        function renderCalendar() {
-            const calendar = document.getElementById('calendar');
-            calendar.innerHTML = '';
-
-            // Add day headers
-            dayHeaders.forEach(day => {
-                const header = document.createElement('div');
-                header.className = 'day-header';
-                header.textContent = day;
-                calendar.appendChild(header);
-            });
-
-            const year = currentDate.getFullYear();
-            const month = currentDate.getMonth();
-            
-            document.getElementById('currentMonth').textContent = 
-                currentDate.toLocaleDateString('en-US', { month: 'long', year: 'numeric' });
-
-            const firstDay = new Date(year, month, 1).getDay();
-            const daysInMonth = new Date(year, month + 1, 0).getDate();
-            const daysInPrevMonth = new Date(year, month, 0).getDate();
-
-            // Previous month days
-            for (let i = firstDay - 1; i >= 0; i--) {
-                const day = createDayElement(daysInPrevMonth - i, true, year, month - 1);
-                calendar.appendChild(day);
-            }
-
-            // Current month days
-            for (let i = 1; i <= daysInMonth; i++) {
-                const day = createDayElement(i, false, year, month);
-                calendar.appendChild(day);
-            }
-
-            // Next month days
-            const remainingDays = 42 - (firstDay + daysInMonth);
-            for (let i = 1; i <= remainingDays; i++) {
-                const day = createDayElement(i, true, year, month + 1);
-                calendar.appendChild(day);
-            }
-        }
-
-        function createDayElement(dayNum, isOtherMonth, year, month) {
-            const day = document.createElement('div');
-            day.className = 'day';
-            day.textContent = dayNum;
-
-            if (isOtherMonth) {
-                day.classList.add('other-month');
-            }
-
-            const dateStr = `${year}-${String(month + 1).padStart(2, '0')}-${String(dayNum).padStart(2, '0')}`;
-            const today = new Date();
-            const todayStr = `${today.getFullYear()}-${String(today.getMonth() + 1).padStart(2, '0')}-${String(today.getDate()).padStart(2, '0')}`;
-
-            if (dateStr === todayStr && !isOtherMonth) {
-                day.classList.add('today');
-            }
-
-            if (hasEvents(dateStr)) {
-                day.classList.add('has-events');
-            }
-
-            day.onclick = () => selectDate(dateStr);
-
-            return day;
-        }
-
-        function hasEvents(dateStr) {
-            return events.some(event => event.date === dateStr);
-        }
-
-        function selectDate(dateStr) {
-            document.getElementById('eventDate').value = dateStr;
-            selectedDate = new Date(dateStr);
-            renderCalendar();
-        }
-
-        function previousMonth() {
-            currentDate.setMonth(currentDate.getMonth() - 1);
-            renderCalendar();
-        }
-
-        function nextMonth() {
-            currentDate.setMonth(currentDate.getMonth() + 1);
-            renderCalendar();
-        }
-
-        function renderEvents() {
-            const eventsList = document.getElementById('eventsList');
-            eventsList.innerHTML = '';
-
-            const sortedEvents = [...events].sort((a, b) => {
-                const dateA = new Date(a.date + ' ' + (a.time || '00:00'));
-                const dateB = new Date(b.date + ' ' + (b.time || '00:00'));
-                return dateA - dateB;
-            });
-
-            sortedEvents.forEach(event => {
-                const eventDiv = document.createElement('div');
-                eventDiv.className = `event-item priority-${event.priority}`;
-                
-                const eventDate = new Date(event.date);
-                const formattedDate = eventDate.toLocaleDateString('en-US', { 
-                    weekday: 'short', 
-                    month: 'short', 
-                    day: 'numeric', 
-                    year: 'numeric' 
-                });
-
-                eventDiv.innerHTML = `
-                    <h3>${event.title}</h3>
-                    <p class="event-date">📅 ${formattedDate} ${event.time ? '• ⏰ ' + event.time : ''}</p>
-                    ${event.description ? `<p>${event.description}</p>` : ''}
-                    <p style="font-size: 12px; color: #999;">Priority: ${event.priority.toUpperCase()}</p>
-                    <button class="delete-btn" onclick="deleteEvent(${event.id})">Delete</button>
-                `;
-
-                eventsList.appendChild(eventDiv);
-            });
-
-            if (events.length === 0) {
-                eventsList.innerHTML = '<p style="text-align: center; color: #999; padding: 20px;">No events scheduled</p>';
-            }
-        }
-
-        function updateStats() {
-            document.getElementById('totalEvents').textContent = events.length;
-
-            const today = new Date().toISOString().split('T')[0];
-            const todayCount = events.filter(e => e.date === today).length;
-            document.getElementById('todayEvents').textContent = todayCount;
-
-            const upcoming = events.filter(e => new Date(e.date) > new Date()).length;
-            document.getElementById('upcomingEvents').textContent = upcoming;
-        }
-
-        async function exportEvents() {
-            const dataStr = JSON.stringify(events, null, 2);
-            const dataBlob = new Blob([dataStr], { type: 'application/json' });
-            const url = URL.createObjectURL(dataBlob);
-            const link = document.createElement('a');
-            link.href = url;
-            link.download = `calendar-events-${new Date().toISOString().split('T')[0]}.json`;
-            link.click();
-            URL.revokeObjectURL(url);
-        }
-
-        // Initialize app
-        init();
-    </script>
-</body>
-</html>"""
-    return HTMLResponse(content=html_content)
+    return assets.index.response(request, REVALIDATE)
+
+@app.get("/static/{name}")
+async def static_file(name: str, request: Request):
+    """Serve a frontend asset; content-hashed names are cached indefinitely"""
+    asset = assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return asset.response(request, assets.cache_control(name))
+
+def encode_cursor(event: dict) -> str:
+    key = [event["date"], event.get("time") or "", event["id"]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    try:
+        date, time, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (parse_date(str(date)), str(time), int(event_id))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def query_dates(*days: Optional[str]) -> Tuple[Optional[str], ...]:
+    """Date query parameters checked as real dates, which the pattern alone
+    does not do; a 400 otherwise"""
+    try:
+        return tuple(parse_date(day) if day else None for day in days)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in Event.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+async def collection_etag() -> str:
+    """An ETag that changes whenever any event is created, updated or deleted"""
+    version = await call_store(store.version)
+    return f'"{store.epoch}.{version}"'
+
+def revalidated(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match still matches ``etag``"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    fresh = etag_matches(if_none_match, etag)
+    CACHE_LOOKUPS.inc("etag", "hit" if fresh else "miss")
+    return fresh
+
+def unmodified_since(request: Request, modified: int) -> bool:
+    """Whether nothing changed after the client's If-Modified-Since, which
+    only counts when there is no If-None-Match"""
+    header = request.headers.get("if-modified-since")
+    if header is None or "if-none-match" in request.headers:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    fresh = modified <= since.timestamp()
+    CACHE_LOOKUPS.inc("last_modified", "hit" if fresh else "miss")
+    return fresh
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+def json_response(content, headers: Optional[dict] = None) -> Response:
+    """Encode stored records directly, skipping FastAPI's jsonable_encoder pass.
+    Events from the in-memory store reuse their cached JSON."""
+    started = time.perf_counter()
+    body = encode_events(content) if isinstance(content, list) else encode_event(content)
+    SERIALIZATION.observe(time.perf_counter() - started)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/api/events")
-async def get_events():
-    """Get all events"""
-    return events_db
+async def get_events(
+    request: Request,
+    start: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    end: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    priority: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """Get events, optionally limited to a date range and priority.
+
+    With ``limit`` the results come in pages ordered by date, time and id;
+    pass the ``X-Next-Cursor`` response header back as ``cursor`` to get the
+    next one. ``fields`` is a comma-separated list of fields to return.
+    Responses carry an ETag, and ``If-None-Match`` gets a 304 until the
+    events change.
+
+    Recurring events are expanded into one item per occurrence (sharing the
+    series id) when a date window, limit or cursor is given; with no ``end``,
+    occurrences are listed up to a year past ``start`` (or today). With
+    ``priority`` and no ``start`` or ``end`` there is no window to expand
+    in, so each matching series is listed once, at its first date.
+    """
+    start, end = query_dates(start, end)
+    names = parse_fields(fields)
+    after = decode_cursor(cursor) if cursor else None
+    etag = await collection_etag()
+    if revalidated(request, etag):
+        return not_modified(etag)
+    if start is None and end is None and priority is None and limit is None and after is None:
+        events = await call_store(lambda: list(store.all()), name="all")
+    else:
+        events = await call_store(
+            lambda: list(store.range(start, end, priority, after, limit)), name="range"
+        )
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    if limit is not None and len(events) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(events[-1])
+    if names is not None:
+        events = [{name: event.get(name) for name in names} for event in events]
+    return json_response(events, headers)
+
+@app.get("/api/events/search")
+async def search_events(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Find events whose title or description contains a word starting with
+    each word of ``q``, best match first"""
+    return json_response(await call_store(store.search, q, limit))
+
+@app.get("/api/events/changes")
+async def get_changes(since: int = Query(ge=0), epoch: Optional[str] = None):
+    """Get the changes made after version ``since``.
+
+    ``resync`` is true when the client has to reload the full listing
+    instead: the journal no longer reaches back to ``since``, or ``epoch``
+    shows the client's version came from a different store.
+    """
+    if epoch is not None and epoch != store.epoch:
+        version = await call_store(store.version)
+        return {"epoch": store.epoch, "version": version, "resync": True, "changes": []}
+    result = await call_store(store.changes_since, since)
+    return json_response({"epoch": store.epoch, **result})
+
+@app.get("/api/stats")
+async def get_stats(
+    today: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    start: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    end: Optional[str] = Query(None, pattern=DATE_PATTERN),
+):
+    """Get total, today, upcoming and per-priority counts, plus per-day
+    counts between ``start`` and ``end`` when both are given"""
+    today, start, end = query_dates(today, start, end)
+    today = today or date.today().isoformat()
+    stats = await call_store(store.stats, today)
+    if start and end:
+        stats["per_day"] = await call_store(store.day_counts, start, end)
+    return stats
+
+@app.get("/api/calendar/{year}/{month}")
+async def get_calendar(
+    request: Request,
+    year: int = Path(ge=1, le=9999),
+    month: int = Path(ge=1, le=12),
+):
+    """Get per-day event counts and highest priority for a month's 6-week grid"""
+    if (year, month) in ((1, 1), (9999, 12)):
+        raise HTTPException(status_code=400, detail="Month grid is out of range")
+    etag = await collection_etag()
+    if revalidated(request, etag):
+        return not_modified(etag)
+    grid = await call_store(store.calendar_grid, year, month)
+    return json_response(grid, {"ETag": etag, "Cache-Control": REVALIDATE})
+
+@app.get("/api/freebusy")
+async def get_freebusy(
+    request: Request,
+    start: str = Query(pattern=MOMENT_PATTERN),
+    end: str = Query(pattern=MOMENT_PATTERN),
+):
+    """Busy blocks (with the ids of the events in each) and free gaps between
+    ``start`` and ``end``, given as ``YYYY-MM-DD`` or ``YYYY-MM-DDTHH:MM``.
+    A bare ``end`` date includes that whole day. Only events with both a
+    time and a duration take up time."""
+    try:
+        first, last = parse_moment(start), parse_moment(end, end=True)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if last <= first:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if last - first > MAX_FREEBUSY_DAYS * MINUTES_PER_DAY:
+        raise HTTPException(status_code=400, detail=f"Window is longer than {MAX_FREEBUSY_DAYS} days")
+    if last > date.max.toordinal() * MINUTES_PER_DAY:
+        raise HTTPException(status_code=400, detail="Window is out of range")
+    etag = await collection_etag()
+    if revalidated(request, etag):
+        return not_modified(etag)
+    events = await call_store(store.overlapping, first, last)
+    return json_response(free_busy(events, first, last), {"ETag": etag, "Cache-Control": REVALIDATE})
+
+@app.get("/api/reminders")
+async def get_reminders(limit: int = Query(20, ge=1, le=1000)):
+    """The next reminders this worker will send, soonest first; one per event"""
+    return reminders.upcoming(limit)
 
 @app.post("/api/events")
-async def create_event(event: Event):
-    """Create a new event"""
-    global event_counter
-    event_dict = event.model_dump()
-    event_dict["id"] = event_counter
-    event_counter += 1
-    events_db.append(event_dict)
-    return event_dict
+async def create_event(event: Event, exclusive: bool = False):
+    """Create a new event. With ``exclusive=true`` it is refused with 409,
+    listing the events in the way, if it would overlap any busy time."""
+    try:
+        event_dict = await call_store(store.add, event.model_dump(), exclusive)
+    except Overlaps as exc:
+        raise HTTPException(
+            status_code=409,
+            detail={"msg": "Event overlaps other events", "events": exc.events},
+        )
+    await commit()
+    MUTATIONS.inc("create")
+    changed()
+    return json_response(event_dict)
+
+@app.post("/api/events/bulk")
+async def bulk_create_events(request: Request):
+    """Import events from a streamed NDJSON or JSON array body (optionally gzipped)"""
+    chunks = request.stream()
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        chunks = decompress(chunks)
+    validated: List[dict] = []
+    chunk: List[dict] = []
+    try:
+        async for record in iter_records(chunks):
+            chunk.append(record)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                validated.extend(validate_chunk(chunk, len(validated)))
+                chunk = []
+        validated.extend(validate_chunk(chunk, len(validated)))
+    except (BulkFormatError, UnicodeDecodeError, zlib.error) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    created = await call_store(store.add_many, validated)
+    await commit()
+    MUTATIONS.inc("create", amount=len(created))
+    changed()
+    return {"created": len(created)}
+
+def validate_chunk(records: List[dict], offset: int) -> List[dict]:
+    """Validate a chunk of raw records, reporting errors by position in the upload"""
+    try:
+        return [event.model_dump() for event in event_list.validate_python(records)]
+    except ValidationError as exc:
+        detail = [
+            {"index": offset + error["loc"][0], "loc": error["loc"][1:], "msg": error["msg"]}
+            for error in exc.errors()
+        ]
+        raise HTTPException(status_code=422, detail=detail)
+
+@app.post("/api/events/batch")
+async def batch_events(operations: Annotated[List[Operation], Field(max_length=MAX_BATCH_SIZE)]):
+    """Apply create, update and delete operations all together or not at all,
+    with a single commit, returning one result per operation in order"""
+    batch = []
+    for operation in operations:
+        if isinstance(operation, CreateOperation):
+            batch.append({"op": "create", "event": operation.event.model_dump()})
+        elif isinstance(operation, UpdateOperation):
+            changes = operation.changes.model_dump(exclude_unset=True)
+            batch.append({"op": "update", "id": operation.id, "changes": changes})
+        else:
+            batch.append({"op": "delete", "id": operation.id})
+    try:
+        results = await call_store(store.apply, batch)
+    except MissingEvents as exc:
+        detail = [{"index": index, "msg": "Event not found"} for index in exc.indexes]
+        raise HTTPException(status_code=404, detail=detail)
+    await commit()
+    for op, count in Counter(operation["op"] for operation in batch).items():
+        MUTATIONS.inc(op, amount=count)
+    changed()
+    return json_response({"results": results})
+
+@app.get("/api/events/export")
+async def export_events(
+    format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    compress: bool = False,
+):
+    """Stream every event as NDJSON or a JSON array, optionally gzip-compressed"""
+    as_array = format == "json"
+    body = export_lines(store.iter_batches(BULK_CHUNK_SIZE), as_array=as_array)
+    filename = "calendar-events." + ("json" if as_array else "ndjson")
+    media_type = "application/json" if as_array else "application/x-ndjson"
+    if compress:
+        body = gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/calendar.ics")
+async def get_calendar_feed(
+    request: Request,
+    start: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    end: Optional[str] = Query(None, pattern=DATE_PATTERN),
+    priority: Optional[str] = None,
+):
+    """Stream the events as an iCalendar feed for calendar apps to subscribe
+    to, optionally limited to a date range and priority. Series are sent
+    once with their recurrence rule if any occurrence may fall in the range.
+    ``If-None-Match`` and ``If-Modified-Since`` get a 304 until the events
+    change."""
+    start, end = query_dates(start, end)
+    etag = await collection_etag()
+    modified = await call_store(store.modified)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(modified, usegmt=True),
+        "Cache-Control": REVALIDATE,
+    }
+    if revalidated(request, etag) or unmodified_since(request, modified):
+        return Response(status_code=304, headers=headers)
+    batches = store.iter_feed(start, end, priority, BULK_CHUNK_SIZE)
+    return StreamingResponse(
+        calendar_lines(batches),
+        media_type="text/calendar; charset=utf-8",
+        headers={**headers, "Content-Disposition": 'inline; filename="calendar.ics"'},
+    )
+
+def event_etag(event: dict) -> str:
+    return f'"{event["id"]}.{event["revision"]}"'
+
+def if_match_revisions(header: Optional[str], event_id: int) -> Optional[Set[int]]:
+    """The revisions an If-Match header accepts for an event, or None for any"""
+    if header is None or header.strip() == "*":
+        return None
+    revisions = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if len(tag) > 1 and tag[0] == tag[-1] == '"':
+            tagged_id, _, revision = tag[1:-1].partition(".")
+            if tagged_id == str(event_id) and revision.isdigit():
+                revisions.add(int(revision))
+    return revisions
+
+@app.get("/api/events/{event_id:int}")
+async def get_event(event_id: int, request: Request):
+    """Get one event, with an ETag to send back in If-Match when changing it"""
+    event = await call_store(store.get, event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    etag = event_etag(event)
+    if revalidated(request, etag):
+        return not_modified(etag)
+    return json_response(event, {"ETag": etag, "Cache-Control": REVALIDATE})
+
+async def update_event(event_id: int, changes: dict, request: Request) -> Response:
+    revisions = if_match_revisions(request.headers.get("if-match"), event_id)
+    try:
+        event = await call_store(store.update, event_id, changes, revisions)
+    except StaleRevision as exc:
+        raise HTTPException(
+            status_code=412,
+            detail="Event was changed by someone else",
+            headers={"ETag": event_etag(exc.event)},
+        )
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    await commit()
+    MUTATIONS.inc("update")
+    changed()
+    return json_response(event, {"ETag": event_etag(event)})
+
+@app.put("/api/events/{event_id}")
+async def replace_event(event_id: int, event: Event, request: Request):
+    """Replace an event's fields, keeping its id (and ``created`` unless given).
+    Send the event's ETag in If-Match to fail with 412 if it changed meanwhile."""
+    changes = event.model_dump(exclude={"id", "revision"})
+    if "created" not in event.model_fields_set:
+        del changes["created"]
+    return await update_event(event_id, changes, request)
+
+@app.patch("/api/events/{event_id}")
+async def patch_event(event_id: int, changes: EventChanges, request: Request):
+    """Change only the given fields of an event; If-Match works as for PUT"""
+    return await update_event(event_id, changes.model_dump(exclude_unset=True), request)
 
 @app.delete("/api/events/{event_id}")
 async def delete_event(event_id: int):
     """Delete an event"""
-    global events_db
-    event = next((e for e in events_db if e["id"] == event_id), None)
-    if not event:
+    if await call_store(store.delete, event_id) is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    events_db = [e for e in events_db if e["id"] != event_id]
+    await commit()
+    MUTATIONS.inc("delete")
+    changed()
     return {"message": "Event deleted", "id": event_id}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """This worker's metrics in the Prometheus text format"""
+    for structure, count in (await call_store(store.metrics)).items():
+        STORE_ITEMS.set(count, structure)
+    STORE_VERSION.set(await call_store(store.version))
+    SUBSCRIBERS.set(len(hub))
+    RSS.set(rss_bytes())
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile", include_in_schema=False)
+async def get_profile(
+    seconds: float = Query(10, gt=0, le=60),
+    interval: float = Query(0.005, ge=0.001, le=1),
+):
+    """Sample this worker's threads for ``seconds`` and return the stacks in
+    the collapsed format flame graph tools read. Only with CALENDAR_PROFILING=1."""
+    if not PROFILING:
+        raise HTTPException(status_code=404, detail="Not Found")
+    try:
+        stacks = await run_in_threadpool(profiler.profile, seconds, interval)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return PlainTextResponse(stacks)
+
+@app.websocket("/ws/events")
+async def events_socket(websocket: WebSocket):
+    """Push each batch of changes as a JSON message shaped like /api/events/changes"""
+    await websocket.accept()
+    subscriber = hub.subscribe()
+    receiver = asyncio.ensure_future(drain(websocket))
+    try:
+        while True:
+            sender = asyncio.ensure_future(subscriber.next_batch())
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                sender.cancel()
+                break
+            await websocket.send_json({"epoch": store.epoch, **sender.result()})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        hub.unsubscribe(subscriber)
+
+async def drain(websocket: WebSocket) -> None:
+    """Discard client messages until it disconnects"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+@app.get("/api/events/stream")
+async def events_stream():
+    """Server-sent events fallback for /ws/events"""
+    async def messages():
+        subscriber = hub.subscribe()
+        try:
+            while True:
+                try:
+                    batch = await asyncio.wait_for(subscriber.next_batch(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {dumps({'epoch': store.epoch, **batch}).decode()}\n\n"
+        finally:
+            hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,355 @@
+import gzip
+import heapq
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from records import Record
+
+MANIFEST = "manifest.json"
+
+# Decoded segments kept in memory for repeated reads of the same months
+SEGMENT_CACHE_SIZE = 12
+
+# Each segment's sorted ids, as native 64-bit ints, sit beside it in this file
+IDS_SUFFIX = ".ids"
+
+
+class Segment:
+    """One immutable segment file and the metadata the manifest keeps on it"""
+
+    __slots__ = ("name", "first", "last", "count", "max_id", "days", "confirmed", "max_revision")
+
+    def __init__(
+        self,
+        name: str,
+        first: str,
+        last: str,
+        count: int,
+        max_id: int,
+        days: Dict[str, Dict[str, int]],
+        confirmed: bool,
+        max_revision: Optional[int] = None,
+    ):
+        self.name = name
+        self.first = first
+        self.last = last
+        self.count = count
+        self.max_id = max_id
+        # Events per priority on each date, for counts without opening the file
+        self.days = days
+        self.confirmed = confirmed
+        # None in manifests written before it was kept
+        self.max_revision = max_revision
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Archive:
+    """Cold storage for events moved out of the in-memory store.
+
+    Each archiving run writes the events of each calendar month it covers
+    to a new segment: gzip-compressed NDJSON sorted by (date, time, id),
+    never changed afterwards. ``manifest.json`` lists the segments with
+    their first and last dates, highest id and per-day counts, so totals
+    and month grids never open a segment and range reads only decompress
+    the segments overlapping the window. The most recently read segments
+    stay decoded in a small LRU.
+
+    Archiving is two-phase so that a crash neither loses nor duplicates
+    events: ``write()`` lists new segments as unconfirmed, the owner logs
+    that the events moved and then calls ``confirm()``. On the next start
+    ``recover()`` settles any segment left unconfirmed.
+
+    Segments are never rewritten, so an archived event that is changed or
+    deleted goes back to the store and is marked removed here with
+    ``remove()``; reads skip removed events and counts leave them out. The
+    owner keeps the list of removals, from ``removals()``, durable. Each
+    segment has a sorted array of its ids beside it, so ``find()`` only
+    decodes the segment that holds an event.
+
+    ``write()`` and ``confirm()`` do the disk work and may run on another
+    thread. Written segments stay out of reads until the owner calls
+    ``attach()`` as it drops the same events, so nothing is listed twice;
+    ``drop()`` deletes them instead if the owner changed its mind.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._segments: List[Segment] = []
+        # Segments written but not yet attached for reading
+        self._written: Dict[str, Segment] = {}
+        self._next_run = 1
+        # Events removed from each segment, with the date and priority they are counted under
+        self._removed: Dict[str, Dict[int, Tuple[str, str]]] = {}
+        self._ids: Dict[str, "array[int]"] = {}
+        self._decoded: "OrderedDict[str, Tuple[List[str], List[Record]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            self._segments = [Segment(**segment) for segment in manifest["segments"]]
+            self._next_run = manifest["next_run"]
+        # Files from a run that crashed before listing them
+        listed = {segment.name for segment in self._segments}
+        for name in os.listdir(directory):
+            if name.endswith(".ndjson.gz") and name not in listed:
+                os.remove(os.path.join(directory, name))
+            elif name.endswith(IDS_SUFFIX) and name[: -len(IDS_SUFFIX)] + ".ndjson.gz" not in listed:
+                os.remove(os.path.join(directory, name))
+
+    def __len__(self) -> int:
+        removed = sum(len(events) for events in self._removed.values())
+        return sum(segment.count for segment in self._segments) - removed
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._segments)
+
+    @property
+    def max_id(self) -> int:
+        """The highest id ever archived, so it is never allocated again"""
+        return max((segment.max_id for segment in self._segments), default=0)
+
+    @property
+    def max_revision(self) -> int:
+        """The highest revision of any archived event, so revisions keep
+        increasing when the owner restarts"""
+        highest = 0
+        for segment in self._segments:
+            if segment.max_revision is None:
+                segment.max_revision = max(record.revision for record in self._read(segment)[1])
+            highest = max(highest, segment.max_revision)
+        return highest
+
+    def write(self, events: Iterable[Record]) -> List[str]:
+        """Write ``events`` to new segments, one per month, listed as
+        unconfirmed; returns their names for ``attach()``"""
+        months: Dict[str, List[Record]] = {}
+        for event in events:
+            months.setdefault(event.date[:7], []).append(event)
+        run = self._next_run
+        segments = []
+        for month, records in sorted(months.items()):
+            records.sort(key=Record.key)
+            name = f"{month}.{run}.ndjson.gz"
+            days: Dict[str, Dict[str, int]] = {}
+            with open(os.path.join(self.directory, name), "wb") as raw:
+                with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+                    for record in records:
+                        f.write(record.json() + b"\n")
+                        counts = days.setdefault(record.date, {})
+                        counts[record.priority] = counts.get(record.priority, 0) + 1
+                raw.flush()
+                os.fsync(raw.fileno())
+            with open(self._ids_path(name), "wb") as f:
+                array("q", sorted(record.id for record in records)).tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            segments.append(Segment(
+                name, records[0].date, records[-1].date, len(records),
+                max(record.id for record in records), days, False,
+                max(record.revision for record in records),
+            ))
+        with self._lock:
+            self._written.update((segment.name, segment) for segment in segments)
+            self._next_run = run + 1
+        self._save()
+        return [segment.name for segment in segments]
+
+    def attach(self, names: Iterable[str]) -> None:
+        """Include written segments in reads; no disk access"""
+        with self._lock:
+            attached = [self._written.pop(name) for name in names]
+            self._segments = sorted(self._segments + attached, key=lambda segment: segment.first)
+
+    def confirm(self, names: Iterable[str]) -> None:
+        names = set(names)
+        with self._lock:
+            for segment in self._segments:
+                if segment.name in names:
+                    segment.confirmed = True
+        self._save()
+
+    def drop(self, names: Iterable[str]) -> None:
+        """Delete segments whose events stayed in the store after all"""
+        names = set(names)
+        with self._lock:
+            for name in names:
+                self._written.pop(name, None)
+                self._decoded.pop(name, None)
+                self._removed.pop(name, None)
+                self._ids.pop(name, None)
+            self._segments = [segment for segment in self._segments if segment.name not in names]
+        self._save()
+        for name in names:
+            os.remove(os.path.join(self.directory, name))
+            if os.path.exists(self._ids_path(name)):
+                os.remove(self._ids_path(name))
+
+    def find(self, event_id: int) -> Optional[Tuple[str, Record]]:
+        """The segment holding an archived event and the event, or None"""
+        for segment in self._segments:
+            ids = self._segment_ids(segment)
+            i = bisect_left(ids, event_id)
+            if i == len(ids) or ids[i] != event_id or event_id in self._removed.get(segment.name, ()):
+                continue
+            for record in self._read(segment)[1]:
+                if record.id == event_id:
+                    return segment.name, record
+        return None
+
+    def remove(self, name: str, event_id: int, day: str, priority: str) -> None:
+        """Leave an event out of segment ``name`` from now on; ``day`` and
+        ``priority`` are what it was counted under there"""
+        with self._lock:
+            self._removed.setdefault(name, {})[event_id] = (day, priority)
+
+    def removals(self) -> Dict[str, List[list]]:
+        """Every ``remove()`` so far as ``{segment: [[id, day, priority]]}``"""
+        with self._lock:
+            return {
+                name: [[event_id, *counted] for event_id, counted in events.items()]
+                for name, events in self._removed.items()
+            }
+
+    def recover(self, is_live: Callable[[int], bool]) -> None:
+        """Settle segments left unconfirmed by a crash. If their events are
+        all still in the store, the move was never logged and the segment is
+        dropped; otherwise it was, and the segment is confirmed."""
+        pending = [segment for segment in self._segments if not segment.confirmed]
+        if not pending:
+            return
+        dropped = []
+        for segment in pending:
+            if all(is_live(record.id) for record in self._read(segment)[1]):
+                dropped.append(segment.name)
+            else:
+                segment.confirmed = True
+        if dropped:
+            self.drop(dropped)
+        else:
+            self._save()
+
+    def range(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        priority: Optional[str] = None,
+        after: Optional[Tuple[str, str, int]] = None,
+    ) -> Iterator[Record]:
+        """Archived events between ``start`` and ``end`` (inclusive) in
+        (date, time, id) order, reading only the segments that overlap"""
+        if after is not None and (start is None or after[0] > start):
+            start = after[0]
+        streams = [
+            self._between(segment, start, end, priority, after)
+            for segment in self._segments
+            if (start is None or segment.last >= start) and (end is None or segment.first <= end)
+        ]
+        if len(streams) == 1:
+            return streams[0]
+        return heapq.merge(*streams, key=Record.key)
+
+    def day_counts(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Archived events per priority on each date between ``start`` and
+        ``end`` that has any, from the manifest alone"""
+        days: Dict[str, Dict[str, int]] = {}
+        for segment in self._segments:
+            if (start is not None and segment.last < start) or (end is not None and segment.first > end):
+                continue
+            for day, counts in segment.days.items():
+                if (start is None or day >= start) and (end is None or day <= end):
+                    merged = days.setdefault(day, {})
+                    for priority, count in counts.items():
+                        merged[priority] = merged.get(priority, 0) + count
+        for day, priority in self._counted_removals():
+            if (start is None or day >= start) and (end is None or day <= end):
+                counts = days[day]
+                counts[priority] -= 1
+                if not counts[priority]:
+                    del counts[priority]
+                    if not counts:
+                        del days[day]
+        return days
+
+    def priority_counts(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for segment in self._segments:
+            for counts in segment.days.values():
+                for priority, count in counts.items():
+                    totals[priority] = totals.get(priority, 0) + count
+        for _, priority in self._counted_removals():
+            totals[priority] -= 1
+            if not totals[priority]:
+                del totals[priority]
+        return totals
+
+    def _counted_removals(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return [counted for events in self._removed.values() for counted in events.values()]
+
+    def _between(self, segment: Segment, start, end, priority, after) -> Iterator[Record]:
+        days, records = self._read(segment)
+        removed = self._removed.get(segment.name, ())
+        lo = bisect_left(days, start) if start else 0
+        hi = bisect_right(days, end) if end else len(days)
+        for record in records[lo:hi]:
+            if priority is not None and record.priority != priority:
+                continue
+            if after is not None and record.key() <= after:
+                continue
+            if record.id in removed:
+                continue
+            yield record
+
+    def _segment_ids(self, segment: Segment) -> "array[int]":
+        ids = self._ids.get(segment.name)
+        if ids is None:
+            ids = array("q")
+            path = self._ids_path(segment.name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    ids.frombytes(f.read())
+            else:
+                ids.extend(sorted(record.id for record in self._read(segment)[1]))
+            self._ids[segment.name] = ids
+        return ids
+
+    def _ids_path(self, name: str) -> str:
+        return os.path.join(self.directory, name[: -len(".ndjson.gz")] + IDS_SUFFIX)
+
+    def _read(self, segment: Segment) -> Tuple[List[str], List[Record]]:
+        """A segment's dates and records, decoded on first use"""
+        with self._lock:
+            decoded = self._decoded.get(segment.name)
+            if decoded is not None:
+                self._decoded.move_to_end(segment.name)
+                return decoded
+        with gzip.open(os.path.join(self.directory, segment.name), "rb") as f:
+            records = [Record.pack(json.loads(line)) for line in f]
+        decoded = ([record.date for record in records], records)
+        with self._lock:
+            self._decoded[segment.name] = decoded
+            if len(self._decoded) > SEGMENT_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+        return decoded
+
+    def _save(self) -> None:
+        with self._lock:
+            segments = self._segments + list(self._written.values())
+            manifest = json.dumps({"next_run": self._next_run, "segments": [s.to_dict() for s in segments]})
+        path = os.path.join(self.directory, MANIFEST)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(manifest)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -0,0 +1,489 @@
+"""Throughput, latency and memory of the event API endpoints by store size.
+
+Each size runs in a fresh process: a synthetic calendar is seeded straight
+into the store, then every endpoint is driven twice, in-process through the
+ASGI interface and over real HTTP by a load generator in another process.
+Results are written as JSON so runs of two versions can be compared.
+
+    python benchmarks/api.py run --sizes 1000,100000,1000000 --output new.json
+    python benchmarks/api.py compare old.json new.json
+    python benchmarks/api.py load --url http://127.0.0.1:8000 --size 100000
+
+``load`` drives a server that is already running and seeded with ``--size``
+events. The drivers need ``httpx`` (``pip install httpx``).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from metrics import rss_bytes  # noqa: E402
+
+# Synthetic calendars are centred on a fixed day so runs stay comparable
+ANCHOR = date(2025, 1, 6)
+PRIORITY_WEIGHTS = {"low": 55, "medium": 35, "high": 10}
+WORDS = [
+    "team", "sync", "review", "lunch", "dentist", "call", "planning", "demo", "gym", "1:1",
+    "standup", "budget", "interview", "flight", "birthday", "retro", "workshop", "offsite",
+]
+SEED_CHUNK_SIZE = 10_000
+
+# Each endpoint: (name, method); create_event runs before delete_event, which
+# deletes exactly the events it created so every size keeps its event count
+ENDPOINTS = [
+    ("get_events_month", "GET"),
+    ("get_events_page", "GET"),
+    ("get_events_all", "GET"),
+    ("get_event", "GET"),
+    ("get_freebusy", "GET"),
+    ("create_event", "POST"),
+    ("delete_event", "DELETE"),
+]
+
+
+def synthetic_events(count: int, seed: int = 1) -> Iterator[dict]:
+    """Events shaped like a real calendar: most near the anchor day and on
+    weekdays, during working hours, mostly low priority, a few recurring.
+    Most timed events last between a quarter of an hour and two hours."""
+    rng = random.Random(seed)
+    # Separate, so adding durations left the rest of the calendar unchanged
+    lengths = random.Random(-seed)
+    priorities = list(PRIORITY_WEIGHTS)
+    weights = list(PRIORITY_WEIGHTS.values())
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for _ in range(count):
+        day = ANCHOR + timedelta(days=round(rng.gauss(0, 120)))
+        if day.weekday() >= 5 and rng.random() < 0.7:
+            day -= timedelta(days=day.weekday() - 4)
+        if rng.random() < 0.8:
+            time_text = "%02d:%02d" % (min(23, max(0, round(rng.gauss(13, 3)))), rng.randrange(0, 60, 15))
+        else:
+            time_text = ""
+        recurrence = None
+        if rng.random() < 0.01:
+            recurrence = {
+                "frequency": rng.choice(["weekly", "weekly", "monthly"]),
+                "interval": 1,
+                "until": None,
+                "count": rng.randint(4, 52),
+                "exceptions": [],
+            }
+        stamp = created + timedelta(seconds=rng.randrange(365 * 86400), milliseconds=rng.randrange(1000))
+        yield {
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))),
+            "date": day.isoformat(),
+            "time": time_text,
+            "duration": lengths.choice([None, 15, 30, 30, 60, 60, 60, 90, 120]) if time_text else None,
+            "priority": rng.choices(priorities, weights)[0],
+            "description": rng.choice(["", "", "bring laptop", "room 4", "agenda in the doc"]),
+            "created": stamp.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (stamp.microsecond // 1000),
+            "recurrence": recurrence,
+        }
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Workload:
+    """Builds the requests for each endpoint against a store seeded with
+    ``size`` events (ids 1 to ``size``)"""
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.events = synthetic_events(10**9, seed + 1)
+        self.created: List[int] = []
+
+    def request(self, endpoint: str) -> Tuple[str, str, Optional[dict]]:
+        rng = self.rng
+        if endpoint == "get_events_month":
+            start = ANCHOR + timedelta(days=rng.randint(-90, 90))
+            end = start + timedelta(days=30)
+            return "GET", f"/api/events?start={start}&end={end}", None
+        if endpoint == "get_events_page":
+            start = ANCHOR + timedelta(days=rng.randint(-90, 90))
+            return "GET", f"/api/events?start={start}&limit=100", None
+        if endpoint == "get_events_all":
+            return "GET", "/api/events", None
+        if endpoint == "get_freebusy":
+            day = ANCHOR + timedelta(days=rng.randint(-90, 90))
+            return "GET", f"/api/freebusy?start={day}&end={day}", None
+        if endpoint == "get_event":
+            return "GET", f"/api/events/{rng.randint(1, self.size)}", None
+        if endpoint == "create_event":
+            return "POST", "/api/events", next(self.events)
+        if endpoint == "delete_event":
+            return "DELETE", f"/api/events/{self.created.pop()}", None
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    def record(self, endpoint: str, response: httpx.Response) -> None:
+        if endpoint == "create_event" and response.status_code == 200:
+            self.created.append(response.json()["id"])
+
+
+async def send(client: httpx.AsyncClient, workload: Workload, endpoint: str) -> bool:
+    method, url, body = workload.request(endpoint)
+    response = await client.request(method, url, json=body)
+    await response.aread()
+    workload.record(endpoint, response)
+    return response.is_success
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    endpoint: str,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> dict:
+    """Send ``requests`` requests from ``concurrency`` workers and time each"""
+    for _ in range(warmup):
+        await send(client, workload, endpoint)
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            ok = await send(client, workload, endpoint)
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "method": dict(ENDPOINTS)[endpoint],
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "throughput": round(requests / seconds, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        },
+    }
+
+
+async def peak_allocation(client: httpx.AsyncClient, workload: Workload, endpoint: str, samples: int) -> int:
+    """The most memory one request allocated at once, over ``samples`` requests"""
+    peak = 0
+    for _ in range(samples):
+        tracemalloc.start()
+        await send(client, workload, endpoint)
+        _, highest = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak = max(peak, highest)
+    return peak
+
+
+def endpoints_for(args: argparse.Namespace) -> List[str]:
+    names = [name for name, _ in ENDPOINTS if name in args.endpoints.split(",")]
+    if args.size > args.full_list_max and "get_events_all" in names:
+        names.remove("get_events_all")
+    return names
+
+
+async def run_endpoints(client: httpx.AsyncClient, args: argparse.Namespace, alloc_samples: int = 0) -> List[dict]:
+    workload = Workload(args.size, args.seed)
+    results = []
+    for endpoint in endpoints_for(args):
+        result = await drive(client, workload, endpoint, args.requests, args.concurrency, args.warmup)
+        if alloc_samples:
+            result["alloc_peak_bytes"] = await peak_allocation(client, workload, endpoint, alloc_samples)
+        results.append(result)
+    return results
+
+
+def seed_store(store, size: int, seed: int) -> float:
+    started = time.perf_counter()
+    chunk: List[dict] = []
+    for event in synthetic_events(size, seed):
+        chunk.append(event)
+        if len(chunk) == SEED_CHUNK_SIZE:
+            store.add_many(chunk)
+            store.commit()
+            chunk = []
+    if chunk:
+        store.add_many(chunk)
+        store.commit()
+    return time.perf_counter() - started
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def serve_and_load(app, args: argparse.Namespace) -> List[dict]:
+    """Serve ``app`` over HTTP and drive it with ``load`` in a child process,
+    so the load generator does not compete with the server for the GIL"""
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning", access_log=False)
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    loader = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "load",
+        "--url", f"http://127.0.0.1:{port}",
+        "--size", str(args.size),
+        "--seed", str(args.seed + 1),
+        "--requests", str(args.requests),
+        "--concurrency", str(args.concurrency),
+        "--warmup", str(args.warmup),
+        "--endpoints", args.endpoints,
+        "--full-list-max", str(args.full_list_max),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    output, _ = await loader.communicate()
+    server.should_exit = True
+    await task
+    if loader.returncode != 0:
+        raise RuntimeError(f"Load generator failed with exit code {loader.returncode}")
+    return json.loads(output)
+
+
+def worker(args: argparse.Namespace) -> None:
+    """Benchmark one store size in this process and print the result"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        if args.store == "sqlite":
+            os.environ["CALENDAR_DB"] = os.path.join(data_dir, "calendar.db")
+        elif args.store == "wal":
+            os.environ["CALENDAR_DATA_DIR"] = data_dir
+        import app as calendar_app
+
+        baseline = rss_bytes()
+        seconds = seed_store(calendar_app.store, args.size, args.seed)
+        seeded = rss_bytes()
+
+        async def benchmark() -> List[dict]:
+            app = calendar_app.app
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://calendar") as client:
+                    results = await run_endpoints(client, args, args.alloc_samples)
+                for result in results:
+                    result["driver"] = "asgi"
+                if not args.no_http:
+                    for result in await serve_and_load(app, args):
+                        result["driver"] = "http"
+                        results.append(result)
+            return results
+
+        endpoints = asyncio.run(benchmark())
+    json.dump(
+        {
+            "store": args.store,
+            "size": args.size,
+            "seed": {
+                "seconds": round(seconds, 3),
+                "events_per_second": round(args.size / seconds, 1) if seconds else None,
+            },
+            "memory": {
+                "rss_bytes": seeded,
+                "bytes_per_event": round((seeded - baseline) / args.size, 1) if args.size else None,
+            },
+            "endpoints": endpoints,
+        },
+        sys.stdout,
+    )
+
+
+def load(args: argparse.Namespace) -> None:
+    """Drive a running server over HTTP and print the endpoint results"""
+
+    async def benchmark() -> List[dict]:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+            return await run_endpoints(client, args)
+
+    json.dump(asyncio.run(benchmark()), sys.stdout)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> None:
+    """Benchmark every size, each in a fresh worker process"""
+    from encoding import orjson
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "orjson": orjson is not None,
+            "store": args.store,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+    for size in [int(size) for size in args.sizes.split(",")]:
+        command = [
+            sys.executable, os.path.abspath(__file__), "worker",
+            "--store", args.store,
+            "--size", str(size),
+            "--seed", str(args.seed),
+            "--requests", str(args.requests),
+            "--concurrency", str(args.concurrency),
+            "--warmup", str(args.warmup),
+            "--alloc-samples", str(args.alloc_samples),
+            "--endpoints", args.endpoints,
+            "--full-list-max", str(args.full_list_max),
+        ] + (["--no-http"] if args.no_http else [])
+        result = json.loads(subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True).stdout)
+        report["results"].append(result)
+        print_result(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+def print_result(result: dict) -> None:
+    memory = result["memory"]
+    print(
+        f"{result['store']} store, {result['size']} events: seeded at "
+        f"{result['seed']['events_per_second']:.0f}/s, {memory['rss_bytes'] / 2**20:.0f} MiB RSS, "
+        f"{memory['bytes_per_event']:.0f} B/event",
+        file=sys.stderr,
+    )
+    for endpoint in result["endpoints"]:
+        latency = endpoint["latency_ms"]
+        alloc = endpoint.get("alloc_peak_bytes")
+        print(
+            f"  {endpoint['driver']:<5} {endpoint['endpoint']:<17} {endpoint['throughput']:9.1f} req/s"
+            f"  p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  p99 {latency['p99']:8.2f} ms"
+            + (f"  peak {alloc / 1024:8.1f} KiB" if alloc is not None else "")
+            + (f"  {endpoint['errors']} errors" if endpoint["errors"] else ""),
+            file=sys.stderr,
+        )
+
+
+def compare(args: argparse.Namespace) -> None:
+    """Print the change of every endpoint between two reports; exit 1 if any
+    throughput fell or p95 latency rose by more than the threshold"""
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    def endpoints(report: dict) -> Dict[Tuple, dict]:
+        return {
+            (result["store"], result["size"], endpoint["driver"], endpoint["endpoint"]): endpoint
+            for result in report["results"]
+            for endpoint in result["endpoints"]
+        }
+
+    def change(old: float, value: float) -> float:
+        return (value - old) / old if old else 0.0
+
+    before = endpoints(base)
+    regressions = 0
+    print(f"{base['meta']['revision']} -> {new['meta']['revision']}")
+    for key, endpoint in endpoints(new).items():
+        old = before.get(key)
+        if old is None:
+            continue
+        throughput = change(old["throughput"], endpoint["throughput"])
+        p95 = change(old["latency_ms"]["p95"], endpoint["latency_ms"]["p95"])
+        regressed = throughput < -args.threshold or p95 > args.threshold
+        regressions += regressed
+        store, size, driver, name = key
+        print(
+            f"{'!' if regressed else ' '} {store:<6} {size:>9} {driver:<5} {name:<17}"
+            f"  {old['throughput']:9.1f} -> {endpoint['throughput']:9.1f} req/s ({throughput:+7.1%})"
+            f"  p95 {old['latency_ms']['p95']:8.2f} -> {endpoint['latency_ms']['p95']:8.2f} ms ({p95:+7.1%})"
+        )
+    sys.exit(1 if regressions else 0)
+
+
+def add_workload_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--endpoints", default=",".join(name for name, _ in ENDPOINTS))
+    parser.add_argument(
+        "--full-list-max", type=int, default=100_000,
+        help="skip get_events_all (the unfiltered listing) above this many events",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark each store size")
+    run_parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated event counts")
+    run_parser.add_argument("--output", help="write the JSON report here")
+
+    worker_parser = commands.add_parser("worker", help="benchmark one size (used by run)")
+    worker_parser.add_argument("--size", type=int, required=True)
+
+    for command in (run_parser, worker_parser):
+        command.add_argument("--store", choices=["memory", "wal", "sqlite"], default="memory")
+        command.add_argument("--alloc-samples", type=int, default=20, help="requests traced for peak memory")
+        command.add_argument("--no-http", action="store_true", help="only drive the app in-process")
+        add_workload_arguments(command)
+
+    load_parser = commands.add_parser("load", help="drive a running server over HTTP")
+    load_parser.add_argument("--url", default="http://127.0.0.1:8000")
+    load_parser.add_argument("--size", type=int, required=True, help="events the server was seeded with")
+    add_workload_arguments(load_parser)
+
+    compare_parser = commands.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="allowed fractional slowdown")
+
+    args = parser.parse_args()
+    {"run": run, "worker": worker, "load": load, "compare": compare}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Memory per event: plain dicts versus packed ``Record`` objects.
+
+Events are decoded from JSON one at a time, as they arrive from requests or
+the write-ahead log, and kept alive while tracemalloc measures the heap.
+Besides the bare objects, it measures two whole stores. One is
+``DictEventStore``, a copy of the store as it was before records: each event
+is the dict from the request, in the same indexes, with a dict copy in the
+change journal. The other is ``EventStore``, measured fresh and again after
+a full listing, which leaves every record holding its cached JSON.
+
+    python benchmarks/memory.py --events 200000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from bisect import insort
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Set, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from encoding import encode_events  # noqa: E402
+from intervals import IntervalTree  # noqa: E402
+from records import Record  # noqa: E402
+from recurrence import series_span  # noqa: E402
+from search import SearchIndex  # noqa: E402
+from store import ChangeJournal, DayCounter, EventStore  # noqa: E402
+
+WORDS = ["team", "sync", "review", "lunch", "dentist", "call", "planning", "demo", "gym", "1:1"]
+
+
+def sample_lines(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(1, count + 1):
+        stamp = created + timedelta(seconds=rng.randrange(365 * 86400), milliseconds=rng.randrange(1000))
+        event = {
+            "id": i,
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(1, 3))),
+            "date": (start + timedelta(days=rng.randrange(730))).isoformat(),
+            "time": rng.choice(["", "%02d:%02d" % (rng.randrange(24), rng.randrange(0, 60, 15))]),
+            "priority": rng.choice(["low", "medium", "high"]),
+            "description": rng.choice(["", "bring laptop", "room 4"]),
+            "created": stamp.strftime("%Y-%m-%dT%H:%M:%S.") + "%03dZ" % (stamp.microsecond // 1000),
+            "recurrence": None,
+        }
+        yield json.dumps(event)
+
+
+class DictEventStore:
+    """The structures ``EventStore.add`` filled before events became
+    records, with the fields events have now"""
+
+    def __init__(self):
+        self._events: Dict[int, dict] = {}
+        self._dates: List[str] = []
+        self._by_date: Dict[str, List[Tuple[str, int]]] = {}
+        self._by_priority: Dict[str, Set[int]] = {}
+        self._series = IntervalTree()
+        self._day_counts = DayCounter()
+        self._journal = ChangeJournal()
+        self._search = SearchIndex()
+        self._next_id = 1
+        self._version = 0
+
+    def add(self, data: dict) -> dict:
+        self._version += 1
+        event = dict(data, id=self._next_id, revision=self._version)
+        self._next_id += 1
+        self._events[event["id"]] = event
+        if event.get("recurrence"):
+            self._series.add(*series_span(event), event["id"])
+        else:
+            bucket = self._by_date.get(event["date"])
+            if bucket is None:
+                bucket = self._by_date[event["date"]] = []
+                insort(self._dates, event["date"])
+            insort(bucket, (event.get("time") or "", event["id"]))
+            self._day_counts.add(date.fromisoformat(event["date"]).toordinal(), 1)
+        self._by_priority.setdefault(event["priority"], set()).add(event["id"])
+        self._search.add(event["id"], event["title"], event.get("description"))
+        self._journal.append(self._version, "put", event["id"], dict(event))
+        return event
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100_000)
+    args = parser.parse_args()
+    lines = list(sample_lines(args.events))
+
+    def build_store(kind=EventStore):
+        store = kind()
+        for line in lines:
+            store.add(json.loads(line))
+        return store
+
+    def build_listed_store():
+        store = build_store()
+        encode_events(store.all())
+        return store
+
+    results = [
+        ("dict per event", measure(lambda: [json.loads(line) for line in lines])),
+        ("Record per event", measure(lambda: [Record.pack(json.loads(line)) for line in lines])),
+        ("DictEventStore (dicts + indexes)", measure(lambda: build_store(DictEventStore))),
+        ("EventStore (records + indexes)", measure(build_store)),
+        ("EventStore after a full listing", measure(build_listed_store)),
+    ]
+    print(f"{args.events} events")
+    for name, size in results:
+        print(f"  {name:<32} {size / 2**20:8.1f} MiB  {size / args.events:6.0f} B/event")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+
+class Subscriber:
+    """A bounded, coalescing queue of changes for one connected client.
+
+    Changes to the same event replace each other, so a client that falls
+    behind only sees each event's latest state. If more than
+    ``max_pending`` distinct events pile up, the backlog is dropped and the
+    client is told to resync instead.
+    """
+
+    def __init__(self, max_pending: int = 256, client: bool = True):
+        self.max_pending = max_pending
+        self.client = client
+        self._pending: Dict[int, dict] = {}
+        self._overflowed = False
+        self._ready = asyncio.Event()
+
+    def push(self, change: dict) -> None:
+        if not self._overflowed:
+            self._pending.pop(change["id"], None)
+            self._pending[change["id"]] = change
+            if len(self._pending) > self.max_pending:
+                self._pending.clear()
+                self._overflowed = True
+        self._ready.set()
+
+    def push_resync(self) -> None:
+        self._pending.clear()
+        self._overflowed = True
+        self._ready.set()
+
+    async def next_batch(self) -> dict:
+        """Wait for changes and return them in the ``/api/events/changes`` shape"""
+        while not (self._pending or self._overflowed):
+            self._ready.clear()
+            await self._ready.wait()
+        changes = list(self._pending.values())
+        resync = self._overflowed
+        self._pending.clear()
+        self._overflowed = False
+        if resync:
+            return {"resync": True, "changes": []}
+        return {
+            "resync": False,
+            "version": max(change["seq"] for change in changes),
+            "changes": sorted(changes, key=lambda change: change["seq"]),
+        }
+
+
+class ChangeHub:
+    """Fans store changes out to every subscriber.
+
+    ``notify()`` is called after a mutation; it pulls the new entries from
+    the store's change journal with ``fetch`` and pushes them to each
+    subscriber. Pulls never overlap: notifications that arrive while one is
+    running are folded into a single follow-up pull.
+    """
+
+    def __init__(self, fetch: Callable[[int], Awaitable[dict]]):
+        self._fetch = fetch
+        self._subscribers: Set[Subscriber] = set()
+        self.version: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def __len__(self) -> int:
+        """Connected clients, leaving out in-process subscribers"""
+        return sum(subscriber.client for subscriber in self._subscribers)
+
+    def start(self, version: int) -> None:
+        self.version = version
+
+    def subscribe(self, max_pending: int = 256, client: bool = True) -> Subscriber:
+        subscriber = Subscriber(max_pending, client)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def notify(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._dirty = True
+            return
+        self._task = asyncio.get_running_loop().create_task(self._pull())
+
+    async def _pull(self) -> None:
+        self._dirty = True
+        while self._dirty:
+            self._dirty = False
+            if self.version is None:
+                continue
+            result = await self._fetch(self.version)
+            self.version = result["version"]
+            if not self._subscribers:
+                continue
+            if result["resync"]:
+                for subscriber in list(self._subscribers):
+                    subscriber.push_resync()
+                continue
+            for change in result["changes"]:
+                for subscriber in list(self._subscribers):
+                    subscriber.push(change)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
@@ -0,0 +1,135 @@
+import codecs
+import json
+import zlib
+from typing import AsyncIterator, Iterable, Iterator
+
+from encoding import encode_event
+
+_decoder = json.JSONDecoder()
+
+
+class BulkFormatError(ValueError):
+    """Raised when a bulk upload body is not NDJSON or a JSON array"""
+
+
+async def decompress(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Inflate a gzip-encoded body as it streams in"""
+    inflater = zlib.decompressobj(wbits=31)
+    async for chunk in chunks:
+        data = inflater.decompress(chunk)
+        if data:
+            yield data
+    tail = inflater.flush()
+    if tail:
+        yield tail
+
+
+async def iter_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    """Parse a streamed body holding either NDJSON or a single JSON array.
+
+    The format is picked from the first non-whitespace character, and
+    records are yielded as soon as they are complete so the whole body
+    never has to be held in memory.
+    """
+    buffer = ""
+    is_array = None
+    done = False
+    text = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        buffer += text.decode(chunk)
+        if is_array is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                continue
+            is_array = stripped[0] == "["
+            buffer = stripped[1:] if is_array else stripped
+        if is_array:
+            records, buffer, done = _parse_array(buffer, final=False, done=done)
+        else:
+            records, buffer = _parse_lines(buffer, final=False)
+        for record in records:
+            yield record
+    if is_array:
+        records, buffer, done = _parse_array(buffer, final=True, done=done)
+        if not done:
+            raise BulkFormatError("unterminated JSON array")
+    elif is_array is not None:
+        records, buffer = _parse_lines(buffer, final=True)
+    else:
+        records = []
+    for record in records:
+        yield record
+
+
+def _parse_lines(buffer: str, final: bool):
+    lines = buffer.split("\n")
+    rest = "" if final else lines.pop()
+    records = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            records.append(_loads(line))
+    return records, rest
+
+
+def _parse_array(buffer: str, final: bool, done: bool):
+    records = []
+    pos = 0
+    while not done:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer):
+            break
+        if buffer[pos] == "]":
+            done = True
+            pos += 1
+            break
+        try:
+            record, pos = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as exc:
+            # Incomplete values are fine mid-stream; wait for more bytes
+            if final:
+                raise BulkFormatError(f"invalid JSON: {exc}") from None
+            break
+        records.append(record)
+    rest = buffer[pos:]
+    if done and rest.strip():
+        raise BulkFormatError("unexpected data after JSON array")
+    return records, rest, done
+
+
+def _loads(line: str):
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        raise BulkFormatError(f"invalid JSON line: {exc}") from None
+
+
+def export_lines(batches: Iterable[list], as_array: bool = False) -> Iterator[bytes]:
+    """Encode batches of events as NDJSON, or as one JSON array"""
+    first = True
+    if as_array:
+        yield b"["
+    for batch in batches:
+        if not batch:
+            continue
+        encoded = [encode_event(event) for event in batch]
+        if as_array:
+            chunk = b",".join(encoded)
+            yield chunk if first else b"," + chunk
+        else:
+            yield b"\n".join(encoded) + b"\n"
+        first = False
+    if as_array:
+        yield b"]"
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a byte stream on the fly"""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
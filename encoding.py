@@ -0,0 +1,53 @@
+import json
+from typing import Any, Iterable
+
+from metrics import CACHE_LOOKUPS
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is the fallback
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, encoded with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def dumps_to_keep(content: Any) -> bytes:
+    """``dumps()`` for bytes that will be held on to. orjson's results can
+    carry several times their length in spare capacity, so they are copied
+    to an exact-size object first."""
+    if orjson is not None:
+        return memoryview(orjson.dumps(content)).tobytes()
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def encode_event(event: dict) -> bytes:
+    """An event's JSON, reusing the bytes cached on its stored record if any"""
+    record = getattr(event, "record", None)
+    return record.json() if record is not None else dumps(event)
+
+
+def encode_events(events: Iterable[dict]) -> bytes:
+    """A JSON array of events, spliced together from their encodings.
+    Counts how many records had their JSON cached, once per array."""
+    parts = []
+    hits = misses = 0
+    for event in events:
+        record = getattr(event, "record", None)
+        if record is None:
+            parts.append(dumps(event))
+            continue
+        if record.encoded is None:
+            misses += 1
+        else:
+            hits += 1
+        parts.append(record.json())
+    if hits:
+        CACHE_LOOKUPS.inc("record_json", "hit", amount=hits)
+    if misses:
+        CACHE_LOOKUPS.inc("record_json", "miss", amount=misses)
+    return b"[" + b",".join(parts) + b"]"
@@ -0,0 +1,102 @@
+from datetime import date
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from records import CLOCK_PATTERN, MINUTES_PER_DAY
+from recurrence import HORIZON_DAYS, occurrences
+
+# The longest an event may last; also how far before a window overlap
+# queries have to look for events still running into it
+MAX_DURATION = 7 * MINUTES_PER_DAY
+
+
+class Overlaps(Exception):
+    """A new event would overlap busy time; ``events`` are the ones in the way"""
+
+    def __init__(self, events: List[dict]):
+        super().__init__(f"overlaps events {[event['id'] for event in events]}")
+        self.events = events
+
+
+def busy_span(event: dict) -> Optional[Tuple[int, int]]:
+    """The [start, end) an event keeps busy, in minutes from midnight of day
+    ordinal 0, or None unless it has both an ``HH:MM`` time and a duration"""
+    duration = event.get("duration")
+    time = event.get("time")
+    if not duration or not time or not CLOCK_PATTERN.fullmatch(time):
+        return None
+    start = date.fromisoformat(event["date"]).toordinal() * MINUTES_PER_DAY
+    start += int(time[:2]) * 60 + int(time[3:])
+    return start, start + duration
+
+
+def planned_spans(event: dict) -> List[Tuple[int, int]]:
+    """The busy spans a new event would take: its own, or for a series those
+    of its occurrences in the ``HORIZON_DAYS`` from its first date"""
+    if not event.get("recurrence"):
+        span = busy_span(event)
+        return [span] if span is not None else []
+    if busy_span(event) is None:
+        return []
+    first = date.fromisoformat(event["date"])
+    last = date.fromordinal(min(first.toordinal() + HORIZON_DAYS, date.max.toordinal()))
+    return [
+        busy_span(dict(event, date=day.isoformat()))
+        for day in occurrences(event, first, last)
+    ]
+
+
+def busy_days(event: dict, clock: int, duration: int, start: int, end: int) -> Iterator[date]:
+    """Days on which a series whose occurrences run from ``clock`` for
+    ``duration`` minutes has one busy at some point in [start, end)"""
+    first = max(1, -((clock + duration - 1 - start) // MINUTES_PER_DAY))
+    last = min(date.max.toordinal(), (end - 1 - clock) // MINUTES_PER_DAY)
+    if first > last:
+        return iter(())
+    return occurrences(event, date.fromordinal(first), date.fromordinal(last))
+
+
+def parse_moment(text: str, end: bool = False) -> int:
+    """Minutes for ``YYYY-MM-DD`` or ``YYYY-MM-DDTHH:MM``; a bare date is
+    its midnight, or the following one when it ends a window"""
+    day = date.fromisoformat(text[:10]).toordinal()
+    if len(text) == 10:
+        return (day + end) * MINUTES_PER_DAY
+    if text[10] != "T" or not CLOCK_PATTERN.fullmatch(text[11:]):
+        raise ValueError("time must be in HH:MM format")
+    return day * MINUTES_PER_DAY + int(text[11:13]) * 60 + int(text[14:16])
+
+
+def format_moment(minute: int) -> str:
+    day, minute = divmod(minute, MINUTES_PER_DAY)
+    return "%sT%02d:%02d" % (date.fromordinal(day).isoformat(), *divmod(minute, 60))
+
+
+def free_busy(events: Iterable[dict], start: int, end: int) -> dict:
+    """Merge the busy spans of ``events`` within [start, end) into busy
+    blocks, listing the events behind each, and the free gaps between them"""
+    busy: List[dict] = []
+    free: List[dict] = []
+    block_start = block_end = None
+    ids: List[int] = []
+    cursor = start
+    for span_start, span_end, event_id in sorted(
+        (*busy_span(event), event["id"]) for event in events
+    ):
+        span_start, span_end = max(span_start, start), min(span_end, end)
+        if block_end is not None and span_start <= block_end:
+            block_end = max(block_end, span_end)
+            if event_id not in ids:
+                ids.append(event_id)
+            continue
+        if block_end is not None:
+            busy.append({"start": format_moment(block_start), "end": format_moment(block_end), "ids": ids})
+            cursor = block_end
+        if span_start > cursor:
+            free.append({"start": format_moment(cursor), "end": format_moment(span_start)})
+        block_start, block_end, ids = span_start, span_end, [event_id]
+    if block_end is not None:
+        busy.append({"start": format_moment(block_start), "end": format_moment(block_end), "ids": ids})
+        cursor = block_end
+    if cursor < end:
+        free.append({"start": format_moment(cursor), "end": format_moment(end)})
+    return {"start": format_moment(start), "end": format_moment(end), "busy": busy, "free": free}
@@ -0,0 +1,193 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, Iterator, List, Tuple
+
+from metrics import CACHE_LOOKUPS
+from records import CLOCK_PATTERN, STAMP_PATTERN
+from recurrence import series_span
+
+PRODUCT_ID = "-//Calendar & Event Manager//EN"
+
+HEADER = (
+    b"BEGIN:VCALENDAR\r\n"
+    b"VERSION:2.0\r\n"
+    b"PRODID:" + PRODUCT_ID.encode() + b"\r\n"
+    b"CALSCALE:GREGORIAN\r\n"
+    b"X-WR-CALNAME:Calendar\r\n"
+)
+FOOTER = b"END:VCALENDAR\r\n"
+
+# iCalendar priorities run from 1 (highest) to 9 (lowest)
+PRIORITY_LEVELS = {"high": 1, "medium": 5, "low": 9}
+
+RRULE_FREQUENCIES = {"daily": "DAILY", "weekly": "WEEKLY", "monthly": "MONTHLY"}
+
+# Stands in for DTSTAMP, which is required, on events without a creation time
+UNKNOWN_STAMP = "19700101T000000Z"
+
+# Lines longer than this many octets are folded onto continuation lines
+MAX_LINE = 75
+
+# Fragments of events that have no stored record to hold them, by (id, revision)
+FRAGMENT_CACHE_SIZE = 10_000
+
+
+def vevent(event: dict) -> bytes:
+    """An event as a VEVENT block.
+
+    Events with an ``HH:MM`` time start then in floating (local) time and
+    last their ``duration``; the rest are all-day. A series is one VEVENT
+    with an RRULE and EXDATEs, and a reminder becomes a VALARM.
+    """
+    time = event.get("time") or ""
+    timed = CLOCK_PATTERN.fullmatch(time) is not None
+    day = event["date"].replace("-", "")
+    if timed:
+        start = "DTSTART:%sT%s00" % (day, time.replace(":", ""))
+    else:
+        start = "DTSTART;VALUE=DATE:" + day
+    lines = [
+        "BEGIN:VEVENT",
+        "UID:%d@calendar" % event["id"],
+        "DTSTAMP:" + _stamp(event.get("created")),
+        "SEQUENCE:%d" % (event.get("revision") or 0),
+        start,
+    ]
+    if timed and event.get("duration"):
+        lines.append("DURATION:PT%dM" % event["duration"])
+    rule = event.get("recurrence")
+    if rule:
+        lines.append(_rrule(event, timed))
+        if rule.get("exceptions"):
+            suffix = "T%s00" % time.replace(":", "") if timed else ""
+            days = ",".join(day.replace("-", "") + suffix for day in rule["exceptions"])
+            lines.append(("EXDATE:" if timed else "EXDATE;VALUE=DATE:") + days)
+    lines.append("SUMMARY:" + _text(event["title"]))
+    if event.get("description"):
+        lines.append("DESCRIPTION:" + _text(event["description"]))
+    level = PRIORITY_LEVELS.get(event["priority"])
+    if level is not None:
+        lines.append("PRIORITY:%d" % level)
+    if event.get("reminder") is not None:
+        lines += [
+            "BEGIN:VALARM",
+            "ACTION:DISPLAY",
+            "TRIGGER:-PT%dM" % event["reminder"],
+            "DESCRIPTION:" + _text(event["title"]),
+            "END:VALARM",
+        ]
+    lines.append("END:VEVENT")
+    return b"".join(_fold(line) for line in lines)
+
+
+class FragmentCache:
+    """Recently encoded VEVENTs keyed by event id and revision, so an update
+    (which always bumps the revision) never serves a stale fragment and a
+    deleted event's fragment just ages out. Shared by feed threads."""
+
+    def __init__(self, capacity: int = FRAGMENT_CACHE_SIZE):
+        self.capacity = capacity
+        self._fragments: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encode(self, event: dict) -> Tuple[bytes, bool]:
+        """The event's VEVENT and whether it came from the cache"""
+        key = (event["id"], event.get("revision") or 0)
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment, True
+        fragment = vevent(event)
+        with self._lock:
+            self._fragments[key] = fragment
+            if len(self._fragments) > self.capacity:
+                self._fragments.popitem(last=False)
+        return fragment, False
+
+
+fragments = FragmentCache()
+
+
+def encode_vevents(events: List[dict]) -> bytes:
+    """VEVENTs for a batch of events. Stored records keep their fragment
+    like their JSON, for as long as the record lives; other events go
+    through the shared ``FragmentCache``."""
+    parts = []
+    hits = 0
+    for event in events:
+        record = getattr(event, "record", None)
+        if record is None:
+            fragment, hit = fragments.encode(event)
+        else:
+            hit = record.ics is not None
+            if not hit:
+                record.ics = vevent(event)
+            fragment = record.ics
+        hits += hit
+        parts.append(fragment)
+    if hits:
+        CACHE_LOOKUPS.inc("ics_fragment", "hit", amount=hits)
+    if len(events) > hits:
+        CACHE_LOOKUPS.inc("ics_fragment", "miss", amount=len(events) - hits)
+    return b"".join(parts)
+
+
+def calendar_lines(batches: Iterable[List[dict]]) -> Iterator[bytes]:
+    """A VCALENDAR of the events in ``batches``, one chunk per batch"""
+    yield HEADER
+    for batch in batches:
+        if batch:
+            yield encode_vevents(batch)
+    yield FOOTER
+
+
+def _rrule(event: dict, timed: bool) -> str:
+    rule = event["recurrence"]
+    parts = ["FREQ=" + RRULE_FREQUENCIES[rule["frequency"]]]
+    if rule.get("interval", 1) != 1:
+        parts.append("INTERVAL=%d" % rule["interval"])
+    if rule.get("count") and not rule.get("until"):
+        parts.append("COUNT=%d" % rule["count"])
+    elif rule.get("until"):
+        # RRULE may not have both; the series ends at whichever comes first
+        last = date.fromordinal(series_span(event)[1]).isoformat().replace("-", "")
+        parts.append("UNTIL=" + last + ("T235959" if timed else ""))
+    return "RRULE:" + ";".join(parts)
+
+
+def _stamp(created) -> str:
+    if created and STAMP_PATTERN.fullmatch(created):
+        return created[:19].replace("-", "").replace(":", "") + "Z"
+    return UNKNOWN_STAMP
+
+
+def _text(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+        .replace("\r", "")
+    )
+
+
+def _fold(line: str) -> bytes:
+    """A content line with its CRLF, folded at ``MAX_LINE`` octets without
+    splitting a UTF-8 character"""
+    data = line.encode()
+    if len(data) <= MAX_LINE:
+        return data + b"\r\n"
+    parts = []
+    start, width = 0, MAX_LINE
+    while len(data) - start > width:
+        cut = start + width
+        while data[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(data[start:cut])
+        # Continuation lines start with a space, which counts toward the limit
+        start, width = cut, MAX_LINE - 1
+    parts.append(data[start:])
+    return b"\r\n ".join(parts) + b"\r\n"
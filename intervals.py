@@ -0,0 +1,126 @@
+import random
+from typing import Hashable, Iterator, List, Optional, Tuple
+
+
+class _Node:
+    __slots__ = ("start", "end", "key", "priority", "max_end", "left", "right")
+
+    def __init__(self, start: int, end: int, key: Hashable):
+        self.start = start
+        self.end = end
+        self.key = key
+        self.priority = random.random()
+        self.max_end = end
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+
+class IntervalTree:
+    """Closed integer intervals in a treap ordered by start and augmented
+    with the largest end in each subtree.
+
+    Insert and remove are O(log n) expected. ``overlapping()`` skips every
+    subtree that cannot reach the query, so it visits O(log n) nodes per
+    match instead of scanning everything. Keys must be unique.
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, start: int, end: int, key: Hashable) -> None:
+        self._root = self._insert(self._root, _Node(start, end, key))
+        self._size += 1
+
+    def remove(self, start: int, end: int, key: Hashable) -> None:
+        """Remove an interval previously added with the same arguments"""
+        self._root, removed = self._delete(self._root, (start, end, repr(key)))
+        if removed:
+            self._size -= 1
+
+    def overlapping(self, start: int, end: int) -> Iterator[Tuple[int, int, Hashable]]:
+        """Yield (start, end, key) for every interval intersecting [start, end],
+        in order of interval start"""
+        stack: List[_Node] = []
+        node = self._root
+        while stack or node is not None:
+            if node is not None:
+                # Nothing in this subtree reaches the query; skip it whole
+                if node.max_end < start:
+                    node = None
+                    continue
+                stack.append(node)
+                node = node.left
+                continue
+            node = stack.pop()
+            if node.start > end:
+                return
+            if node.end >= start:
+                yield node.start, node.end, node.key
+            node = node.right
+
+    @staticmethod
+    def _order(node: _Node) -> Tuple[int, int, str]:
+        return (node.start, node.end, repr(node.key))
+
+    @staticmethod
+    def _update(node: _Node) -> None:
+        node.max_end = node.end
+        if node.left is not None and node.left.max_end > node.max_end:
+            node.max_end = node.left.max_end
+        if node.right is not None and node.right.max_end > node.max_end:
+            node.max_end = node.right.max_end
+
+    def _rotate_right(self, node: _Node) -> _Node:
+        left = node.left
+        node.left, left.right = left.right, node
+        self._update(node)
+        self._update(left)
+        return left
+
+    def _rotate_left(self, node: _Node) -> _Node:
+        right = node.right
+        node.right, right.left = right.left, node
+        self._update(node)
+        self._update(right)
+        return right
+
+    def _insert(self, root: Optional[_Node], node: _Node) -> _Node:
+        if root is None:
+            return node
+        if self._order(node) < self._order(root):
+            root.left = self._insert(root.left, node)
+            if root.left.priority > root.priority:
+                root = self._rotate_right(root)
+        else:
+            root.right = self._insert(root.right, node)
+            if root.right.priority > root.priority:
+                root = self._rotate_left(root)
+        self._update(root)
+        return root
+
+    def _delete(self, root: Optional[_Node], order: tuple):
+        if root is None:
+            return None, False
+        root_order = self._order(root)
+        if order < root_order:
+            root.left, removed = self._delete(root.left, order)
+        elif order > root_order:
+            root.right, removed = self._delete(root.right, order)
+        elif root.left is None:
+            return root.right, True
+        elif root.right is None:
+            return root.left, True
+        else:
+            # Rotate the node down towards a leaf, then remove it there
+            if root.left.priority > root.right.priority:
+                root = self._rotate_right(root)
+                root.right, removed = self._delete(root.right, order)
+            else:
+                root = self._rotate_left(root)
+                root.left, removed = self._delete(root.left, order)
+        self._update(root)
+        return root, removed
@@ -0,0 +1,210 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Request latencies in seconds, from half a millisecond to ten seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INFINITE_BUCKET = 'le="+Inf"'
+
+
+class Metric:
+    """A metric family: one value (or histogram) per combination of label
+    values. Updates take a lock, since store calls may run in threads."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+    def _labels(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(labels)} {_number(value)}" for labels, value in values]
+
+
+class Gauge(Metric):
+    """A value set when it is read, such as the store's size at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._labels(labels)} {_number(value)}" for labels, value in values]
+
+
+class Histogram(Metric):
+    """Counts of observations per bucket, plus their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # Per label values: the count in each bucket, then above the last one
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[bisect_left(self.buckets, value)] += 1
+            self._sums[labels] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = sorted((labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items())
+        lines = []
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{self._labels(labels, INFINITE_BUCKET)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics a process exposes, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, help, labels, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Shared by every module with a cache, labelled by cache and hit or miss
+CACHE_LOOKUPS = REGISTRY.counter(
+    "calendar_cache_lookups_total", "Cache lookups by cache and result", ("cache", "result")
+)
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "calendar_http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status")
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "calendar_http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route")
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing HTTP requests per route.
+
+    Routes are labelled by their path template (``/api/events/{event_id}``)
+    so ids do not multiply the series; requests no route matched share
+    ``unmatched``. A request ends when its response body is sent, so
+    streaming responses are timed to their last chunk. Unhandled errors
+    count as 500s.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(scope["method"], path, str(status))
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], path)
+
+
+def rss_bytes() -> int:
+    """The process's resident set size, or its peak where that is all there is"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
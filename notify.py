@@ -0,0 +1,73 @@
+import asyncio
+import os
+import socket
+from typing import Callable, Optional
+
+
+class ChangeNotifier:
+    """Wakes the other worker processes sharing a store after a write.
+
+    Every process binds a Unix datagram socket in a shared directory.
+    ``publish()`` sends a one-byte datagram to every other socket there,
+    and a process receiving one runs its callback, typically to pull the
+    new changes from the store. Sockets left behind by dead processes are
+    removed the first time a send to them fails.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}.sock")
+        self._sock: Optional[socket.socket] = None
+        self._callback: Optional[Callable[[], None]] = None
+
+    @staticmethod
+    def supported() -> bool:
+        return hasattr(socket, "AF_UNIX")
+
+    def start(self, callback: Callable[[], None]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        self._callback = callback
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+
+    def _on_readable(self) -> None:
+        # Any number of queued datagrams means the same thing: something changed
+        try:
+            while self._sock.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+        self._callback()
+
+    def publish(self) -> None:
+        if self._sock is None:
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self._sock.sendto(b"!", path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                # The receiver already has wakeups queued; one more adds nothing
+                pass
+
+    def close(self) -> None:
+        if self._sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,293 @@
+import json
+import logging
+import mmap
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; the directory is not locked there
+    fcntl = None
+
+logger = logging.getLogger("calendar.persistence")
+
+
+class WriteAheadLog:
+    """Append-only mutation log with group commit and snapshot compaction.
+
+    Each mutation is written as one JSON line tagged with a log sequence
+    number (lsn); a ``batch`` record holds several that must be applied
+    together. ``commit()`` makes everything appended so far durable;
+    concurrent callers share a single fsync instead of issuing one each.
+    Once ``compact_every`` records have accumulated the owner is expected
+    to call ``snapshot()``, which rewrites the full state so startup only
+    has to replay what came after it. The snapshot is written by a
+    background thread: it sets the log so far aside as ``events.wal.N``
+    while appends carry on in a fresh ``events.wal``, and deletes each
+    set-aside log once a snapshot in place covers all of its records.
+
+    The log belongs to a single process: ``load()`` takes an exclusive lock
+    on the directory and fails if another process already holds it.
+    """
+
+    def __init__(self, directory: str, compact_every: int = 100_000):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.wal_path = os.path.join(directory, "events.wal")
+        self.snapshot_path = os.path.join(directory, "events.snapshot")
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._lsn = 0
+        self._synced = 0
+        self._syncing = False
+        self._since_snapshot = 0
+        self.snapshot_lsn = 0
+        # The owner's own state from the snapshot header; see ``snapshot()``
+        self.meta: Dict[str, Any] = {}
+        self._file = None
+        # The set-aside logs, oldest first, with the lsn each one ends at
+        self._set_aside: List[Tuple[str, int]] = []
+        # The log just set aside, until the snapshot thread has synced it
+        self._previous = None
+        self._lock_file = None
+        self._snapshotter: Optional[threading.Thread] = None
+
+    def _acquire_directory(self) -> None:
+        self._lock_file = open(os.path.join(os.path.dirname(self.wal_path), "LOCK"), "w")
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(
+                f"{os.path.dirname(self.wal_path)} is in use by another process; "
+                "use CALENDAR_DB to share events between worker processes"
+            ) from None
+
+    def load(
+        self,
+        replay: Optional[Callable[[dict], None]] = None,
+        decode: Optional[Callable[[dict], Any]] = None,
+    ) -> Tuple[Dict[int, Any], int]:
+        """Rebuild state from the snapshot plus the log tail after it.
+
+        Returns the events keyed by id and the next id to allocate, then
+        opens the log for appending, cutting off any record a crash left
+        half written. ``replay`` is called with each tail
+        record, so derived state saved with the snapshot can be brought up
+        to date. ``decode`` converts each event dict as it is read, so the
+        full set of dicts never has to be held at once.
+        """
+        decode = decode or (lambda event: event)
+        self._acquire_directory()
+        events: Dict[int, Any] = {}
+        snapshot_lsn, next_id = 0, 1
+        if os.path.exists(self.snapshot_path) and os.path.getsize(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    header = json.loads(mm.readline())
+                    snapshot_lsn, next_id = header["lsn"], header["next_id"]
+                    self.meta = header.get("meta", {})
+                    for line in iter(mm.readline, b""):
+                        event = json.loads(line)
+                        events[event["id"]] = decode(event)
+        self._lsn = self.snapshot_lsn = snapshot_lsn
+        # Logs set aside for snapshots that never finished come first
+        for path in self._set_aside_paths():
+            self._replay(path, events, replay, decode)
+            self._set_aside.append((path, self._lsn))
+        if os.path.exists(self.wal_path):
+            self._replay(self.wal_path, events, replay, decode)
+        if events:
+            next_id = max(next_id, max(events) + 1)
+        self._synced = self._lsn
+        self._file = open(self.wal_path, "ab")
+        return events, next_id
+
+    def _set_aside_paths(self) -> List[str]:
+        prefix = os.path.basename(self.wal_path) + "."
+        numbers = sorted(
+            int(name[len(prefix):])
+            for name in os.listdir(self.directory)
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        )
+        return [f"{self.wal_path}.{number}" for number in numbers]
+
+    def _replay(
+        self,
+        path: str,
+        events: Dict[int, Any],
+        replay: Optional[Callable[[dict], None]],
+        decode: Callable[[dict], Any],
+    ) -> None:
+        with open(path, "r+b") as f:
+            whole = 0
+            for line in f:
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    # A torn write from a crash can only be the last line;
+                    # drop it so later appends are not lost behind it
+                    f.truncate(whole)
+                    break
+                whole += len(line)
+                if record["lsn"] <= self._lsn:
+                    continue
+                for change in record["records"] if record["op"] == "batch" else (record,):
+                    if replay is not None:
+                        replay(change)
+                    self._apply(events, change, decode)
+                self._lsn = record["lsn"]
+                self._since_snapshot += 1
+
+    @staticmethod
+    def _apply(events: Dict[int, Any], record: dict, decode: Callable[[dict], Any]) -> None:
+        if record["op"] in ("put", "unarchive"):
+            events[record["event"]["id"]] = decode(record["event"])
+        elif record["op"] == "del":
+            events.pop(record["id"], None)
+        elif record["op"] == "archive":
+            for event_id in record["ids"]:
+                events.pop(event_id, None)
+
+    def append(self, record: dict) -> int:
+        """Write a mutation record to the log buffer and return its lsn"""
+        with self._lock:
+            self._lsn += 1
+            record = dict(record, lsn=self._lsn)
+            self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            self._since_snapshot += 1
+            return self._lsn
+
+    def commit(self) -> None:
+        """Block until every record appended so far has been fsynced.
+
+        Whichever caller finds no sync in progress becomes the leader and
+        flushes everything written up to that point; the rest wait for it
+        and return without touching the disk if it already covered them.
+        """
+        with self._cond:
+            target = self._lsn
+            while self._synced < target:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                self._file.flush()
+                upto = self._lsn
+                fd = self._file.fileno()
+                previous = self._previous
+                self._lock.release()
+                try:
+                    os.fsync(fd)
+                    if previous is not None:
+                        # Records from before a switch the snapshot thread
+                        # has not synced yet, and the rename itself
+                        os.fsync(previous.fileno())
+                        self._fsync_directory()
+                finally:
+                    self._lock.acquire()
+                    self._syncing = False
+                    self._synced = max(self._synced, upto)
+                    self._cond.notify_all()
+
+    def should_compact(self) -> bool:
+        return self._since_snapshot >= self.compact_every and not self.snapshotting
+
+    @property
+    def snapshotting(self) -> bool:
+        return self._snapshotter is not None and self._snapshotter.is_alive()
+
+    def snapshot(self, events: Iterable[dict], next_id: int, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Start writing the full state to a new snapshot.
+
+        ``events`` is consumed on the snapshot thread, so it must not see
+        later changes: iterate over a copy. ``meta`` is saved in the header
+        and comes back as ``self.meta`` from ``load()``. This only notes the
+        lsn the state belongs to; switching logs, fsyncs and writing all
+        happen on the snapshot thread, so appends are never held up here.
+        """
+        self.finish_snapshot()
+        with self._lock:
+            lsn = self._lsn
+            self._since_snapshot = 0
+        self._snapshotter = threading.Thread(
+            target=self._write_snapshot, args=(events, lsn, next_id, meta), name="wal-snapshot", daemon=True
+        )
+        self._snapshotter.start()
+
+    def finish_snapshot(self) -> None:
+        """Wait for a snapshot being written to be in place"""
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+            self._snapshotter = None
+
+    def _switch(self) -> None:
+        """Set the log so far aside and carry on appending to a fresh one"""
+        number = int(self._set_aside[-1][0].rsplit(".", 1)[1]) + 1 if self._set_aside else 1
+        path = f"{self.wal_path}.{number}"
+        with self._lock:
+            self._file.flush()
+            os.replace(self.wal_path, path)
+            self._previous, self._file = self._file, open(self.wal_path, "ab")
+            self._set_aside.append((path, self._lsn))
+        previous = self._previous
+        os.fsync(previous.fileno())
+        self._fsync_directory()
+        with self._cond:
+            # A commit leader may still be syncing the old file
+            while self._syncing:
+                self._cond.wait()
+            self._previous = None
+        previous.close()
+
+    def _fsync_directory(self) -> None:
+        """Make renames and removals in the log directory durable"""
+        if os.name == "nt":
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write_snapshot(self, events: Iterable[dict], lsn: int, next_id: int, meta: Optional[dict]) -> None:
+        tmp_path = self.snapshot_path + ".tmp"
+        try:
+            self._switch()
+            with open(tmp_path, "wb") as f:
+                header = {"lsn": lsn, "next_id": next_id}
+                if meta:
+                    header["meta"] = meta
+                f.write(json.dumps(header).encode() + b"\n")
+                for event in events:
+                    f.write(json.dumps(event, separators=(",", ":")).encode() + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # The new snapshot must be on disk before any log it covers goes
+            self._fsync_directory()
+        except Exception:
+            # The set-aside logs are kept, so nothing is lost; the next snapshot retries
+            logger.exception("Writing the snapshot at lsn %d failed", lsn)
+            return
+        self.snapshot_lsn = lsn
+        # A log that also holds records appended after ``lsn`` (between the
+        # call to ``snapshot()`` and the switch) waits for the next snapshot
+        while self._set_aside and self._set_aside[0][1] <= lsn:
+            os.remove(self._set_aside.pop(0)[0])
+
+    def close(self) -> None:
+        self.finish_snapshot()
+        if self._file is not None:
+            self.commit()
+            self._file.close()
+            self._file = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
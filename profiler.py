@@ -0,0 +1,50 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict
+
+
+class SamplingProfiler:
+    """Samples the call stacks of every thread in the process at a fixed
+    interval, without tracing, so it can run against a live worker.
+
+    ``profile()`` blocks for the whole capture and returns the stacks in
+    the collapsed format flame graph tools read: one line per distinct
+    stack, frames separated by ``;`` from the thread name down, then the
+    number of samples it was seen in. Only one capture runs at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float) -> str:
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already being captured")
+        try:
+            stacks = self._sample(seconds, interval)
+        finally:
+            self._lock.release()
+        lines = sorted(f"{stack} {count}" for stack, count in stacks.items())
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _sample(seconds: float, interval: float) -> Dict[str, int]:
+        me = threading.get_ident()
+        stacks: Dict[str, int] = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                stack = ";".join(reversed(frames))
+                stacks[stack] = stacks.get(stack, 0) + 1
+            time.sleep(interval)
+        return stacks
@@ -0,0 +1,175 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+from encoding import dumps_to_keep
+
+CLOCK_PATTERN = re.compile(r"([01][0-9]|2[0-3]):[0-5][0-9]")
+STAMP_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{3}Z")
+
+# Every canonical HH:MM string, shared by all records showing that time
+CLOCK_TEXT = ["%02d:%02d" % divmod(minute, 60) for minute in range(24 * 60)]
+
+MINUTES_PER_DAY = 24 * 60
+
+EPOCH = datetime(1970, 1, 1)
+MILLISECOND = timedelta(milliseconds=1)
+
+# Priority names by code; any other priority is kept as given
+PRIORITY_NAMES: List[str] = ["low", "medium", "high"]
+PRIORITY_CODES: Dict[str, int] = {name: code for code, name in enumerate(PRIORITY_NAMES)}
+
+
+class Record:
+    """One stored event in packed form.
+
+    The date is kept as a day ordinal, the time as minutes past midnight,
+    the priority as a small code and ``created`` as epoch milliseconds, so
+    a record holds a handful of pointers to small ints instead of a dict of
+    strings. Times and timestamps not in the canonical ``HH:MM`` and
+    ``toISOString()`` forms, and priorities other than the usual three, are
+    kept as given, so every event round-trips exactly through ``to_dict()``.
+
+    ``duration`` is in minutes; ``span()`` turns it into the busy time of
+    an event with a canonical time. ``reminder`` is how many minutes before
+    the event starts its reminder is due.
+
+    Records are never changed in place; an update builds a new one, which
+    lets the change journal and readers hold on to old ones safely. It also
+    means a record's JSON never goes stale, so ``json()`` encodes it once
+    and keeps the bytes for every later response. Its iCalendar fragment is
+    kept in ``ics`` the same way.
+    """
+
+    __slots__ = (
+        "id", "title", "day", "clock", "duration", "reminder", "level", "description", "stamp", "recurrence",
+        "revision", "encoded", "ics",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        day: int,
+        clock: Union[int, str, None],
+        duration: Optional[int],
+        reminder: Optional[int],
+        level: Union[int, str],
+        description: Optional[str],
+        stamp: Union[int, str, None],
+        recurrence: Optional[dict],
+        revision: int,
+    ):
+        self.id = id
+        self.title = title
+        self.day = day
+        self.clock = clock
+        self.duration = duration
+        self.reminder = reminder
+        self.level = level
+        self.description = description
+        self.stamp = stamp
+        self.recurrence = recurrence
+        self.revision = revision
+        self.encoded: Optional[bytes] = None
+        self.ics: Optional[bytes] = None
+
+    @classmethod
+    def pack(cls, data: dict) -> "Record":
+        """Build a record from an event in the public ``Event`` shape"""
+        return cls(
+            data["id"],
+            data["title"],
+            date.fromisoformat(data["date"]).toordinal(),
+            _pack_clock(data.get("time")),
+            data.get("duration"),
+            data.get("reminder"),
+            priority_code(data["priority"]),
+            data.get("description"),
+            _pack_stamp(data.get("created")),
+            data.get("recurrence"),
+            data.get("revision") or 0,
+        )
+
+    @property
+    def date(self) -> str:
+        return date.fromordinal(self.day).isoformat()
+
+    @property
+    def time(self) -> Optional[str]:
+        return CLOCK_TEXT[self.clock] if type(self.clock) is int else self.clock
+
+    @property
+    def priority(self) -> str:
+        return PRIORITY_NAMES[self.level] if type(self.level) is int else self.level
+
+    @property
+    def created(self) -> Optional[str]:
+        return _format_stamp(self.stamp) if type(self.stamp) is int else self.stamp
+
+    def key(self) -> Tuple[str, str, int]:
+        """The (date, time, id) listing order shared with ``sort_key()``"""
+        return (self.date, self.time or "", self.id)
+
+    def span(self) -> Optional[Tuple[int, int]]:
+        """The [start, end) minutes the event keeps busy, as ``busy_span()``"""
+        if self.duration and type(self.clock) is int:
+            start = self.day * MINUTES_PER_DAY + self.clock
+            return start, start + self.duration
+        return None
+
+    def to_dict(self) -> "StoredEvent":
+        """The event in the public ``Event`` shape"""
+        event = StoredEvent(
+            id=self.id,
+            title=self.title,
+            date=self.date,
+            time=self.time,
+            duration=self.duration,
+            reminder=self.reminder,
+            priority=self.priority,
+            description=self.description,
+            created=self.created,
+            recurrence=self.recurrence,
+            revision=self.revision,
+        )
+        event.record = self
+        return event
+
+    def json(self) -> bytes:
+        """The event's JSON, encoded on first use and cached"""
+        if self.encoded is None:
+            self.encoded = dumps_to_keep(self.to_dict())
+        return self.encoded
+
+
+class StoredEvent(dict):
+    """An event dict built from a ``Record``, linked back to it so responses
+    can reuse the record's cached JSON. Treat it as read-only."""
+
+    __slots__ = ("record",)
+
+
+def priority_code(name: str) -> Union[int, str]:
+    return PRIORITY_CODES.get(name, name)
+
+
+def _pack_clock(value: Optional[str]) -> Union[int, str, None]:
+    if value and CLOCK_PATTERN.fullmatch(value):
+        return int(value[:2]) * 60 + int(value[3:])
+    return value
+
+
+def _pack_stamp(value: Optional[str]) -> Union[int, str, None]:
+    if not value or not STAMP_PATTERN.fullmatch(value):
+        return value
+    try:
+        moment = datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return value
+    stamp = (moment - EPOCH) // MILLISECOND + int(value[20:23])
+    return stamp if _format_stamp(stamp) == value else value
+
+
+def _format_stamp(stamp: int) -> str:
+    return (EPOCH + stamp * MILLISECOND).isoformat(timespec="milliseconds") + "Z"
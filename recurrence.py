@@ -0,0 +1,123 @@
+import heapq
+from datetime import date, timedelta
+from typing import Iterable, Iterator, Optional, Tuple
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+# How far past the start of an open-ended window series are expanded
+HORIZON_DAYS = 366
+
+
+def series_span(event: dict) -> Tuple[int, int]:
+    """First and last possible occurrence of a recurring event as ordinals"""
+    first = date.fromisoformat(event["date"])
+    return first.toordinal(), max(first, _last_date(first, event["recurrence"])).toordinal()
+
+
+def occurrences(event: dict, start: date, end: date) -> Iterator[date]:
+    """Lazily yield the dates a recurring event falls on within [start, end].
+
+    Jumps straight to the first candidate on or after ``start`` rather than
+    walking the series from its beginning, so a window in year ten costs
+    the same as one in year one.
+    """
+    first = date.fromisoformat(event["date"])
+    rule = event["recurrence"]
+    exceptions = set(rule.get("exceptions") or ())
+    end = min(end, _last_date(first, rule))
+    index = _first_index(first, rule, max(start, first))
+    while True:
+        try:
+            day = _nth(first, rule, index)
+        except OverflowError:
+            return
+        index += 1
+        if day is None:
+            # Monthly series skip months without that day (e.g. the 31st)
+            continue
+        if day > end:
+            return
+        if day >= start and day.isoformat() not in exceptions:
+            yield day
+
+
+def _last_date(first: date, rule: dict) -> date:
+    """The latest date the series can reach, from ``until`` and ``count``"""
+    last = date.fromisoformat(rule["until"]) if rule.get("until") else date.max
+    count = rule.get("count")
+    if count:
+        # Find the count-th real occurrence; only monthly series have gaps
+        index = seen = 0
+        try:
+            if rule["frequency"] != "monthly" or first.day <= 28:
+                final = _nth(first, rule, count - 1)
+            else:
+                while True:
+                    final = _nth(first, rule, index)
+                    index += 1
+                    if final is not None:
+                        seen += 1
+                        if seen == count:
+                            break
+        except OverflowError:
+            final = date.max
+        last = min(last, final)
+    return last
+
+
+def _step_days(rule: dict) -> int:
+    return rule.get("interval", 1) * (7 if rule["frequency"] == "weekly" else 1)
+
+
+def _first_index(first: date, rule: dict, start: date) -> int:
+    """Index of the first occurrence that can fall on or after ``start``"""
+    if start <= first:
+        return 0
+    if rule["frequency"] == "monthly":
+        months = (start.year - first.year) * 12 + start.month - first.month
+        return months // rule.get("interval", 1)
+    return -(-(start - first).days // _step_days(rule))
+
+
+def _nth(first: date, rule: dict, index: int) -> Optional[date]:
+    """The ``index``-th slot of the series counting from 0, or None if that
+    month has no such day; raises OverflowError past ``date.max``"""
+    if rule["frequency"] != "monthly":
+        return first + timedelta(days=index * _step_days(rule))
+    months = first.month - 1 + index * rule.get("interval", 1)
+    year = first.year + months // 12
+    if year > date.max.year:
+        raise OverflowError("date out of range")
+    try:
+        return date(year, months % 12 + 1, first.day)
+    except ValueError:
+        return None
+
+
+def expansion_window(start: Optional[str], end: Optional[str]) -> Tuple[date, date]:
+    """The dates to expand series over for a range query.
+
+    A missing ``end`` means ``HORIZON_DAYS`` past ``start`` (or today), since
+    an open-ended series would otherwise never stop.
+    """
+    first = date.fromisoformat(start) if start else date.min
+    if end:
+        return first, date.fromisoformat(end)
+    base = first if start else date.today()
+    return first, base + timedelta(days=HORIZON_DAYS)
+
+
+def expand(events: Iterable[dict], start: date, end: date) -> Iterator[dict]:
+    """Occurrences of the given recurring events within [start, end], each a
+    copy of its event with ``date`` set, merged in (date, time, id) order"""
+    streams = [_occurrence_stream(event, start, end) for event in events]
+    return heapq.merge(*streams, key=_key)
+
+
+def _occurrence_stream(event: dict, start: date, end: date) -> Iterator[dict]:
+    for day in occurrences(event, start, end):
+        yield dict(event, date=day.isoformat())
+
+
+def _key(event: dict) -> Tuple[str, str, int]:
+    return (event["date"], event.get("time") or "", event["id"])
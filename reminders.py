@@ -0,0 +1,219 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+import urllib.request
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from broadcast import ChangeHub, Subscriber
+from metrics import REGISTRY
+from records import CLOCK_PATTERN
+from recurrence import occurrences
+
+logger = logging.getLogger("calendar.reminders")
+
+# The longest a reminder may come before its event, in minutes (four weeks)
+MAX_REMINDER = 4 * 7 * 24 * 60
+
+# Changes the scheduler may fall behind by before it reloads everything
+MAX_PENDING_CHANGES = 10_000
+
+FIRED = REGISTRY.counter("calendar_reminders_fired_total", "Reminders sent, by result", ("result",))
+PENDING = REGISTRY.gauge("calendar_reminders_pending", "Reminders scheduled in this worker")
+
+Sink = Callable[[dict], Awaitable[None]]
+
+
+def next_reminder(event: dict, after: float) -> Optional[Tuple[float, str]]:
+    """The first time after ``after`` (epoch seconds) that a reminder for
+    ``event`` is due, with the date of the occurrence it is for.
+
+    Events start at their ``HH:MM`` time, or at midnight without one, in
+    the server's local time. Series only look at occurrences from the day
+    the reminder window reaches, so this is O(1) however old the series is.
+    """
+    lead = timedelta(minutes=event["reminder"])
+    time_text = event.get("time") or ""
+    if CLOCK_PATTERN.fullmatch(time_text):
+        clock = timedelta(hours=int(time_text[:2]), minutes=int(time_text[3:]))
+    else:
+        clock = timedelta()
+
+    def due(day: date) -> float:
+        return (datetime.combine(day, datetime.min.time()) + clock - lead).timestamp()
+
+    if not event.get("recurrence"):
+        day = date.fromisoformat(event["date"])
+        when = due(day)
+        return (when, day.isoformat()) if when > after else None
+    # The first occurrence that can still be reminded of starts after ``after``
+    earliest = datetime.fromtimestamp(after).date()
+    for day in occurrences(event, earliest - timedelta(days=1), date.max):
+        when = due(day)
+        if when > after:
+            return when, day.isoformat()
+    return None
+
+
+class ReminderScheduler:
+    """Fires each event's reminder when it falls due.
+
+    Pending reminders sit in a min-heap keyed by due time, one per event:
+    the next occurrence's for a series, which is replaced by the following
+    one once it fires. The scheduler sleeps until the earliest is due, so
+    each wakeup only touches reminders that are actually due.
+
+    It follows the store through the change hub like any other subscriber,
+    so every create, update and delete (from this worker or, with SQLite,
+    another) reschedules or cancels that event's reminder. Superseded heap
+    entries are skipped when popped and swept out once they pile up. If it
+    falls too far behind it reloads from ``load``, as it does at startup.
+    Reminders that fell due while the server was down are not sent.
+
+    ``claim`` is asked before sending, so with several workers sharing a
+    store only one of them sends each reminder.
+    """
+
+    def __init__(
+        self,
+        hub: ChangeHub,
+        load: Callable[[], Awaitable[List[dict]]],
+        claim: Callable[[int, str], Awaitable[bool]],
+        sink: Sink,
+    ):
+        self._hub = hub
+        self._load = load
+        self._claim = claim
+        self._sink = sink
+        self._heap: List[Tuple[float, int, int, str, dict]] = []
+        self._pending: Dict[int, Tuple[float, int, int, str, dict]] = {}
+        self._order = itertools.count()
+        self._wake = asyncio.Event()
+        self._subscriber: Optional[Subscriber] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        # Subscribe first so nothing changed during the load is missed
+        self._subscriber = self._hub.subscribe(MAX_PENDING_CHANGES, client=False)
+        await self._reload()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._follow()), loop.create_task(self._run())]
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._subscriber is not None:
+            self._hub.unsubscribe(self._subscriber)
+
+    def schedule(self, event: dict, after: Optional[float] = None) -> None:
+        """Set or replace an event's pending reminder"""
+        self._pending.pop(event["id"], None)
+        if event.get("reminder") is None:
+            return
+        found = next_reminder(event, time.time() if after is None else after)
+        if found is None:
+            return
+        entry = (found[0], next(self._order), event["id"], found[1], event)
+        self._pending[event["id"]] = entry
+        heapq.heappush(self._heap, entry)
+        if entry is self._heap[0]:
+            self._wake.set()
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = list(self._pending.values())
+            heapq.heapify(self._heap)
+
+    def cancel(self, event_id: int) -> None:
+        self._pending.pop(event_id, None)
+
+    def upcoming(self, limit: int) -> List[dict]:
+        """The next ``limit`` reminders due, soonest first"""
+        return [_payload(entry) for entry in heapq.nsmallest(limit, self._pending.values())]
+
+    async def _reload(self) -> None:
+        self._heap = []
+        self._pending = {}
+        now = time.time()
+        for event in await self._load():
+            self.schedule(event, now)
+        self._wake.set()
+
+    async def _follow(self) -> None:
+        while True:
+            batch = await self._subscriber.next_batch()
+            if batch["resync"]:
+                await self._reload()
+                continue
+            for change in batch["changes"]:
+                if change["op"] == "delete":
+                    self.cancel(change["id"])
+                else:
+                    self.schedule(change["event"])
+
+    async def _run(self) -> None:
+        while True:
+            PENDING.set(len(self._pending))
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if self._pending.get(entry[2]) is not entry:
+                    continue
+                del self._pending[entry[2]]
+                await self._fire(entry)
+                if entry[4].get("recurrence"):
+                    self.schedule(entry[4], entry[0])
+            self._wake.clear()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, entry: Tuple[float, int, int, str, dict]) -> None:
+        try:
+            if not await self._claim(entry[2], entry[3]):
+                FIRED.inc("claimed_elsewhere")
+                return
+            await self._sink(_payload(entry))
+        except Exception:
+            FIRED.inc("failed")
+            logger.exception("Sending the reminder for event %s failed", entry[2])
+        else:
+            FIRED.inc("sent")
+
+
+def _payload(entry: Tuple[float, int, int, str, dict]) -> dict:
+    due, _, event_id, day, event = entry
+    return {
+        "id": event_id,
+        "title": event["title"],
+        "date": day,
+        "time": event.get("time"),
+        "reminder": event["reminder"],
+        "due": datetime.fromtimestamp(due).isoformat(timespec="minutes"),
+    }
+
+
+async def log_sink(reminder: dict) -> None:
+    """Log reminders; the default sink"""
+    logger.warning("Reminder: %s on %s %s", reminder["title"], reminder["date"], reminder["time"] or "")
+
+
+def webhook_sink(url: str, timeout: float = 10) -> Sink:
+    """POST each reminder as JSON to ``url`` from a worker thread"""
+
+    def post(body: bytes) -> None:
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+
+    async def send(reminder: dict) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, post, json.dumps(reminder).encode())
+
+    return send
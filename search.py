@@ -0,0 +1,276 @@
+import heapq
+import json
+import math
+import os
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+
+WORD = re.compile(r"\w+")
+
+# A title match counts this many times a description match
+TITLE_WEIGHT = 3
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Matches of a multi-word query up to this many are simply all scored
+SCORE_ALL = 1000
+
+# Bumped when tokenizing changes, so indexes saved by older versions are rebuilt
+INDEX_FORMAT = 2
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-cased words with accents stripped, so "Café" matches "cafe".
+    The combining marks decomposition leaves are dropped rather than left to
+    split words, as SQLite's ``remove_diacritics`` does."""
+    if not text:
+        return []
+    if text.isascii():
+        return WORD.findall(text.lower())
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return WORD.findall(stripped.casefold())
+
+
+def event_terms(title: Optional[str], description: Optional[str]) -> Dict[str, int]:
+    """Weighted term frequencies of an event's title and description"""
+    terms: Dict[str, int] = {}
+    for term in tokenize(title):
+        terms[term] = terms.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(description):
+        terms[term] = terms.get(term, 0) + 1
+    return terms
+
+
+class SearchIndex:
+    """Inverted index over event titles and descriptions, ranked by BM25.
+
+    A query word matches every term it is a prefix of, found by bisecting
+    the sorted vocabulary, and scores as its best matching term; an event
+    must match every word. Each term's postings are grouped by (term
+    frequency, event length). Everything in a group scores the same, so
+    the best groups can be read first and a query stops as soon as no
+    unread group can beat the results it has, instead of scoring every
+    match of a common word.
+
+    ``lsn`` is the snapshot the index was saved after when it is written
+    to and loaded from disk; replaying the log from there brings it up to
+    date.
+    """
+
+    def __init__(self):
+        self._docs: Dict[int, Dict[str, int]] = {}
+        self._postings: Dict[str, Dict[Tuple[int, int], Set[int]]] = {}
+        self._df: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._total_length = 0
+        self.lsn = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def term_count(self) -> int:
+        return len(self._terms)
+
+    def add(self, event_id: int, title: Optional[str], description: Optional[str]) -> None:
+        if event_id in self._docs:
+            self.remove(event_id)
+        terms = event_terms(title, description)
+        if not terms:
+            return
+        length = sum(terms.values())
+        for term, tf in terms.items():
+            groups = self._postings.get(term)
+            if groups is None:
+                groups = self._postings[term] = {}
+                self._df[term] = 0
+                insort(self._terms, term)
+            groups.setdefault((tf, length), set()).add(event_id)
+            self._df[term] += 1
+        self._docs[event_id] = terms
+        self._total_length += length
+
+    def remove(self, event_id: int) -> None:
+        terms = self._docs.pop(event_id, None)
+        if terms is None:
+            return
+        length = sum(terms.values())
+        self._total_length -= length
+        for term, tf in terms.items():
+            groups = self._postings[term]
+            ids = groups[(tf, length)]
+            ids.discard(event_id)
+            if not ids:
+                del groups[(tf, length)]
+            self._df[term] -= 1
+            if not groups:
+                del self._postings[term]
+                del self._df[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def search(self, query: str, limit: int) -> List[Tuple[float, int]]:
+        """The best ``limit`` (score, id) pairs for ``query``, best first"""
+        words = sorted(set(tokenize(query)))
+        if not words or not self._docs:
+            return []
+        expansions = [self._expand(word) for word in words]
+        if not all(expansions):
+            return []
+        average = self._total_length / len(self._docs)
+        idfs = {term: self._idf(term) for terms in expansions for term in terms}
+        streams = []
+        for terms in expansions:
+            groups = [
+                (_bm25(idfs[term], tf, length, average), ids)
+                for term in terms
+                for (tf, length), ids in self._postings[term].items()
+            ]
+            groups.sort(key=lambda group: group[0], reverse=True)
+            streams.append(groups)
+        if len(streams) == 1:
+            return self._top_groups(streams[0], limit)
+
+        def score(event_id: int) -> Optional[float]:
+            """The event's score, or None if it misses a word"""
+            terms = self._docs[event_id]
+            length = sum(terms.values())
+            total = 0.0
+            for word in words:
+                best = max(
+                    (
+                        _bm25(idfs[term], tf, length, average)
+                        for term, tf in terms.items()
+                        if term.startswith(word)
+                    ),
+                    default=None,
+                )
+                if best is None:
+                    return None
+                total += best
+            return total
+
+        streams.sort(key=lambda groups: sum(len(ids) for _, ids in groups))
+        matches = set().union(*(ids for _, ids in streams[0]))
+        if len(matches) <= SCORE_ALL:
+            # Few enough to check the other words against each event's terms
+            hits = ((score(i), i) for i in matches)
+            return heapq.nsmallest(
+                limit, (hit for hit in hits if hit[0] is not None),
+                key=lambda hit: (-hit[0], hit[1]),
+            )
+        for groups in streams[1:]:
+            matches &= set().union(*(ids for _, ids in groups))
+            if not matches:
+                return []
+        return self._threshold(streams, matches, score, limit)
+
+    def _top_groups(self, groups: List[Tuple[float, Set[int]]], limit: int) -> List[Tuple[float, int]]:
+        """Top hits of a one-word query: an event scores as the first group
+        it appears in, so groups are taken in order until ``limit`` is met.
+        Events tied within a group come in no particular order."""
+        hits: List[Tuple[float, int]] = []
+        seen: Set[int] = set()
+        for group_score, ids in groups:
+            fresh = ids - seen if seen else ids
+            for event_id in islice(fresh, limit - len(hits)):
+                hits.append((group_score, event_id))
+            if len(hits) >= limit:
+                break
+            seen |= fresh
+        return hits
+
+    @staticmethod
+    def _threshold(streams, matches: Set[int], score, limit: int) -> List[Tuple[float, int]]:
+        """Top hits of a multi-word query with the threshold algorithm: read
+        each word's groups in turn, score their events fully and stop once
+        the ``limit``-th best beats the best any unread event could get"""
+        best: List[Tuple[float, int]] = []
+        seen: Set[int] = set()
+        positions = [0] * len(streams)
+        while True:
+            for n, groups in enumerate(streams):
+                if positions[n] >= len(groups):
+                    # Every match contains this word, so all have been seen
+                    return [(s, -i) for s, i in sorted(best, reverse=True)]
+                _, ids = groups[positions[n]]
+                positions[n] += 1
+                for event_id in matches.intersection(ids) - seen:
+                    seen.add(event_id)
+                    hit = (score(event_id), -event_id)
+                    if len(best) < limit:
+                        heapq.heappush(best, hit)
+                    elif hit > best[0]:
+                        heapq.heapreplace(best, hit)
+            bound = sum(
+                groups[p][0] for groups, p in zip(streams, positions) if p < len(groups)
+            )
+            if len(best) == limit and best[0][0] > bound:
+                return [(s, -i) for s, i in sorted(best, reverse=True)]
+
+    def _expand(self, word: str) -> List[str]:
+        """Every indexed term starting with ``word``"""
+        terms = []
+        i = bisect_left(self._terms, word)
+        while i < len(self._terms) and self._terms[i].startswith(word):
+            terms.append(self._terms[i])
+            i += 1
+        return terms
+
+    def _idf(self, term: str) -> float:
+        df = self._df[term]
+        return math.log(1 + (len(self._docs) - df + 0.5) / (df + 0.5))
+
+    def save(self, path: str, lsn: int) -> None:
+        """Write the index, tagged with ``lsn``, atomically to ``path``"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"lsn": lsn, "format": INDEX_FORMAT}).encode() + b"\n")
+            for term in self._terms:
+                groups = [[tf, length, list(ids)] for (tf, length), ids in self._postings[term].items()]
+                line = json.dumps([term, groups], separators=(",", ":"), ensure_ascii=False)
+                f.write(line.encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SearchIndex"]:
+        """Read an index written by ``save()``, or None if there is none or
+        it was written in an older format"""
+        if not os.path.exists(path):
+            return None
+        index = cls()
+        docs = index._docs
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                if header.get("format") != INDEX_FORMAT:
+                    return None
+                index.lsn = header["lsn"]
+                for line in f:
+                    term, groups = json.loads(line)
+                    postings = index._postings[term] = {}
+                    df = 0
+                    for tf, length, ids in groups:
+                        postings[(tf, length)] = set(ids)
+                        df += len(ids)
+                        for event_id in ids:
+                            terms = docs.get(event_id)
+                            if terms is None:
+                                terms = docs[event_id] = {}
+                                index._total_length += length
+                            terms[term] = tf
+                    index._df[term] = df
+                    index._terms.append(term)
+        except (ValueError, KeyError, TypeError):
+            return None
+        return index
+
+
+def _bm25(idf: float, tf: int, length: int, average: float) -> float:
+    return idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average))
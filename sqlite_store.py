@@ -0,0 +1,683 @@
+import heapq
+import json
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from freebusy import MAX_DURATION, MINUTES_PER_DAY, Overlaps, busy_days, busy_span, planned_spans
+from recurrence import expand, expansion_window, series_span
+from search import TITLE_WEIGHT, tokenize
+from store import (
+    PRIORITY_RANK, MissingEvents, StaleRevision, grid_range, priority_rank, sort_key,
+)
+
+RANK_PRIORITY = {rank: priority for priority, rank in PRIORITY_RANK.items()}
+
+COLUMNS = (
+    "id", "title", "date", "time", "duration", "reminder", "priority", "description", "created", "recurrence", "revision",
+)
+
+# Stored as JSON text
+JSON_COLUMNS = {"recurrence"}
+
+# Columns added after the first release, created on open when missing
+ADDED_COLUMNS = (
+    ("recurrence", "TEXT"),
+    ("series_end", "TEXT"),
+    ("revision", "INTEGER NOT NULL DEFAULT 0"),
+    ("duration", "INTEGER"),
+    ("busy_start", "INTEGER"),
+    ("busy_end", "INTEGER"),
+    ("reminder", "INTEGER"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT,
+    priority TEXT NOT NULL,
+    description TEXT,
+    created TEXT
+);
+CREATE INDEX IF NOT EXISTS events_date_time ON events (date, time);
+CREATE INDEX IF NOT EXISTS events_priority ON events (priority);
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    event_id INTEGER NOT NULL,
+    event TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_seq ON changes (seq);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+CREATE TABLE IF NOT EXISTS reminders_sent (
+    day TEXT NOT NULL,
+    event_id INTEGER NOT NULL,
+    PRIMARY KEY (day, event_id)
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('epoch', lower(hex(randomblob(4))));
+INSERT OR IGNORE INTO meta (key, value) VALUES ('modified', CAST(strftime('%s', 'now') AS INTEGER));
+INSERT OR IGNORE INTO meta (key, value)
+    SELECT 'journal_floor', value FROM meta WHERE key = 'version';
+"""
+
+# Full-text index over title and description, kept in step by triggers
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    title, description, content='events', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF title, description ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    INSERT INTO events_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+END;
+"""
+
+SELECT = "SELECT " + ", ".join(COLUMNS) + " FROM events"
+
+# The (date, time, id) listing order; the listing indexes are on exactly this
+LISTING_KEY = "date, COALESCE(time, ''), id"
+INSERT = (
+    "INSERT INTO events (" + ", ".join(COLUMNS[1:]) + ", series_end, busy_start, busy_end) "
+    "VALUES (" + ", ".join("?" for _ in range(len(COLUMNS) + 2)) + ")"
+)
+
+
+class SQLiteEventStore:
+    """Disk-backed event store with the same interface as ``EventStore``.
+
+    The database runs in WAL mode with a single writer connection behind a
+    lock and a small pool of reader connections, so reads never wait on a
+    write. Every method blocks, which is why ``blocking`` is set: callers on
+    the event loop must run them in a thread. Several processes may open the
+    same file. The version counter lives in the database, so it is shared
+    by every process using the file; each write transaction takes the next
+    version and records its changes in the ``changes`` journal under it.
+
+    Recurring events are single rows with the date of their last possible
+    occurrence in ``series_end``; range queries fetch the rows whose span
+    overlaps the window and expand them in Python.
+
+    Other events with a time and a duration keep the minutes they are busy
+    in ``busy_start`` and ``busy_end``. Since no event lasts longer than
+    ``MAX_DURATION``, everything busy during a slot starts at most that long
+    before it, which makes overlap queries one range scan of an index.
+    """
+
+    journal_capacity = 10_000
+
+    blocking = True
+
+    def __init__(self, path: str, readers: int = 4):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.executescript(SCHEMA)
+        existing = {row["name"] for row in self._writer.execute("PRAGMA table_info(events)")}
+        for name, kind in ADDED_COLUMNS:
+            if name not in existing:
+                self._writer.execute(f"ALTER TABLE events ADD COLUMN {name} {kind}")
+        self._writer.execute(
+            "CREATE INDEX IF NOT EXISTS events_series ON events (series_end)"
+            " WHERE recurrence IS NOT NULL"
+        )
+        self._writer.execute(
+            "CREATE INDEX IF NOT EXISTS events_busy ON events (busy_start)"
+            " WHERE busy_start IS NOT NULL"
+        )
+        self._writer.execute(
+            "CREATE INDEX IF NOT EXISTS events_reminder ON events (date)"
+            " WHERE reminder IS NOT NULL"
+        )
+        # In listing order, so a page seeks to its cursor and reads on
+        # instead of sorting everything after it
+        self._writer.execute(
+            f"CREATE INDEX IF NOT EXISTS events_listing ON events ({LISTING_KEY})"
+        )
+        self._writer.execute(
+            f"CREATE INDEX IF NOT EXISTS events_priority_listing ON events (priority, {LISTING_KEY})"
+        )
+        indexed = self._writer.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'events_fts'"
+        ).fetchone()
+        self._writer.executescript(SEARCH_SCHEMA)
+        if indexed is None:
+            # Databases from before search existed: index their events once
+            self._writer.execute("INSERT INTO events_fts (events_fts) VALUES ('rebuild')")
+        self.epoch = self._writer.execute(
+            "SELECT value FROM meta WHERE key = 'epoch'"
+        ).fetchone()["value"]
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        conn.row_factory = _row_to_dict
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock:
+            conn = self._writer
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                conn.execute(
+                    "UPDATE meta SET value = CAST(strftime('%s', 'now') AS INTEGER)"
+                    " WHERE key = 'modified'"
+                )
+                self._seq = conn.execute(
+                    "SELECT value FROM meta WHERE key = 'version'"
+                ).fetchone()["value"]
+                self._journaled = False
+                yield conn
+                if self._seq % 1000 == 0:
+                    self._trim_journal(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            # Nothing changed (a missing id, say): leave the version and ETag be
+            conn.execute("COMMIT" if self._journaled else "ROLLBACK")
+
+    def _journal(
+        self, conn: sqlite3.Connection, op: str, event_id: int, event: Optional[dict]
+    ) -> None:
+        conn.execute(
+            "INSERT INTO changes (seq, op, event_id, event) VALUES (?, ?, ?, ?)",
+            (self._seq, op, event_id, json.dumps(event) if event is not None else None),
+        )
+        self._journaled = True
+
+    def _trim_journal(self, conn: sqlite3.Connection) -> None:
+        floor = self._seq - self.journal_capacity
+        if floor <= 0:
+            return
+        conn.execute("DELETE FROM changes WHERE seq <= ?", (floor,))
+        conn.execute(
+            "UPDATE meta SET value = MAX(value, ?) WHERE key = 'journal_floor'", (floor,)
+        )
+
+    def version(self) -> int:
+        """A counter bumped by every write transaction from any process"""
+        with self._reader() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()["value"]
+
+    def modified(self) -> int:
+        """When any process last wrote, in epoch seconds"""
+        with self._reader() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'modified'").fetchone()["value"]
+
+    def __len__(self) -> int:
+        with self._reader() as conn:
+            return conn.execute("SELECT COUNT(*) AS n FROM events").fetchone()["n"]
+
+    def __contains__(self, event_id: int) -> bool:
+        return self.get(event_id) is not None
+
+    def get(self, event_id: int) -> Optional[dict]:
+        with self._reader() as conn:
+            return conn.execute(SELECT + " WHERE id = ?", (event_id,)).fetchone()
+
+    def all(self) -> Iterator[dict]:
+        """Iterate over every event in insertion order"""
+        with self._reader() as conn:
+            return iter(conn.execute(SELECT + " ORDER BY id").fetchall())
+
+    def add(self, data: dict, exclusive: bool = False) -> dict:
+        """Store a new event, letting SQLite allocate its id; with
+        ``exclusive``, see ``EventStore.add``"""
+        with self._transaction() as conn:
+            if exclusive:
+                conflicts = {}
+                for start, end in planned_spans(data):
+                    for event in self._overlapping(conn, start, end):
+                        conflicts.setdefault((event["id"], event["date"]), event)
+                if conflicts:
+                    raise Overlaps(list(conflicts.values()))
+            return self._insert(conn, data)
+
+    def add_many(self, items: List[dict]) -> List[dict]:
+        """Store several new events in one transaction"""
+        with self._transaction() as conn:
+            return [self._insert(conn, data) for data in items]
+
+    def apply(self, operations: List[dict]) -> List[dict]:
+        """Apply a batch of create, update and delete operations in one
+        transaction; see ``EventStore.apply``"""
+        results, missing = [], []
+        with self._transaction() as conn:
+            for index, operation in enumerate(operations):
+                if operation["op"] == "create":
+                    event = self._insert(conn, operation["event"])
+                    results.append({"op": "create", "id": event["id"], "event": event})
+                elif operation["op"] == "update":
+                    event = self._update(conn, operation["id"], operation["changes"])
+                    if event is None:
+                        missing.append(index)
+                    results.append({"op": "update", "id": operation["id"], "event": event})
+                else:
+                    if self._delete(conn, operation["id"]) is None:
+                        missing.append(index)
+                    results.append({"op": "delete", "id": operation["id"]})
+            if missing:
+                # Rolls the whole transaction back
+                raise MissingEvents(missing)
+        return results
+
+    def _insert(self, conn: sqlite3.Connection, data: dict) -> dict:
+        data = dict(data, revision=self._seq)
+        cursor = conn.execute(INSERT, _values(data))
+        event = dict(data, id=cursor.lastrowid)
+        self._journal(conn, "put", event["id"], event)
+        return event
+
+    def iter_batches(self, size: int = 1000) -> Iterator[List[dict]]:
+        """Iterate over every event in id order, ``size`` at a time"""
+        last_id = 0
+        while True:
+            with self._reader() as conn:
+                batch = conn.execute(
+                    SELECT + " WHERE id > ? ORDER BY id LIMIT ?", (last_id, size)
+                ).fetchall()
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]["id"]
+
+    def iter_feed(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        priority: Optional[str] = None,
+        size: int = 1000,
+    ) -> Iterator[List[dict]]:
+        """Iterate, ``size`` at a time, over the events dated between ``start``
+        and ``end`` (inclusive) and the series with a possible occurrence
+        there, each series once and unexpanded, for calendar feeds"""
+        if start or end:
+            events = list(self._select_range(start, end, priority, None, None, dated_only=True))
+            first = date.fromisoformat(start) if start else date.min
+            last = date.fromisoformat(end) if end else date.max
+            events += [
+                event for event in self._series_between(first, last)
+                if priority is None or event["priority"] == priority
+            ]
+            for i in range(0, len(events), size):
+                yield events[i:i + size]
+            return
+        where, params = (" AND priority = ?", (priority,)) if priority is not None else ("", ())
+        last_id = 0
+        while True:
+            with self._reader() as conn:
+                batch = conn.execute(
+                    SELECT + " WHERE id > ?" + where + " ORDER BY id LIMIT ?",
+                    (last_id, *params, size),
+                ).fetchall()
+            if not batch:
+                return
+            yield batch
+            last_id = batch[-1]["id"]
+
+    def update(
+        self, event_id: int, changes: dict, revisions: Optional[Set[int]] = None
+    ) -> Optional[dict]:
+        """Apply ``changes`` to an event in place, optionally only if its
+        revision is one of ``revisions``; see ``EventStore.update``"""
+        with self._transaction() as conn:
+            return self._update(conn, event_id, changes, revisions)
+
+    def _update(
+        self,
+        conn: sqlite3.Connection,
+        event_id: int,
+        changes: dict,
+        revisions: Optional[Set[int]] = None,
+    ) -> Optional[dict]:
+        if revisions is not None:
+            event = conn.execute(SELECT + " WHERE id = ?", (event_id,)).fetchone()
+            if event is None:
+                return None
+            if event["revision"] not in revisions:
+                raise StaleRevision(event)
+        changes = {k: v for k, v in changes.items() if k in COLUMNS and k not in ("id", "revision")}
+        changes["revision"] = self._seq
+        assignments = ", ".join(f"{k} = ?" for k in changes)
+        conn.execute(
+            f"UPDATE events SET {assignments} WHERE id = ?",
+            [*(_encode(k, v) for k, v in changes.items()), event_id],
+        )
+        event = conn.execute(SELECT + " WHERE id = ?", (event_id,)).fetchone()
+        if event is not None:
+            if any(k in changes for k in ("date", "time", "duration", "recurrence")):
+                conn.execute(
+                    "UPDATE events SET series_end = ?, busy_start = ?, busy_end = ? WHERE id = ?",
+                    (_series_end(event), *_busy_columns(event), event_id),
+                )
+            self._journal(conn, "put", event_id, event)
+        return event
+
+    def delete(self, event_id: int) -> Optional[dict]:
+        """Remove an event, returning it, or None if it does not exist"""
+        with self._transaction() as conn:
+            return self._delete(conn, event_id)
+
+    def _delete(self, conn: sqlite3.Connection, event_id: int) -> Optional[dict]:
+        event = conn.execute(SELECT + " WHERE id = ?", (event_id,)).fetchone()
+        if event is not None:
+            conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+            self._journal(conn, "delete", event_id, None)
+        return event
+
+    def range(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        priority: Optional[str] = None,
+        after: Optional[Tuple[str, str, int]] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Iterate over events between ``start`` and ``end`` (inclusive) in
+        (date, time, id) order, optionally restricted to one priority, to
+        keys strictly after ``after`` and to at most ``limit`` results"""
+        if start is None and end is None and priority is not None:
+            # No window: series are listed once, like any other event
+            return self._select_range(start, end, priority, after, limit, dated_only=False)
+        events = self._select_range(start, end, priority, after, limit, dated_only=True)
+        window_start, window_end = expansion_window(start, end)
+        series = self._series_between(window_start, window_end)
+        if priority is not None:
+            series = [event for event in series if event["priority"] == priority]
+        if not series:
+            return events
+        if after is not None:
+            window_start = max(window_start, date.fromisoformat(after[0]))
+        merged = (
+            event
+            for event in heapq.merge(events, expand(series, window_start, window_end), key=sort_key)
+            if after is None or sort_key(event) > after
+        )
+        return iter(list(islice(merged, limit)))
+
+    def _select_range(self, start, end, priority, after, limit, dated_only: bool) -> Iterator[dict]:
+        clauses, params = [], []
+        if dated_only:
+            clauses.append("recurrence IS NULL")
+        if start:
+            clauses.append("date >= ?")
+            params.append(start)
+        if end:
+            clauses.append("date <= ?")
+            params.append(end)
+        if priority is not None:
+            clauses.append("priority = ?")
+            params.append(priority)
+        if after is not None:
+            clauses.append(f"({LISTING_KEY}) > (?, ?, ?)")
+            params.extend(after)
+        sql = SELECT
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY " + LISTING_KEY
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._reader() as conn:
+            return iter(conn.execute(sql, params).fetchall())
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """Events containing a word starting with each word of ``query``,
+        best match first"""
+        words = tokenize(query)
+        if not words:
+            return []
+        # Quoted so query words are never read as FTS5 syntax
+        match = " ".join(f'"{word}"*' for word in words)
+        with self._reader() as conn:
+            return conn.execute(
+                "SELECT " + ", ".join("events." + c for c in COLUMNS)
+                + " FROM events_fts JOIN events ON events.id = events_fts.rowid"
+                " WHERE events_fts MATCH ?"
+                " ORDER BY bm25(events_fts, ?, 1.0), events.id LIMIT ?",
+                (match, float(TITLE_WEIGHT), limit),
+            ).fetchall()
+
+    def stats(self, today: str) -> dict:
+        """Count all events, those on ``today``, those after it and each priority"""
+        with self._reader() as conn:
+            def count(sql, *args):
+                return conn.execute(sql, args).fetchone()["n"]
+
+            by_priority = conn.execute(
+                "SELECT priority, COUNT(*) AS n FROM events GROUP BY priority"
+            ).fetchall()
+            stats = {
+                "total": count("SELECT COUNT(*) AS n FROM events"),
+                "today": count(
+                    "SELECT COUNT(*) AS n FROM events WHERE date = ? AND recurrence IS NULL", today
+                ),
+                "upcoming": count(
+                    "SELECT COUNT(*) AS n FROM events WHERE date > ? AND recurrence IS NULL", today
+                ),
+                "by_priority": {row["priority"]: row["n"] for row in by_priority},
+            }
+        day = date.fromisoformat(today)
+        tomorrow = day + timedelta(days=1)
+        stats["today"] += sum(1 for _ in expand(self._series_between(day, day), day, day))
+        # A series counts once towards upcoming if it has any later occurrence
+        for event in self._series_between(tomorrow, date.max):
+            if next(expand([event], tomorrow, date.max), None):
+                stats["upcoming"] += 1
+        return stats
+
+    def day_counts(self, start: str, end: str) -> Dict[str, int]:
+        """Number of events on each date between ``start`` and ``end`` that has any"""
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT date, COUNT(*) AS n FROM events"
+                " WHERE date BETWEEN ? AND ? AND recurrence IS NULL GROUP BY date",
+                (start, end),
+            ).fetchall()
+        return {row["date"]: row["n"] for row in rows}
+
+    def calendar_grid(self, year: int, month: int) -> dict:
+        """Per-day event counts and highest priority for a month's 6-week grid"""
+        start, end = grid_range(year, month)
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT date, COUNT(*) AS n, MAX(CASE priority"
+                " WHEN 'high' THEN 3 WHEN 'medium' THEN 2 WHEN 'low' THEN 1 ELSE 0 END) AS rank"
+                " FROM events WHERE date BETWEEN ? AND ? AND recurrence IS NULL GROUP BY date",
+                (start, end),
+            ).fetchall()
+        days = {
+            row["date"]: {"count": row["n"], "priority": RANK_PRIORITY.get(row["rank"])}
+            for row in rows
+        }
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+        for occurrence in expand(self._series_between(first, last), first, last):
+            cell = days.setdefault(
+                occurrence["date"], {"count": 0, "priority": occurrence["priority"]}
+            )
+            cell["count"] += 1
+            cell["priority"] = max(cell["priority"], occurrence["priority"], key=priority_rank)
+        return {"start": start, "end": end, "days": days}
+
+    def overlapping(self, start: int, end: int) -> List[dict]:
+        """Events and series occurrences busy at some point in the minutes
+        [start, end), in order of their start"""
+        with self._reader() as conn:
+            return self._overlapping(conn, start, end)
+
+    def _overlapping(self, conn: sqlite3.Connection, start: int, end: int) -> List[dict]:
+        events = conn.execute(
+            SELECT + " WHERE busy_start > ? AND busy_start < ? AND busy_end > ?"
+            " ORDER BY busy_start, busy_end, id",
+            (start - MAX_DURATION, end, start),
+        ).fetchall()
+        first = date.fromordinal(max(1, (start - MAX_DURATION) // MINUTES_PER_DAY))
+        last = date.fromordinal((end - 1) // MINUTES_PER_DAY)
+        series = conn.execute(
+            SELECT + " WHERE recurrence IS NOT NULL AND duration IS NOT NULL"
+            " AND date <= ? AND series_end >= ?",
+            (last.isoformat(), first.isoformat()),
+        ).fetchall()
+        for event in series:
+            span = busy_span(event)
+            if span is not None:
+                days = busy_days(event, span[0] % MINUTES_PER_DAY, event["duration"], start, end)
+                events.extend(dict(event, date=day.isoformat()) for day in days)
+        if series:
+            events.sort(key=lambda event: (busy_span(event), event["id"]))
+        return events
+
+    def reminders(self, today: str) -> List[dict]:
+        """Events with a reminder that may still be due: those from
+        ``today`` on and series that have not ended"""
+        with self._reader() as conn:
+            return conn.execute(
+                SELECT + " WHERE reminder IS NOT NULL"
+                " AND (date >= ? OR (recurrence IS NOT NULL AND series_end >= ?))",
+                (today, today),
+            ).fetchall()
+
+    def claim_reminder(self, event_id: int, day: str) -> bool:
+        """Record that the reminder for an event's occurrence on ``day`` is
+        being sent; False if some process already has. Claims from more than
+        a week before it are dropped. Claims are not changes to events, so
+        they leave the version alone."""
+        stale = (date.fromisoformat(day) - timedelta(days=7)).isoformat()
+        with self._write_lock:
+            self._writer.execute("DELETE FROM reminders_sent WHERE day < ?", (stale,))
+            cursor = self._writer.execute(
+                "INSERT OR IGNORE INTO reminders_sent (day, event_id) VALUES (?, ?)", (day, event_id)
+            )
+            return cursor.rowcount == 1
+
+    def _series_between(self, start: date, end: date) -> List[dict]:
+        """Recurring events whose span overlaps [start, end]"""
+        with self._reader() as conn:
+            return conn.execute(
+                SELECT + " WHERE recurrence IS NOT NULL AND date <= ? AND series_end >= ?",
+                (end.isoformat(), start.isoformat()),
+            ).fetchall()
+
+    def changes_since(self, seq: int) -> dict:
+        """Changes made after version ``seq``, or a resync flag if the journal
+        no longer reaches back that far"""
+        with self._reader() as conn:
+            conn.execute("BEGIN")
+            try:
+                meta = dict(
+                    (row["key"], row["value"])
+                    for row in conn.execute("SELECT key, value FROM meta").fetchall()
+                )
+                rows = []
+                if seq >= meta["journal_floor"]:
+                    rows = conn.execute(
+                        "SELECT seq, op, event_id, event FROM changes WHERE seq > ? ORDER BY rowid",
+                        (seq,),
+                    ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+        changes = [
+            {
+                "seq": row["seq"],
+                "op": row["op"],
+                "id": row["event_id"],
+                "event": json.loads(row["event"]) if row["event"] is not None else None,
+            }
+            for row in rows
+        ]
+        return {
+            "version": meta["version"],
+            "resync": seq < meta["journal_floor"],
+            "changes": changes,
+        }
+
+    def metrics(self) -> Dict[str, int]:
+        """Rows in the store's tables and its database pages, for monitoring"""
+        with self._reader() as conn:
+            return {
+                "events": conn.execute("SELECT COUNT(*) AS n FROM events").fetchone()["n"],
+                "series": conn.execute(
+                    "SELECT COUNT(*) AS n FROM events WHERE recurrence IS NOT NULL"
+                ).fetchone()["n"],
+                "reminders": conn.execute(
+                    "SELECT COUNT(*) AS n FROM events WHERE reminder IS NOT NULL"
+                ).fetchone()["n"],
+                "journal": conn.execute("SELECT COUNT(*) AS n FROM changes").fetchone()["n"],
+                "database_pages": conn.execute("PRAGMA page_count").fetchone()["page_count"],
+            }
+
+    def commit(self) -> None:
+        """Writes commit as they happen; nothing is left to flush"""
+
+    def close(self) -> None:
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get().close()
+
+
+def _encode(column: str, value):
+    if column in JSON_COLUMNS and value is not None:
+        return json.dumps(value)
+    return value
+
+
+def _series_end(event: dict) -> Optional[str]:
+    if not event.get("recurrence"):
+        return None
+    return date.fromordinal(series_span(event)[1]).isoformat()
+
+
+def _busy_columns(event: dict) -> Tuple[Optional[int], Optional[int]]:
+    if event.get("recurrence"):
+        return None, None
+    return busy_span(event) or (None, None)
+
+
+def _values(data: dict) -> list:
+    """INSERT parameters for an event: every column but id, then the
+    derived series_end, busy_start and busy_end"""
+    return [_encode(c, data.get(c)) for c in COLUMNS[1:]] + [_series_end(data), *_busy_columns(data)]
+
+
+def _row_to_dict(cursor: sqlite3.Cursor, row: tuple) -> dict:
+    event = {col[0]: value for col, value in zip(cursor.description, row)}
+    for column in JSON_COLUMNS:
+        if event.get(column) is not None:
+            event[column] = json.loads(event[column])
+    return event
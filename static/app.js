@@ -0,0 +1,344 @@
+// State management
+let currentDate = new Date();
+let selectedDate = new Date();
+let events = [];
+let calendarDays = {};
+// Store epoch and version the local events array is in sync with
+let syncEpoch = null;
+let syncVersion = 0;
+
+const dayHeaders = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'];
+
+// Initialize
+async function init() {
+    setDefaultDate();
+    await Promise.all([loadEvents(), loadCalendar()]);
+    renderCalendar();
+    renderEvents();
+    updateStats();
+    subscribe();
+}
+
+function setDefaultDate() {
+    const today = new Date();
+    const dateStr = today.toISOString().split('T')[0];
+    document.getElementById('eventDate').value = dateStr;
+}
+
+function formatDate(date) {
+    return `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+}
+
+// First and last date of the 6-week grid drawn by renderCalendar()
+function visibleRange() {
+    const year = currentDate.getFullYear();
+    const month = currentDate.getMonth();
+    const firstDay = new Date(year, month, 1).getDay();
+    const start = new Date(year, month, 1 - firstDay);
+    const end = new Date(year, month, 1 - firstDay + 41);
+    return { start: formatDate(start), end: formatDate(end) };
+}
+
+// API Functions
+async function loadCalendar() {
+    try {
+        const year = currentDate.getFullYear();
+        const month = currentDate.getMonth() + 1;
+        const response = await fetch(`/api/calendar/${year}/${month}`);
+        calendarDays = (await response.json()).days;
+    } catch (error) {
+        console.error('Error loading calendar:', error);
+    }
+}
+
+async function loadEvents() {
+    try {
+        const { start, end } = visibleRange();
+        const response = await fetch(`/api/events?start=${start}&end=${end}`);
+        events = await response.json();
+        // The ETag is "<epoch>.<version>"
+        const [epoch, version] = response.headers.get('ETag').replace(/"/g, '').split('.');
+        syncEpoch = epoch;
+        syncVersion = Number(version);
+    } catch (error) {
+        console.error('Error loading events:', error);
+    }
+}
+
+// Apply changes made since the last sync instead of reloading every event
+async function syncEvents() {
+    try {
+        const response = await fetch(`/api/events/changes?since=${syncVersion}&epoch=${syncEpoch}`);
+        await applyDelta(await response.json());
+    } catch (error) {
+        console.error('Error syncing events:', error);
+    }
+}
+
+async function applyDelta(delta) {
+    if (delta.resync || delta.epoch !== syncEpoch) {
+        await loadEvents();
+        return;
+    }
+    if (delta.version <= syncVersion) {
+        return;
+    }
+    const { start, end } = visibleRange();
+    for (const change of delta.changes) {
+        if (change.seq <= syncVersion) {
+            continue;
+        }
+        if (change.op === 'put' && change.event.recurrence) {
+            // Occurrences are expanded by the server; refetch the window
+            await loadEvents();
+            return;
+        }
+        events = events.filter(event => event.id !== change.id);
+        if (change.op === 'put' && change.event.date >= start && change.event.date <= end) {
+            events.push(change.event);
+        }
+    }
+    syncVersion = delta.version;
+}
+
+// Live updates: WebSocket, falling back to server-sent events
+function subscribe() {
+    const onDelta = async (delta) => {
+        await Promise.all([applyDelta(delta), loadCalendar()]);
+        renderCalendar();
+        renderEvents();
+        updateStats();
+    };
+    const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+    let opened = false;
+    const socket = new WebSocket(`${protocol}//${location.host}/ws/events`);
+    socket.onopen = () => { opened = true; };
+    socket.onmessage = (message) => onDelta(JSON.parse(message.data));
+    socket.onclose = () => {
+        if (!opened) {
+            const source = new EventSource('/api/events/stream');
+            source.onmessage = (message) => onDelta(JSON.parse(message.data));
+        } else {
+            setTimeout(subscribe, 1000);
+        }
+    };
+}
+
+async function addEvent() {
+    const title = document.getElementById('eventTitle').value;
+    const date = document.getElementById('eventDate').value;
+    const time = document.getElementById('eventTime').value;
+    const priority = document.getElementById('eventPriority').value;
+    const description = document.getElementById('eventDescription').value;
+
+    if (!title || !date) {
+        alert('Please enter a title and date');
+        return;
+    }
+
+    const event = {
+        title,
+        date,
+        time,
+        priority,
+        description,
+        created: new Date().toISOString()
+    };
+
+    try {
+        const response = await fetch('/api/events', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(event)
+        });
+
+        if (response.ok) {
+            await Promise.all([syncEvents(), loadCalendar()]);
+            renderCalendar();
+            renderEvents();
+            updateStats();
+
+            // Clear form
+            document.getElementById('eventTitle').value = '';
+            document.getElementById('eventTime').value = '';
+            document.getElementById('eventDescription').value = '';
+            setDefaultDate();
+        }
+    } catch (error) {
+        console.error('Error adding event:', error);
+    }
+}
+
+async function deleteEvent(id) {
+    if (confirm('Are you sure you want to delete this event?')) {
+        try {
+            const response = await fetch(`/api/events/${id}`, {
+                method: 'DELETE'
+            });
+
+            if (response.ok) {
+                await Promise.all([syncEvents(), loadCalendar()]);
+                renderCalendar();
+                renderEvents();
+                updateStats();
+            }
+        } catch (error) {
+            console.error('Error deleting event:', error);
+        }
+    }
+}
+
+function renderCalendar() {
+    const calendar = document.getElementById('calendar');
+    calendar.innerHTML = '';
+
+    // Add day headers
+    dayHeaders.forEach(day => {
+        const header = document.createElement('div');
+        header.className = 'day-header';
+        header.textContent = day;
+        calendar.appendChild(header);
+    });
+
+    const year = currentDate.getFullYear();
+    const month = currentDate.getMonth();
+
+    document.getElementById('currentMonth').textContent = 
+        currentDate.toLocaleDateString('en-US', { month: 'long', year: 'numeric' });
+
+    const firstDay = new Date(year, month, 1).getDay();
+    const daysInMonth = new Date(year, month + 1, 0).getDate();
+    const daysInPrevMonth = new Date(year, month, 0).getDate();
+
+    // Previous month days
+    for (let i = firstDay - 1; i >= 0; i--) {
+        const day = createDayElement(daysInPrevMonth - i, true, year, month - 1);
+        calendar.appendChild(day);
+    }
+
+    // Current month days
+    for (let i = 1; i <= daysInMonth; i++) {
+        const day = createDayElement(i, false, year, month);
+        calendar.appendChild(day);
+    }
+
+    // Next month days
+    const remainingDays = 42 - (firstDay + daysInMonth);
+    for (let i = 1; i <= remainingDays; i++) {
+        const day = createDayElement(i, true, year, month + 1);
+        calendar.appendChild(day);
+    }
+}
+
+function createDayElement(dayNum, isOtherMonth, year, month) {
+    const day = document.createElement('div');
+    day.className = 'day';
+    day.textContent = dayNum;
+
+    if (isOtherMonth) {
+        day.classList.add('other-month');
+    }
+
+    const dateStr = `${year}-${String(month + 1).padStart(2, '0')}-${String(dayNum).padStart(2, '0')}`;
+    const today = new Date();
+    const todayStr = `${today.getFullYear()}-${String(today.getMonth() + 1).padStart(2, '0')}-${String(today.getDate()).padStart(2, '0')}`;
+
+    if (dateStr === todayStr && !isOtherMonth) {
+        day.classList.add('today');
+    }
+
+    if (hasEvents(dateStr)) {
+        day.classList.add('has-events');
+    }
+
+    day.onclick = () => selectDate(dateStr);
+
+    return day;
+}
+
+function hasEvents(dateStr) {
+    return dateStr in calendarDays;
+}
+
+function selectDate(dateStr) {
+    document.getElementById('eventDate').value = dateStr;
+    selectedDate = new Date(dateStr);
+    renderCalendar();
+}
+
+async function previousMonth() {
+    currentDate.setMonth(currentDate.getMonth() - 1);
+    await Promise.all([loadEvents(), loadCalendar()]);
+    renderCalendar();
+    renderEvents();
+}
+
+async function nextMonth() {
+    currentDate.setMonth(currentDate.getMonth() + 1);
+    await Promise.all([loadEvents(), loadCalendar()]);
+    renderCalendar();
+    renderEvents();
+}
+
+function renderEvents() {
+    const eventsList = document.getElementById('eventsList');
+    eventsList.innerHTML = '';
+
+    const sortedEvents = [...events].sort((a, b) => {
+        const dateA = new Date(a.date + ' ' + (a.time || '00:00'));
+        const dateB = new Date(b.date + ' ' + (b.time || '00:00'));
+        return dateA - dateB;
+    });
+
+    sortedEvents.forEach(event => {
+        const eventDiv = document.createElement('div');
+        eventDiv.className = `event-item priority-${event.priority}`;
+
+        const eventDate = new Date(event.date);
+        const formattedDate = eventDate.toLocaleDateString('en-US', { 
+            weekday: 'short', 
+            month: 'short', 
+            day: 'numeric', 
+            year: 'numeric' 
+        });
+
+        eventDiv.innerHTML = `
+            <h3>${event.title}</h3>
+            <p class="event-date">📅 ${formattedDate} ${event.time ? '• ⏰ ' + event.time : ''}</p>
+            ${event.description ? `<p>${event.description}</p>` : ''}
+            <p style="font-size: 12px; color: #999;">Priority: ${event.priority.toUpperCase()}</p>
+            <button class="delete-btn" onclick="deleteEvent(${event.id})">Delete</button>
+        `;
+
+        eventsList.appendChild(eventDiv);
+    });
+
+    if (events.length === 0) {
+        eventsList.innerHTML = '<p style="text-align: center; color: #999; padding: 20px;">No events scheduled</p>';
+    }
+}
+
+async function updateStats() {
+    try {
+        const today = formatDate(new Date());
+        const response = await fetch(`/api/stats?today=${today}`);
+        const stats = await response.json();
+        document.getElementById('totalEvents').textContent = stats.total;
+        document.getElementById('todayEvents').textContent = stats.today;
+        document.getElementById('upcomingEvents').textContent = stats.upcoming;
+    } catch (error) {
+        console.error('Error loading stats:', error);
+    }
+}
+
+function exportEvents() {
+    const link = document.createElement('a');
+    link.href = '/api/events/export?format=json';
+    link.download = `calendar-events-${new Date().toISOString().split('T')[0]}.json`;
+    link.click();
+}
+
+// Initialize app
+init();
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import os
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class StaticAsset:
+    """One file held in memory with its precompressed variants"""
+
+    def __init__(self, name: str, body: bytes):
+        self.name = name
+        self.content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.encodings: Dict[str, bytes] = {"identity": body}
+        self.encodings["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(body)
+
+    @property
+    def hashed_name(self) -> str:
+        stem, ext = os.path.splitext(self.name)
+        return f"{stem}.{self.digest}{ext}"
+
+    def etag(self, encoding: str) -> str:
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        """Pick the best encoding the client accepts, answering 304 when its copy is current"""
+        encoding = negotiate(request.headers.get("accept-encoding", ""), self.encodings)
+        headers = {
+            "ETag": self.etag(encoding),
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(self.encodings[encoding], media_type=self.content_type, headers=headers)
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        return etag_matches(if_none_match, *(self.etag(e) for e in self.encodings))
+
+
+class StaticAssets:
+    """The frontend, loaded and compressed once at startup.
+
+    Every file except ``index.html`` is served under a content-hashed name
+    so browsers can cache it forever; ``index.html`` has its references
+    rewritten to those names and is revalidated with its ETag instead.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static"):
+        self.prefix = prefix
+        self._by_name: Dict[str, StaticAsset] = {}
+        with open(os.path.join(directory, "index.html"), encoding="utf-8") as f:
+            html = f.read()
+        for name in sorted(os.listdir(directory)):
+            if name == "index.html":
+                continue
+            with open(os.path.join(directory, name), "rb") as f:
+                asset = StaticAsset(name, f.read())
+            self._by_name[name] = asset
+            self._by_name[asset.hashed_name] = asset
+            html = html.replace(f"{prefix}/{name}", f"{prefix}/{asset.hashed_name}")
+        self.index = StaticAsset("index.html", html.encode("utf-8"))
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        return self._by_name.get(name)
+
+    def cache_control(self, name: str) -> str:
+        asset = self._by_name[name]
+        return IMMUTABLE if name == asset.hashed_name else REVALIDATE
+
+
+def etag_matches(if_none_match: Optional[str], *etags: str) -> bool:
+    """Whether an If-None-Match header names any of ``etags`` (weak comparison)"""
+    if not if_none_match:
+        return False
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    tags |= {tag[2:] for tag in tags if tag.startswith("W/")}
+    return "*" in tags or any(etag in tags for etag in etags)
+
+
+def negotiate(accept_encoding: str, available: Dict[str, bytes]) -> str:
+    """Choose br, then gzip, then identity according to Accept-Encoding"""
+    accepted: List[str] = []
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            accepted.append(coding.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
@@ -0,0 +1,851 @@
+from bisect import bisect_left, bisect_right, insort
+import heapq
+from datetime import date, timedelta
+from itertools import chain, islice
+import os
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from archive import Archive
+from freebusy import MAX_DURATION, MINUTES_PER_DAY, Overlaps, busy_days, busy_span, planned_spans
+from intervals import IntervalTree
+from metrics import CACHE_LOOKUPS
+from persistence import WriteAheadLog
+from records import Record
+from recurrence import expand, expansion_window, series_span
+from search import SearchIndex
+
+
+class EventStore:
+    """In-memory event store keyed by id with date and priority indexes.
+
+    Events are held as packed ``Record`` objects and only turned back into
+    dicts in the public ``Event`` shape as they are returned, so a listing
+    builds dicts for the events on its page alone. Lookups by id are
+    O(1); date range queries bisect a sorted list of distinct dates and then
+    walk the per-date buckets, each kept sorted by (time, id).
+
+    Recurring events are kept out of the date index. Each one is stored once
+    in an interval tree spanning its first to last possible occurrence, and
+    range queries expand only the series overlapping the window, merging
+    their occurrences into the result in order.
+
+    Events with a time and a duration also go in an interval tree of the
+    minutes they keep busy, so ``overlapping()`` finds what is on during a
+    slot without scanning the day's events. Series with a time and a
+    duration get a tree of their own, so only those are expanded for it.
+
+    Titles and descriptions are kept in a ``SearchIndex`` for ``search()``,
+    and the ids of events with a reminder in a set for ``reminders()``.
+
+    ``version()`` increases with every mutation; ``epoch`` is unique to this
+    process, so together they identify the store's contents. Each event's
+    ``revision`` is the version that last wrote it.
+
+    When a ``WriteAheadLog`` is given, existing state is recovered from it
+    and every mutation is appended to it; callers make them durable with
+    ``commit()``. The search index is saved on ``close()``, so after a clean
+    shutdown a restart only re-indexes the events changed in the log tail.
+
+    With a log, ``archive()`` moves old events into an ``Archive`` of cold
+    segments beside it. Listings, exports, feeds, counts, free/busy and
+    lookups by id include archived events; changing or deleting one first
+    brings it back into memory. They are not searched while archived.
+    """
+
+    blocking = False
+
+    def __init__(self, log: Optional[WriteAheadLog] = None):
+        self._events: Dict[int, Record] = {}
+        self._dates: List[str] = []
+        self._by_date: Dict[str, List[Tuple[str, int]]] = {}
+        self._by_priority: Dict[str, Set[int]] = {}
+        self._series = IntervalTree()
+        self._timed = IntervalTree()
+        self._timed_series = IntervalTree()
+        self._with_reminders: Set[int] = set()
+        self._day_counts = DayCounter()
+        self._grid_cache: Dict[Tuple[int, int], dict] = {}
+        self._journal = ChangeJournal()
+        self._search = SearchIndex()
+        self._batch: Optional[List[dict]] = None
+        self._next_id = 1
+        self._version = 0
+        self._modified = int(time.time())
+        self.epoch = uuid.uuid4().hex[:8]
+        self.log = log
+        self._archive: Optional[Archive] = None
+        if log is not None:
+            self._search_path = os.path.join(log.directory, "search.index")
+            self._archive = Archive(os.path.join(log.directory, "archive"))
+            self._load(log)
+
+    def _load(self, log: WriteAheadLog) -> None:
+        saved = SearchIndex.load(self._search_path)
+
+        def replay(record: dict) -> None:
+            if record["op"] == "unarchive":
+                event = record["event"]
+                self._archive.remove(record["segment"], event["id"], event["date"], event["priority"])
+            # Only a saved index taken with the current snapshot can be patched
+            if saved is None or saved.lsn != log.snapshot_lsn:
+                return
+            if record["op"] in ("put", "unarchive"):
+                event = record["event"]
+                saved.add(event["id"], event["title"], event.get("description"))
+            elif record["op"] == "archive":
+                for event_id in record["ids"]:
+                    saved.remove(event_id)
+            else:
+                saved.remove(record["id"])
+
+        self._events, self._next_id = log.load(replay, Record.pack)
+        for name, removed in log.meta.get("archive_removals", {}).items():
+            for event_id, day, priority in removed:
+                self._archive.remove(name, event_id, day, priority)
+        self._archive.recover(self._events.__contains__)
+        self._next_id = max(self._next_id, self._archive.max_id + 1)
+        fresh = saved is not None and saved.lsn == log.snapshot_lsn
+        if fresh:
+            self._search = saved
+        for event in self._events.values():
+            self._index(event, search=not fresh)
+        # Keep revisions increasing across restarts, archived events included,
+        # so no revision (and so no event ETag) is ever handed out twice
+        self._version = max(
+            log.meta.get("version", 0),
+            self._archive.max_revision,
+            max((event.revision for event in self._events.values()), default=0),
+        )
+
+    def version(self) -> int:
+        """A counter bumped by every mutation; pair with ``epoch`` to compare"""
+        return self._version
+
+    def modified(self) -> int:
+        """When the last mutation (or startup) happened, in epoch seconds"""
+        return self._modified
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __contains__(self, event_id: int) -> bool:
+        return event_id in self._events or self._archived(event_id) is not None
+
+    def get(self, event_id: int) -> Optional[dict]:
+        event = self._events.get(event_id)
+        if event is None:
+            found = self._archived(event_id)
+            event = found[1] if found is not None else None
+        return event.to_dict() if event is not None else None
+
+    def all(self) -> Iterator[dict]:
+        """Iterate over every event in insertion order, archived ones first"""
+        events = (event.to_dict() for event in list(self._events.values()))
+        if self._archive is None or not len(self._archive):
+            return events
+        return chain((event.to_dict() for event in self._archive.range()), events)
+
+    def add(self, data: dict, exclusive: bool = False) -> dict:
+        """Store a new event, assigning it the next id.
+
+        With ``exclusive``, raise ``Overlaps`` instead if the event would be
+        busy at the same time as any existing one.
+        """
+        if exclusive:
+            conflicts = self._conflicts(data)
+            if conflicts:
+                raise Overlaps(conflicts)
+        event = Record.pack(dict(data, id=self._next_id, revision=self._version + 1))
+        self._next_id += 1
+        self._events[event.id] = event
+        self._index(event)
+        return self._record("put", event)
+
+    def add_many(self, items: List[dict]) -> List[dict]:
+        """Store several new events; pair with a single ``commit()``. Like
+        ``apply()``, they go to the log as one batch record, so recovery
+        sees all of them or none."""
+        self._batch = []
+        try:
+            return [self.add(data) for data in items]
+        finally:
+            records, self._batch = self._batch, None
+            if records:
+                self._log({"op": "batch", "records": records})
+
+    def iter_batches(self, size: int = 1000) -> Iterator[List[dict]]:
+        """Iterate over every event in id order, ``size`` at a time.
+
+        The id map is copied up front so the batches can be consumed from
+        another thread while the store keeps changing.
+        """
+        events = list(self._events.values())
+        batches = (
+            [event.to_dict() for event in events[i:i + size]]
+            for i in range(0, len(events), size)
+        )
+        if self._archive is None or not len(self._archive):
+            return batches
+        archived = self._archive.range()
+        return chain(batches, iter(lambda: [event.to_dict() for event in islice(archived, size)], []))
+
+    def iter_feed(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        priority: Optional[str] = None,
+        size: int = 1000,
+    ) -> Iterator[List[dict]]:
+        """Iterate, ``size`` at a time, over the events dated between ``start``
+        and ``end`` (inclusive) and the series with a possible occurrence
+        there, each series once and unexpanded, for calendar feeds.
+
+        Like ``iter_batches``, the matching records are collected up front.
+        """
+        if start is None and end is None:
+            events = list(self._events.values())
+            if priority is not None:
+                events = [event for event in events if event.priority == priority]
+            if self._archive is not None:
+                events += self._archive.range(None, None, priority)
+        else:
+            events = list(self._range_dated(start, end, priority, None))
+            first = date.fromisoformat(start).toordinal() if start else 1
+            last = date.fromisoformat(end).toordinal() if end else date.max.toordinal()
+            for _, _, event_id in self._series.overlapping(first, last):
+                event = self._events[event_id]
+                if priority is None or event.priority == priority:
+                    events.append(event)
+        return (
+            [event.to_dict() for event in events[i:i + size]]
+            for i in range(0, len(events), size)
+        )
+
+    def update(
+        self, event_id: int, changes: dict, revisions: Optional[Set[int]] = None
+    ) -> Optional[dict]:
+        """Apply ``changes`` to an event, re-indexing only what moved.
+
+        With ``revisions``, the update only goes ahead if the event's
+        current revision is one of them; otherwise ``StaleRevision`` is
+        raised carrying the event as it is now.
+        """
+        old = self._events.get(event_id)
+        if old is None:
+            found = self._archived(event_id)
+            if found is None:
+                return None
+            if revisions is not None and found[1].revision not in revisions:
+                raise StaleRevision(found[1].to_dict())
+            old = self._unarchive(*found)
+        current = old.to_dict()
+        if revisions is not None and old.revision not in revisions:
+            raise StaleRevision(current)
+        changes = {k: v for k, v in changes.items() if k not in ("id", "revision")}
+        retext = any(
+            k in changes and changes[k] != current.get(k) for k in ("title", "description")
+        )
+        moved_date = any(
+            k in changes and changes[k] != current.get(k)
+            for k in ("date", "time", "duration", "reminder", "recurrence")
+        )
+        moved_priority = "priority" in changes and changes["priority"] != current["priority"]
+        event = Record.pack(dict(current, **changes, revision=self._version + 1))
+        self._events[event_id] = event
+        if moved_date:
+            self._unindex_date(old)
+            self._index_date(event)
+        if moved_priority:
+            self._by_priority[old.priority].discard(event_id)
+            self._invalidate_grids(old)
+            self._by_priority.setdefault(event.priority, set()).add(event_id)
+        if retext:
+            self._search.add(event_id, event.title, event.description)
+        return self._record("put", event)
+
+    def delete(self, event_id: int) -> Optional[dict]:
+        """Remove an event, returning it, or None if it does not exist"""
+        event = self._events.get(event_id)
+        if event is None:
+            found = self._archived(event_id)
+            if found is None:
+                return None
+            event = self._unarchive(*found)
+        self._remove(event)
+        self._record("delete", event)
+        return event.to_dict()
+
+    def archive(self, before: str) -> int:
+        """Move the events dated before ``before`` into the archive and
+        return how many moved. Series stay, as they may still recur.
+
+        The move is logged and committed like a mutation, but the version
+        is left alone: every listing returns the same events as before.
+        This does every step in turn; a server runs ``write_archive()``
+        and ``settle_archive()`` off its event loop instead.
+        """
+        old = self.prepare_archive(before)
+        if not old:
+            return 0
+        names = self.write_archive(old)
+        moved = self.finish_archive(old, names)
+        if moved:
+            self.log.commit()
+        self.settle_archive(names, bool(moved))
+        return moved
+
+    def prepare_archive(self, before: str) -> List[Record]:
+        """The events ``archive()`` would move, in memory only"""
+        if self._archive is None:
+            raise RuntimeError("Archiving needs a write-ahead log")
+        return [
+            self._events[event_id]
+            for day in self._dates[:bisect_left(self._dates, before)]
+            for _, event_id in self._by_date[day]
+        ]
+
+    def write_archive(self, old: List[Record]) -> List[str]:
+        """Write ``old`` to new segments without touching the store, so it
+        can run on another thread while the store keeps changing"""
+        return self._archive.write(old)
+
+    def finish_archive(self, old: List[Record], names: List[str]) -> int:
+        """Drop ``old`` from memory and log the move, unless any of them
+        changed while their segments were written; returns how many moved.
+        Commit the log before ``settle_archive()``."""
+        if any(self._events.get(event.id) is not event for event in old):
+            # The segments hold stale copies; the next run tries again
+            return 0
+        self._archive.attach(names)
+        for event in old:
+            self._remove(event)
+        self._log({"op": "archive", "ids": [event.id for event in old]})
+        return len(old)
+
+    def settle_archive(self, names: List[str], moved: bool) -> None:
+        """Confirm the segments of a committed move, or delete them if
+        ``finish_archive()`` gave up"""
+        if moved:
+            self._archive.confirm(names)
+        else:
+            self._archive.drop(names)
+
+    def _archived(self, event_id: int) -> Optional[Tuple[str, Record]]:
+        if self._archive is None or not len(self._archive):
+            return None
+        return self._archive.find(event_id)
+
+    def _unarchive(self, segment: str, event: Record) -> Record:
+        """Bring an archived event back into memory so it can be changed
+        like any other. Listings stay the same, so the version does not
+        move; the log record carries the event, so replay restores it
+        even if the change that follows never made it to disk."""
+        self._archive.remove(segment, event.id, event.date, event.priority)
+        self._events[event.id] = event
+        self._index(event)
+        record = {"op": "unarchive", "segment": segment, "event": event.to_dict()}
+        if self._batch is not None:
+            self._batch.append(record)
+        else:
+            self._log(record)
+        return event
+
+    def _remove(self, event: Record) -> None:
+        del self._events[event.id]
+        self._unindex_date(event)
+        self._search.remove(event.id)
+        ids = self._by_priority.get(event.priority)
+        if ids is not None:
+            ids.discard(event.id)
+            if not ids:
+                del self._by_priority[event.priority]
+
+    def apply(self, operations: List[dict]) -> List[dict]:
+        """Apply a batch of create, update and delete operations as a unit.
+
+        Each operation is ``{"op": "create", "event": {...}}``,
+        ``{"op": "update", "id": ..., "changes": {...}}`` or
+        ``{"op": "delete", "id": ...}``. If any update or delete names an
+        event that does not exist at that point in the batch, nothing is
+        applied and ``MissingEvents`` lists their positions. The log gets
+        the whole batch as one record, so recovery never sees half of it.
+        """
+        missing, deleted = [], set()
+        for index, operation in enumerate(operations):
+            if operation["op"] == "create":
+                continue
+            if operation["id"] not in self or operation["id"] in deleted:
+                missing.append(index)
+            elif operation["op"] == "delete":
+                deleted.add(operation["id"])
+        if missing:
+            raise MissingEvents(missing)
+        self._batch = []
+        try:
+            results = []
+            for operation in operations:
+                if operation["op"] == "create":
+                    event = self.add(operation["event"])
+                    results.append({"op": "create", "id": event["id"], "event": event})
+                elif operation["op"] == "update":
+                    event = self.update(operation["id"], operation["changes"])
+                    results.append({"op": "update", "id": operation["id"], "event": event})
+                else:
+                    self.delete(operation["id"])
+                    results.append({"op": "delete", "id": operation["id"]})
+        finally:
+            records, self._batch = self._batch, None
+            if records:
+                self._log({"op": "batch", "records": records})
+        return results
+
+    def range(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        priority: Optional[str] = None,
+        after: Optional[Tuple[str, str, int]] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """Iterate over events between ``start`` and ``end`` (inclusive) in
+        (date, time, id) order, optionally restricted to one priority, to
+        keys strictly after ``after`` and to at most ``limit`` results"""
+        return islice(self._range(start, end, priority, after), limit)
+
+    def _range(self, start, end, priority, after) -> Iterator[dict]:
+        if start is None and end is None and priority is not None:
+            # No window to expand series in, so each is listed once at its
+            # first date. Dated events come from the date index, filtered
+            # lazily, so a page only reads as far as it needs to.
+            series = [
+                self._events[event_id]
+                for _, _, event_id in self._series.overlapping(1, date.max.toordinal())
+                if self._events[event_id].priority == priority
+            ]
+            series.sort(key=Record.key)
+            if after is not None:
+                series = [event for event in series if event.key() > after]
+            events = heapq.merge(self._range_dated(None, None, priority, after), series, key=Record.key)
+            for event in events:
+                yield event.to_dict()
+            return
+        events = (event.to_dict() for event in self._range_dated(start, end, priority, after))
+        if not len(self._series):
+            yield from events
+            return
+        window_start, window_end = expansion_window(start, end)
+        series = [
+            self._events[event_id]
+            for _, _, event_id in self._series.overlapping(
+                window_start.toordinal(), window_end.toordinal()
+            )
+        ]
+        if priority is not None:
+            series = [event for event in series if event.priority == priority]
+        series = [event.to_dict() for event in series]
+        if after is not None:
+            window_start = max(window_start, date.fromisoformat(after[0]))
+        occurrences = expand(series, window_start, window_end)
+        for event in heapq.merge(events, occurrences, key=sort_key):
+            if after is None or sort_key(event) > after:
+                yield event
+
+    def _range_dated(self, start, end, priority, after) -> Iterator[Record]:
+        """Events that are not series in (date, time, id) order, from memory
+        and, when the window reaches back that far, the archive"""
+        events = self._range_indexed(start, end, priority, after)
+        if self._archive is None or not len(self._archive):
+            return events
+        return heapq.merge(self._archive.range(start, end, priority, after), events, key=Record.key)
+
+    def _range_indexed(self, start, end, priority, after) -> Iterator[Record]:
+        if after is not None and (start is None or after[0] > start):
+            start = after[0]
+        lo = bisect_left(self._dates, start) if start else 0
+        hi = bisect_right(self._dates, end) if end else len(self._dates)
+        for day in self._dates[lo:hi]:
+            bucket = self._by_date.get(day, ())
+            offset = 0
+            if after is not None and day == after[0]:
+                offset = bisect_right(bucket, (after[1], after[2]))
+            for _, event_id in bucket[offset:]:
+                event = self._events.get(event_id)
+                if event is not None and (priority is None or event.priority == priority):
+                    yield event
+
+    def overlapping(self, start: int, end: int) -> List[dict]:
+        """Events and series occurrences busy at some point in the minutes
+        [start, end), in order of their start"""
+        events = [
+            self._events[event_id].to_dict()
+            for _, _, event_id in self._timed.overlapping(start, end - 1)
+        ]
+        merged = False
+        if len(self._timed_series):
+            # Occurrences that start up to MAX_DURATION earlier may still be on
+            series = self._timed_series.overlapping(
+                max(1, (start - MAX_DURATION) // MINUTES_PER_DAY), (end - 1) // MINUTES_PER_DAY
+            )
+            for _, _, event_id in series:
+                event = self._events[event_id]
+                rule = {"date": event.date, "recurrence": event.recurrence}
+                days = list(busy_days(rule, event.clock, event.duration, start, end))
+                if days:
+                    data = event.to_dict()
+                    events.extend(dict(data, date=day.isoformat()) for day in days)
+            merged = True
+        if self._archive is not None and len(self._archive):
+            first = date.fromordinal(max(1, (start - MAX_DURATION) // MINUTES_PER_DAY))
+            last = date.fromordinal((end - 1) // MINUTES_PER_DAY)
+            for event in self._archive.range(first.isoformat(), last.isoformat()):
+                span = event.span()
+                if span is not None and span[0] < end and span[1] > start:
+                    events.append(event.to_dict())
+                    merged = True
+        if merged:
+            events.sort(key=lambda event: (busy_span(event), event["id"]))
+        return events
+
+    def reminders(self, today: str) -> List[dict]:
+        """Events with a reminder that may still be due: those from
+        ``today`` on and series that have not ended"""
+        day = date.fromisoformat(today).toordinal()
+        events = []
+        for event_id in self._with_reminders:
+            event = self._events[event_id]
+            last = series_span(event.to_dict())[1] if event.recurrence else event.day
+            if last >= day:
+                events.append(event.to_dict())
+        return events
+
+    def claim_reminder(self, event_id: int, day: str) -> bool:
+        """Whether to send a reminder; always, as only one process uses the store"""
+        return True
+
+    def _conflicts(self, data: dict) -> List[dict]:
+        conflicts = {}
+        for start, end in planned_spans(data):
+            for event in self.overlapping(start, end):
+                conflicts.setdefault((event["id"], event["date"]), event)
+        return list(conflicts.values())
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """Events containing a word starting with each word of ``query``,
+        best match first"""
+        hits = self._search.search(query, limit)
+        return [self._events[event_id].to_dict() for _, event_id in hits]
+
+    def stats(self, today: str) -> dict:
+        """Count all events, those on ``today``, those after it and each priority"""
+        dated = len(self._events) - len(self._series)
+        today_count = len(self._by_date.get(today, ()))
+        upcoming = dated - self._day_counts.prefix(today)
+        if len(self._series):
+            day = date.fromisoformat(today)
+            today_count += sum(1 for _ in self._occurrences_between(day, day))
+            # A series counts once towards upcoming if it has any later occurrence
+            tomorrow = day + timedelta(days=1)
+            later = self._series.overlapping(tomorrow.toordinal(), date.max.toordinal())
+            for _, _, event_id in later:
+                if next(expand([self._events[event_id].to_dict()], tomorrow, date.max), None):
+                    upcoming += 1
+        total = len(self._events)
+        by_priority = {p: len(ids) for p, ids in self._by_priority.items() if ids}
+        if self._archive is not None and len(self._archive):
+            total += len(self._archive)
+            for day, counts in self._archive.day_counts(today).items():
+                if day == today:
+                    today_count += sum(counts.values())
+                else:
+                    upcoming += sum(counts.values())
+            for p, count in self._archive.priority_counts().items():
+                by_priority[p] = by_priority.get(p, 0) + count
+        return {
+            "total": total,
+            "today": today_count,
+            "upcoming": upcoming,
+            "by_priority": by_priority,
+        }
+
+    def day_counts(self, start: str, end: str) -> Dict[str, int]:
+        """Number of events on each date between ``start`` and ``end`` that has any"""
+        lo = bisect_left(self._dates, start)
+        hi = bisect_right(self._dates, end)
+        counts = {day: len(self._by_date[day]) for day in self._dates[lo:hi]}
+        if self._archive is not None:
+            for day, archived in self._archive.day_counts(start, end).items():
+                counts[day] = counts.get(day, 0) + sum(archived.values())
+        return counts
+
+    def calendar_grid(self, year: int, month: int) -> dict:
+        """Per-day event counts and highest priority for a month's 6-week grid.
+
+        Results are cached per month until an event inside the grid changes.
+        """
+        grid = self._grid_cache.get((year, month))
+        CACHE_LOOKUPS.inc("grid", "miss" if grid is None else "hit")
+        if grid is None:
+            start, end = grid_range(year, month)
+            lo = bisect_left(self._dates, start)
+            hi = bisect_right(self._dates, end)
+            days = {}
+            for day in self._dates[lo:hi]:
+                bucket = self._by_date[day]
+                top = max(
+                    (self._events[event_id].priority for _, event_id in bucket),
+                    key=priority_rank,
+                )
+                days[day] = {"count": len(bucket), "priority": top}
+            if self._archive is not None:
+                for day, counts in self._archive.day_counts(start, end).items():
+                    cell = days.setdefault(day, {"count": 0, "priority": next(iter(counts))})
+                    cell["count"] += sum(counts.values())
+                    cell["priority"] = max(cell["priority"], *counts, key=priority_rank)
+            first, last = date.fromisoformat(start), date.fromisoformat(end)
+            for occurrence in self._occurrences_between(first, last):
+                cell = days.setdefault(
+                    occurrence["date"], {"count": 0, "priority": occurrence["priority"]}
+                )
+                cell["count"] += 1
+                cell["priority"] = max(cell["priority"], occurrence["priority"], key=priority_rank)
+            grid = self._grid_cache[(year, month)] = {"start": start, "end": end, "days": days}
+        return grid
+
+    def metrics(self) -> Dict[str, int]:
+        """Entries in the store and each index, for monitoring"""
+        return {
+            "events": len(self._events),
+            "series": len(self._series),
+            "dates": len(self._dates),
+            "busy_intervals": len(self._timed) + len(self._timed_series),
+            "reminders": len(self._with_reminders),
+            "search_documents": len(self._search),
+            "search_terms": self._search.term_count(),
+            "grid_cache": len(self._grid_cache),
+            "journal": len(self._journal),
+            "archived_events": len(self._archive) if self._archive is not None else 0,
+            "archive_segments": self._archive.segment_count if self._archive is not None else 0,
+        }
+
+    def commit(self) -> None:
+        """Block until all mutations so far are durable (no-op in memory)"""
+        if self.log is not None:
+            self.log.commit()
+
+    def close(self) -> None:
+        if self.log is not None:
+            # Replaying the log after the snapshot over a newer index ends in
+            # the same state, so the index is saved once here, not per snapshot
+            self.log.finish_snapshot()
+            self._search.save(self._search_path, self.log.snapshot_lsn)
+            self.log.close()
+
+    def changes_since(self, seq: int) -> dict:
+        """Changes made after version ``seq``, or a resync flag if the journal
+        no longer reaches back that far"""
+        changes = self._journal.since(seq)
+        return {
+            "version": self._version,
+            "resync": changes is None,
+            "changes": [
+                dict(change, event=change["event"].to_dict() if change["event"] else None)
+                for change in changes or ()
+            ],
+        }
+
+    def _record(self, op: str, event: Record) -> Optional[dict]:
+        """Journal and log a mutation; returns the event as a dict for puts"""
+        self._version += 1
+        self._modified = int(time.time())
+        if op == "put":
+            self._journal.append(self._version, "put", event.id, event)
+            data = event.to_dict()
+            record = {"op": "put", "event": data}
+        else:
+            self._journal.append(self._version, "delete", event.id, None)
+            data = None
+            record = {"op": "del", "id": event.id}
+        if self._batch is not None:
+            self._batch.append(record)
+        else:
+            self._log(record)
+        return data
+
+    def _log(self, record: dict) -> None:
+        if self.log is None:
+            return
+        self.log.append(record)
+        if self.log.should_compact():
+            # Records never change, so a copy of the list is a consistent
+            # view for the snapshot thread to encode while the store moves on
+            records = list(self._events.values())
+            self.log.snapshot(
+                (event.to_dict() for event in records),
+                self._next_id,
+                {"archive_removals": self._archive.removals(), "version": self._version},
+            )
+
+    def _index(self, event: Record, search: bool = True) -> None:
+        self._index_date(event)
+        self._by_priority.setdefault(event.priority, set()).add(event.id)
+        if search:
+            self._search.add(event.id, event.title, event.description)
+
+    def _occurrences_between(self, start: date, end: date) -> Iterator[dict]:
+        series = self._series.overlapping(start.toordinal(), end.toordinal())
+        events = [self._events[event_id].to_dict() for _, _, event_id in series]
+        return expand(events, start, end)
+
+    def _index_date(self, event: Record) -> None:
+        if event.reminder is not None:
+            self._with_reminders.add(event.id)
+        if event.recurrence:
+            span = series_span(event.to_dict())
+            self._series.add(*span, event.id)
+            if event.span() is not None:
+                self._timed_series.add(*span, event.id)
+            self._invalidate_grids(event)
+            return
+        day = event.date
+        bucket = self._by_date.get(day)
+        if bucket is None:
+            bucket = self._by_date[day] = []
+            insort(self._dates, day)
+        insort(bucket, (event.time or "", event.id))
+        self._day_counts.add(event.day, 1)
+        span = event.span()
+        if span is not None:
+            self._timed.add(span[0], span[1] - 1, event.id)
+        self._invalidate_grids(event)
+
+    def _invalidate_grids(self, event: Record) -> None:
+        if not self._grid_cache:
+            return
+        if event.recurrence:
+            self._grid_cache.clear()
+            return
+        day = event.date
+        # A date shows up in its own month's grid and possibly both neighbours'
+        year, month = int(day[:4]), int(day[5:7])
+        for offset in (-1, 0, 1):
+            y, m = divmod(year * 12 + month - 1 + offset, 12)
+            self._grid_cache.pop((y, m + 1), None)
+
+    def _unindex_date(self, event: Record) -> None:
+        self._with_reminders.discard(event.id)
+        if event.recurrence:
+            span = series_span(event.to_dict())
+            self._series.remove(*span, event.id)
+            if event.span() is not None:
+                self._timed_series.remove(*span, event.id)
+            self._invalidate_grids(event)
+            return
+        day = event.date
+        bucket = self._by_date[day]
+        del bucket[bisect_left(bucket, (event.time or "", event.id))]
+        self._day_counts.add(event.day, -1)
+        span = event.span()
+        if span is not None:
+            self._timed.remove(span[0], span[1] - 1, event.id)
+        self._invalidate_grids(event)
+        if not bucket:
+            del self._by_date[day]
+            del self._dates[bisect_left(self._dates, day)]
+
+
+PRIORITY_RANK = {"low": 1, "medium": 2, "high": 3}
+
+
+class StaleRevision(Exception):
+    """A conditional update found the event at another revision; ``event``
+    is its current state"""
+
+    def __init__(self, event: dict):
+        super().__init__(f"event {event['id']} is at revision {event['revision']}")
+        self.event = event
+
+
+class MissingEvents(LookupError):
+    """A batch referred to events that do not exist; ``indexes`` are the
+    positions of the offending operations"""
+
+    def __init__(self, indexes: List[int]):
+        super().__init__(f"no such event for operations {indexes}")
+        self.indexes = indexes
+
+
+def sort_key(event: dict) -> Tuple[str, str, int]:
+    return (event["date"], event.get("time") or "", event["id"])
+
+
+def priority_rank(priority: str) -> int:
+    return PRIORITY_RANK.get(priority, 0)
+
+
+def grid_range(year: int, month: int) -> Tuple[str, str]:
+    """First and last date of the Sunday-first 6-week grid showing a month"""
+    first = date(year, month, 1)
+    start = first - timedelta(days=(first.weekday() + 1) % 7)
+    return start.isoformat(), (start + timedelta(days=41)).isoformat()
+
+
+class ChangeJournal:
+    """The most recent mutations, kept so clients can catch up incrementally.
+
+    Holds between ``capacity`` and twice that many entries; once older
+    entries are dropped, ``since()`` returns None for sequence numbers
+    before them and the client has to reload everything.
+    """
+
+    def __init__(self, capacity: int = 10_000):
+        self.capacity = capacity
+        self._seqs: List[int] = []
+        self._entries: List[dict] = []
+        self._floor = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def append(self, seq: int, op: str, event_id: int, event: Optional[dict]) -> None:
+        self._seqs.append(seq)
+        self._entries.append({"seq": seq, "op": op, "id": event_id, "event": event})
+        if len(self._entries) > 2 * self.capacity:
+            drop = len(self._entries) - self.capacity
+            self._floor = self._seqs[drop - 1]
+            del self._seqs[:drop]
+            del self._entries[:drop]
+
+    def since(self, seq: int) -> Optional[List[dict]]:
+        if seq < self._floor:
+            return None
+        return self._entries[bisect_right(self._seqs, seq):]
+
+
+class DayCounter:
+    """Event counts per day in a sparse Fenwick tree over day ordinals.
+
+    ``prefix()`` answers "how many events on or before this date" in
+    O(log n) without walking every earlier date.
+    """
+
+    SIZE = date.max.toordinal()
+
+    def __init__(self):
+        self._tree: Dict[int, int] = {}
+
+    def add(self, day: int, delta: int) -> None:
+        """Add ``delta`` to the count of the day with ordinal ``day``"""
+        i = day
+        while i <= self.SIZE:
+            self._tree[i] = self._tree.get(i, 0) + delta
+            i += i & -i
+
+    def prefix(self, day: str) -> int:
+        i = date.fromisoformat(day).toordinal()
+        total = 0
+        while i > 0:
+            total += self._tree.get(i, 0)
+            i -= i & -i
+        return total
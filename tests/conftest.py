@@ -0,0 +1,44 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.testclient import TestClient
+
+import app
+from persistence import WriteAheadLog
+from sqlite_store import SQLiteEventStore
+from store import EventStore
+
+
+@pytest.fixture(params=["memory", "wal", "sqlite"])
+def open_store(request, tmp_path):
+    """Opens a store of each kind; calling it again after ``close()``
+    reopens the same files, as a restart would"""
+
+    def open_store():
+        if request.param == "sqlite":
+            return SQLiteEventStore(str(tmp_path / "calendar.db"))
+        if request.param == "wal":
+            return EventStore(WriteAheadLog(str(tmp_path / "data")))
+        return EventStore()
+
+    open_store.durable = request.param != "memory"
+    return open_store
+
+
+@pytest.fixture
+def serve(open_store, monkeypatch):
+    """Runs the app on a newly opened store: ``with serve() as client:``.
+    Leaving the block shuts the app down, which closes the store."""
+
+    @contextmanager
+    def serve():
+        monkeypatch.setattr(app, "store", open_store())
+        with TestClient(app.app) as client:
+            yield client
+
+    return serve
@@ -0,0 +1,126 @@
+import asyncio
+import os
+
+import pytest
+
+import app
+
+from persistence import WriteAheadLog
+from store import EventStore, StaleRevision
+
+
+def seeded(directory):
+    store = EventStore(WriteAheadLog(str(directory)))
+    for day in ("2020-01-05", "2020-01-20", "2020-02-03", "2031-05-01"):
+        store.add({"title": f"review {day}", "date": day, "priority": "low"})
+    store.commit()
+    return store
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory / "archive") if name.endswith(".ndjson.gz"))
+
+
+def test_archived_events_survive_a_restart(tmp_path):
+    store = seeded(tmp_path)
+    listing = [dict(event) for event in store.all()]
+    assert store.archive("2021-01-01") == 3
+    assert len(store) == 1
+    assert [dict(event) for event in store.range("2019-01-01")] == sorted(listing, key=lambda e: e["date"])
+    store.close()
+
+    store = EventStore(WriteAheadLog(str(tmp_path)))
+    assert len(store) == 1
+    assert [event["date"] for event in store.range("2019-01-01", "2020-12-31")] == [
+        "2020-01-05", "2020-01-20", "2020-02-03",
+    ]
+    store.close()
+
+
+def test_run_is_dropped_when_an_event_changes_during_the_write(tmp_path):
+    store = seeded(tmp_path)
+    old = store.prepare_archive("2021-01-01")
+    names = store.write_archive(old)
+    # Written segments stay out of reads until the move is finished
+    assert len(list(store.range("2019-01-01", "2020-12-31"))) == 3
+    store.update(old[0].id, {"title": "moved to later"})
+    assert store.finish_archive(old, names) == 0
+    store.settle_archive(names, False)
+    assert segment_files(tmp_path) == []
+    assert [event["title"] for event in store.range("2020-01-01", "2020-01-10")] == ["moved to later"]
+    assert store.archive("2021-01-01") == 3
+    store.close()
+
+
+def test_archived_events_can_be_fetched_changed_and_deleted(tmp_path):
+    store = seeded(tmp_path)
+    store.archive("2021-01-01")
+    first, second, third = (event["id"] for event in store.range("2019-01-01", "2020-12-31"))
+    assert store.get(first)["date"] == "2020-01-05"
+    assert store.update(first, {"title": "planning", "priority": "high"})["title"] == "planning"
+    assert store.delete(second)["id"] == second
+    assert store.get(second) is None
+    assert [event["id"] for event in store.range("2019-01-01", "2020-12-31")] == [first, third]
+    assert store.stats("2020-06-01")["by_priority"] == {"high": 1, "low": 2}
+    assert len(store) == 2
+    store.commit()
+    store.close()
+
+    # Once through a restart replaying the log, once through a snapshot
+    for compact_every in (100_000, 1):
+        store = EventStore(WriteAheadLog(str(tmp_path), compact_every=compact_every))
+        if compact_every == 1:
+            store.update(third, {"title": "retro"})
+            store.close()
+            store = EventStore(WriteAheadLog(str(tmp_path)))
+        events = list(store.range("2019-01-01", "2020-12-31"))
+        assert [event["id"] for event in events] == [first, third]
+        assert events[0]["title"] == "planning"
+        assert store.get(second) is None
+        assert store.day_counts("2020-01-01", "2020-01-31") == {"2020-01-05": 1}
+        store.close()
+
+
+def test_revisions_keep_increasing_when_only_archived_events_hold_them(tmp_path):
+    store = seeded(tmp_path)
+    event_id = store.update(1, {"title": "planning"})["id"]
+    revision = store.get(event_id)["revision"]
+    store.delete(4)
+    store.archive("2021-01-01")
+    store.commit()
+    store.close()
+
+    store = EventStore(WriteAheadLog(str(tmp_path)))
+    assert store.version() >= revision
+    with pytest.raises(StaleRevision):
+        store.update(event_id, {"title": "retro"}, {revision - 1})
+    assert store.update(event_id, {"title": "retro"}, {revision})["revision"] > revision
+    store.close()
+
+
+def test_archiver_keeps_running_after_a_failed_pass(tmp_path, monkeypatch):
+    store = seeded(tmp_path)
+    finish, passes = store.finish_archive, []
+
+    def fail_first(old, names):
+        passes.append(names)
+        if len(passes) == 1:
+            raise OSError("No space left on device")
+        return finish(old, names)
+
+    monkeypatch.setattr(store, "finish_archive", fail_first)
+    monkeypatch.setattr(app, "store", store)
+    monkeypatch.setattr(app, "ARCHIVE_DAYS", 365)
+    monkeypatch.setattr(app, "ARCHIVE_INTERVAL", 0.01)
+
+    async def run_until_archived():
+        archiver = asyncio.create_task(app.archive_periodically())
+        while len(store) > 1:
+            await asyncio.sleep(0.01)
+        archiver.cancel()
+
+    asyncio.run(asyncio.wait_for(run_until_archived(), 10))
+    assert len(passes) == 2
+    # Segments from the failed pass were dropped rather than left behind
+    assert segment_files(tmp_path) == sorted(passes[1])
+    store.close()
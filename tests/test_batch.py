@@ -0,0 +1,72 @@
+import pytest
+
+from store import MissingEvents
+
+
+def event(title, day="2026-03-02", priority="low"):
+    return {"title": title, "date": day, "priority": priority}
+
+
+def titles(store):
+    return sorted(event["title"] for event in store.range("2026-01-01", "2026-12-31"))
+
+
+def test_batch_applies_in_order(open_store):
+    store = open_store()
+    first = store.add(event("standup"))
+    results = store.apply([
+        {"op": "create", "event": event("retro")},
+        {"op": "update", "id": first["id"], "changes": {"title": "planning"}},
+        {"op": "delete", "id": first["id"]},
+    ])
+    assert [result["op"] for result in results] == ["create", "update", "delete"]
+    assert results[1]["event"]["title"] == "planning"
+    assert titles(store) == ["retro"]
+    store.close()
+
+
+def test_batch_with_a_missing_event_changes_nothing(open_store):
+    store = open_store()
+    first = store.add(event("standup"))
+    store.commit()
+    version = store.version()
+    with pytest.raises(MissingEvents) as raised:
+        store.apply([
+            {"op": "create", "event": event("retro")},
+            {"op": "update", "id": first["id"], "changes": {"title": "planning"}},
+            {"op": "delete", "id": first["id"]},
+            # Already deleted earlier in the batch
+            {"op": "update", "id": first["id"], "changes": {"title": "review"}},
+            {"op": "delete", "id": 999},
+        ])
+    assert raised.value.indexes == [3, 4]
+    assert titles(store) == ["standup"]
+    assert store.version() == version
+    store.commit()
+    store.close()
+
+    if open_store.durable:
+        store = open_store()
+        assert titles(store) == ["standup"]
+        store.close()
+
+
+def test_batch_endpoint_rolls_back_and_reports_positions(serve):
+    with serve() as client:
+        created = client.post("/api/events", json=event("standup")).json()
+        response = client.post("/api/events/batch", json=[
+            {"op": "create", "event": event("retro")},
+            {"op": "delete", "id": created["id"]},
+            {"op": "update", "id": created["id"], "changes": {"title": "planning"}},
+        ])
+        assert response.status_code == 404
+        assert [error["index"] for error in response.json()["detail"]] == [2]
+        assert [item["title"] for item in client.get("/api/events").json()] == ["standup"]
+
+        response = client.post("/api/events/batch", json=[
+            {"op": "create", "event": event("retro")},
+            {"op": "update", "id": created["id"], "changes": {"title": "planning"}},
+        ])
+        assert response.status_code == 200
+        assert [result["op"] for result in response.json()["results"]] == ["create", "update"]
+        assert sorted(item["title"] for item in client.get("/api/events").json()) == ["planning", "retro"]
@@ -0,0 +1,85 @@
+import base64
+import json
+
+import pytest
+
+WEEKLY = {"frequency": "weekly", "interval": 1, "until": None, "count": 6, "exceptions": []}
+LISTINGS = [
+    ("2026-03-01", "2026-04-30", None),
+    (None, None, "high"),
+    ("2026-03-05", "2026-03-25", "low"),
+]
+
+
+def key(event):
+    return (event["date"], event.get("time") or "", event["id"])
+
+
+def seeded(open_store):
+    store = open_store()
+    store.add_many([
+        {
+            "title": f"review {number}",
+            "date": "2026-03-%02d" % (1 + number % 28),
+            "time": None if number % 3 else "%02d:00" % (8 + number % 5),
+            "priority": ("low", "medium", "high")[number % 3],
+        }
+        for number in range(60)
+    ])
+    store.add({"title": "standup", "date": "2026-03-03", "time": "09:00", "priority": "high", "recurrence": WEEKLY})
+    return store
+
+
+def pages(store, start, end, priority, size, after=None):
+    while True:
+        page = list(store.range(start, end, priority, after, size))
+        yield page
+        if len(page) < size:
+            return
+        after = key(page[-1])
+
+
+@pytest.mark.parametrize("start, end, priority", LISTINGS)
+def test_pages_cover_the_listing_once(open_store, start, end, priority):
+    store = seeded(open_store)
+    listing = list(store.range(start, end, priority))
+    paged = [event for page in pages(store, start, end, priority, 7) for event in page]
+    assert paged == listing
+    assert [key(event) for event in paged] == sorted(key(event) for event in paged)
+    store.close()
+
+
+def test_inserts_between_pages_are_neither_repeated_nor_skipped(open_store):
+    store = seeded(open_store)
+    reader = pages(store, "2026-03-01", "2026-03-31", None, 10)
+    seen = next(reader)
+    assert seen[-1]["date"] == "2026-03-03"
+    store.add({"title": "behind", "date": "2026-03-02", "priority": "low"})
+    store.add({"title": "ahead", "date": "2026-03-20", "priority": "low"})
+    store.delete(next(event["id"] for event in store.range("2026-03-04", "2026-03-04")))
+    seen += [event for page in reader for event in page]
+    titles = [event["title"] for event in seen]
+    assert "ahead" in titles and "behind" not in titles
+    assert len(set(map(key, seen))) == len(seen)
+    assert seen[10:] == list(store.range("2026-03-01", "2026-03-31", None, key(seen[9])))
+    store.close()
+
+
+def test_listing_pages_through_the_cursor_header(serve):
+    with serve() as client:
+        for number in range(25):
+            event = {"title": f"review {number}", "date": "2026-03-%02d" % (1 + number), "priority": "low"}
+            assert client.post("/api/events", json=event).status_code == 200
+        titles, params = [], {"start": "2026-03-01", "end": "2026-03-31", "limit": 10, "fields": "title"}
+        while True:
+            response = client.get("/api/events", params=params)
+            assert all(list(item) == ["title"] for item in response.json())
+            titles += [item["title"] for item in response.json()]
+            if "x-next-cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["x-next-cursor"]
+        assert titles == [f"review {number}" for number in range(25)]
+
+        bad_date = base64.urlsafe_b64encode(json.dumps(["2026-02-30", "", 1]).encode()).decode()
+        for cursor in ("not a cursor", bad_date):
+            assert client.get("/api/events", params={"limit": 10, "cursor": cursor}).status_code == 400
@@ -0,0 +1,168 @@
+import os
+import subprocess
+import sys
+import threading
+
+from persistence import WriteAheadLog
+from store import EventStore
+
+
+def event(event_id, title="standup"):
+    return {"id": event_id, "title": title, "date": "2026-03-02", "priority": "low"}
+
+
+def set_aside_logs(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("events.wal."))
+
+
+def reopen(directory, **kwargs):
+    log = WriteAheadLog(str(directory), **kwargs)
+    return log, log.load()
+
+
+def test_recovers_puts_deletes_and_batches(tmp_path):
+    log, _ = reopen(tmp_path)
+    log.append({"op": "put", "event": event(1)})
+    log.append({"op": "put", "event": event(2)})
+    log.append({"op": "batch", "records": [
+        {"op": "put", "event": event(1, "retro")},
+        {"op": "del", "id": 2},
+        {"op": "put", "event": event(3)},
+    ]})
+    log.commit()
+    log.close()
+
+    log, (events, next_id) = reopen(tmp_path)
+    assert events == {1: event(1, "retro"), 3: event(3)}
+    assert next_id == 4
+    log.close()
+
+
+def test_torn_tail_is_dropped_and_later_appends_survive(tmp_path):
+    log, _ = reopen(tmp_path)
+    log.append({"op": "put", "event": event(1)})
+    log.commit()
+    log.close()
+    with open(tmp_path / "events.wal", "ab") as f:
+        f.write(b'{"op":"put","event":{"id":2,"ti')
+
+    log, (events, _) = reopen(tmp_path)
+    assert list(events) == [1]
+    log.append({"op": "put", "event": event(3)})
+    log.commit()
+    log.close()
+
+    log, (events, _) = reopen(tmp_path)
+    assert sorted(events) == [1, 3]
+    log.close()
+
+
+def test_snapshot_runs_beside_appends(tmp_path):
+    log, _ = reopen(tmp_path, compact_every=2)
+    log.append({"op": "put", "event": event(1)})
+    log.append({"op": "put", "event": event(2)})
+    assert log.should_compact()
+    log.snapshot([event(1), event(2)], 3)
+    log.append({"op": "del", "id": 1})
+    log.commit()
+    log.finish_snapshot()
+    # Only a log still holding the delete, if it landed before the switch, is kept
+    assert len(set_aside_logs(tmp_path)) <= 1
+    log.close()
+
+    log, (events, next_id) = reopen(tmp_path)
+    assert list(events) == [2]
+    assert next_id == 3
+    assert log.snapshot_lsn == 2
+    log.close()
+
+
+def test_unfinished_snapshot_replays_the_set_aside_log(tmp_path):
+    log, _ = reopen(tmp_path)
+    log.append({"op": "put", "event": event(1)})
+    log.append({"op": "put", "event": event(2)})
+    log.close()
+    # As left by a crash after the switch but before the snapshot was written
+    os.replace(tmp_path / "events.wal", tmp_path / "events.wal.1")
+    with open(tmp_path / "events.wal", "wb") as f:
+        f.write(b'{"op":"del","id":1,"lsn":3}\n')
+
+    log, (events, _) = reopen(tmp_path)
+    assert list(events) == [2]
+    log.append({"op": "put", "event": event(4)})
+    log.snapshot([event(2), event(4)], 5)
+    log.close()
+    assert set_aside_logs(tmp_path) == []
+
+    log, (events, _) = reopen(tmp_path)
+    assert sorted(events) == [2, 4]
+    log.close()
+
+
+def test_snapshot_leaves_the_disk_to_its_thread(tmp_path, monkeypatch):
+    log, _ = reopen(tmp_path)
+    log.append({"op": "put", "event": event(1)})
+    log.commit()
+    fsync, fsynced = os.fsync, []
+
+    def record_thread(fd):
+        fsynced.append(threading.current_thread().name)
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", record_thread)
+    log.snapshot([event(1)], 2)
+    assert "MainThread" not in fsynced
+    log.finish_snapshot()
+    # Set-aside log, snapshot and the directory after each rename
+    assert fsynced.count("wal-snapshot") == 4
+    assert set_aside_logs(tmp_path) == []
+    log.close()
+
+
+def test_store_recovers_across_snapshots(tmp_path):
+    store = EventStore(WriteAheadLog(str(tmp_path), compact_every=10))
+    for number in range(25):
+        store.add({"title": f"review {number}", "date": "2026-03-02", "priority": "low"})
+    store.delete(5)
+    store.update(7, {"title": "planning"})
+    store.commit()
+    expected = [dict(event) for event in store.all()]
+    store.close()
+
+    store = EventStore(WriteAheadLog(str(tmp_path), compact_every=10))
+    assert [dict(event) for event in store.all()] == expected
+    assert [event["id"] for event in store.search("planning")] == [7]
+    store.close()
+
+
+IMPORT_THEN_CRASH = """
+import os, sys
+import records
+from persistence import WriteAheadLog
+from store import EventStore
+
+store = EventStore(WriteAheadLog(sys.argv[1], compact_every=1000))
+store.add({"title": "before", "date": "2026-03-02", "priority": "low"})
+store.commit()
+pack, packed = records.Record.pack, []
+
+def crash_partway(data):
+    packed.append(data)
+    if len(packed) == 3000:
+        os._exit(9)
+    return pack(data)
+
+records.Record.pack = crash_partway
+store.add_many([{"title": f"imported {n}", "date": "2026-03-03", "priority": "low"} for n in range(5000)])
+store.commit()
+"""
+
+
+def test_bulk_import_is_all_or_nothing_after_a_crash(tmp_path):
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    result = subprocess.run([sys.executable, "-c", IMPORT_THEN_CRASH, str(tmp_path)], cwd=root)
+    assert result.returncode == 9
+
+    store = EventStore(WriteAheadLog(str(tmp_path)))
+    assert [event["title"] for event in store.all()] == ["before"]
+    store.close()
@@ -0,0 +1,63 @@
+import pytest
+
+from store import StaleRevision
+
+
+def event(title, day="2026-03-02", priority="low"):
+    return {"title": title, "date": day, "priority": priority}
+
+
+def test_update_moves_the_event_in_every_index(open_store):
+    store = open_store()
+    moved = store.add(event("standup"))
+    store.add(event("retro", "2026-03-04"))
+    store.update(moved["id"], {"date": "2026-03-05", "priority": "high"})
+    assert [item["title"] for item in store.range("2026-03-01", "2026-03-31")] == ["retro", "standup"]
+    assert list(store.range("2026-03-02", "2026-03-02")) == []
+    assert [item["title"] for item in store.range(None, None, "high")] == ["standup"]
+    assert list(store.range(None, None, "low"))[0]["title"] == "retro"
+    store.close()
+
+
+def test_stale_revision_is_refused(open_store):
+    store = open_store()
+    created = store.add(event("standup"))
+    updated = store.update(created["id"], {"title": "planning"}, {created["revision"]})
+    assert updated["revision"] > created["revision"]
+    with pytest.raises(StaleRevision) as raised:
+        store.update(created["id"], {"title": "retro"}, {created["revision"]})
+    assert raised.value.event["revision"] == updated["revision"]
+    assert store.get(created["id"])["title"] == "planning"
+    store.close()
+
+
+def test_if_match_guards_updates_across_a_restart(serve, open_store):
+    with serve() as client:
+        created = client.post("/api/events", json=event("standup")).json()
+        url = f"/api/events/{created['id']}"
+        etag = client.get(url).headers["etag"]
+        assert etag == f'"{created["id"]}.{created["revision"]}"'
+
+        response = client.patch(url, json={"title": "planning"}, headers={"If-Match": etag})
+        assert response.status_code == 200
+        current = response.headers["etag"]
+        assert current == f'"{created["id"]}.{response.json()["revision"]}"' != etag
+
+        response = client.patch(url, json={"title": "retro"}, headers={"If-Match": etag})
+        assert response.status_code == 412
+        assert response.headers["etag"] == current
+        # Another event's tag never matches
+        other = current.replace(f'"{created["id"]}.', f'"{created["id"] + 1}.')
+        assert client.patch(url, json={"title": "retro"}, headers={"If-Match": other}).status_code == 412
+        assert client.patch(url, json={"title": "retro"}, headers={"If-Match": f"{etag}, {current}"}).status_code == 200
+        current = client.get(url).headers["etag"]
+
+    if not open_store.durable:
+        return
+    with serve() as client:
+        assert client.get(url).headers["etag"] == current
+        assert client.put(url, json=event("review"), headers={"If-Match": etag}).status_code == 412
+        response = client.put(url, json=event("review"), headers={"If-Match": current})
+        assert response.status_code == 200
+        assert response.headers["etag"] not in (etag, current)
+        assert client.patch(url, json={"title": "retro"}, headers={"If-Match": "*"}).status_code == 200
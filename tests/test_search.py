@@ -0,0 +1,52 @@
+import pytest
+
+from search import tokenize
+from sqlite_store import SQLiteEventStore
+from store import EventStore
+
+EVENTS = [
+    ("Résumé review", "bring the CV"),
+    ("Flight to Zürich", "gate B12"),
+    ("Café with Ana", "naïve questions welcome"),
+    ("resume planning", ""),
+    ("Team sync", "Zurich office"),
+]
+
+QUERIES = ["resume", "résumé", "RÉSU", "zurich", "zür", "cafe", "naive", "re", "sume", "team zurich"]
+
+
+def test_tokenize_strips_accents_without_splitting_words():
+    assert tokenize("Résumé in Zürich, naïve café") == ["resume", "in", "zurich", "naive", "cafe"]
+    assert tokenize("ﬁle") == ["file"]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = EventStore()
+    else:
+        store = SQLiteEventStore(str(tmp_path / "calendar.db"))
+    for title, description in EVENTS:
+        store.add({"title": title, "date": "2026-03-02", "priority": "low", "description": description})
+    store.commit()
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_search_matches(store, query):
+    # The same expectations for both backends keep them in step
+    expected = {
+        "resume": {1, 4},
+        "résumé": {1, 4},
+        "RÉSU": {1, 4},
+        "zurich": {2, 5},
+        "zür": {2, 5},
+        "cafe": {3},
+        "naive": {3},
+        "re": {1, 4},
+        "sume": set(),
+        "team zurich": {5},
+    }[query]
+    assert {event["id"] for event in store.search(query)} == expected
+
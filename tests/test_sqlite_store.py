@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlite_store import SQLiteEventStore
+from store import EventStore
+
+
+def seeded(path, count=200):
+    store = SQLiteEventStore(str(path))
+    store.add_many([
+        {
+            "title": f"review {number}",
+            "date": "2026-03-%02d" % (1 + number % 20),
+            "time": None if number % 3 else "%02d:00" % (8 + number % 9),
+            "priority": ("low", "medium", "high")[number % 3],
+        }
+        for number in range(count)
+    ])
+    return store
+
+
+def query_plans(store, run):
+    """The query plans of the statements ``run`` sends to the database"""
+    statements = []
+    for conn in store._readers.queue:
+        conn.set_trace_callback(statements.append)
+    run()
+    for conn in store._readers.queue:
+        conn.set_trace_callback(None)
+    with store._reader() as conn:
+        return [
+            " ".join(row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql))
+            for sql in statements
+            if sql.startswith("SELECT")
+        ]
+
+
+def test_pages_seek_through_the_listing_index(tmp_path):
+    store = seeded(tmp_path / "calendar.db")
+    after = ("2026-03-05", "09:00", 10)
+    for start, priority in ((None, None), ("2026-03-02", None), (None, "high"), ("2026-03-02", "low")):
+        plans = query_plans(store, lambda: list(store.range(start, "2026-03-20", priority, after, 25)))
+        assert plans and all("TEMP B-TREE" not in plan for plan in plans), plans
+    store.close()
+
+
+def test_answers_like_the_in_memory_store(tmp_path):
+    store = seeded(tmp_path / "calendar.db")
+    memory = EventStore()
+    memory.add_many([{key: event[key] for key in ("title", "date", "time", "priority")} for event in store.all()])
+
+    def listed(events):
+        return [(event["title"], event["date"], event["time"]) for event in events]
+
+    for args in ((None, None, "high"), ("2026-03-02", "2026-03-09", None), ("2026-03-05", "2026-03-05", "low")):
+        assert listed(store.range(*args)) == listed(memory.range(*args))
+    assert store.day_counts("2026-03-01", "2026-03-31") == memory.day_counts("2026-03-01", "2026-03-31")
+    assert store.stats("2026-03-10")["by_priority"] == memory.stats("2026-03-10")["by_priority"]
+    # Words match by prefix, so "12" also finds 120 to 129
+    found = sorted(event["title"] for event in store.search("review 12"))
+    assert found == sorted(event["title"] for event in memory.search("review 12")) and len(found) == 11
+    store.close()
+
+
+def test_workers_sharing_a_file_see_each_others_changes(tmp_path):
+    first = SQLiteEventStore(str(tmp_path / "calendar.db"))
+    second = SQLiteEventStore(str(tmp_path / "calendar.db"))
+    assert first.epoch == second.epoch
+    version = second.version()
+    created = first.add({"title": "standup", "date": "2026-03-02", "priority": "low"})
+    assert second.get(created["id"])["title"] == "standup"
+    assert second.version() > version
+    changes = second.changes_since(version)
+    assert not changes["resync"]
+    assert [(change["op"], change["id"]) for change in changes["changes"]] == [("put", created["id"])]
+    second.delete(created["id"])
+    assert first.get(created["id"]) is None
+    first.close()
+    second.close()
+
+
+def test_reads_share_the_pool_while_writes_go_on(tmp_path):
+    store = seeded(tmp_path / "calendar.db", count=50)
+
+    def read(number):
+        if number % 10 == 0:
+            store.add({"title": f"added {number}", "date": "2026-03-02", "priority": "low"})
+        return len(list(store.range("2026-03-01", "2026-03-31")))
+
+    with ThreadPoolExecutor(16) as pool:
+        counts = list(pool.map(read, range(200)))
+    assert min(counts) >= 50 and max(counts) <= 70
+    assert len(list(store.all())) == 70
+    # Every connection went back to the pool
+    assert store._readers.qsize() == 4
+    store.close()